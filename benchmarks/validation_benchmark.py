@@ -0,0 +1,67 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmark comparing kubesat.validation.validate_json, which uses the compiled validator registry,
+against calling jsonschema.validate directly. Run with "python benchmarks/validation_benchmark.py" once kubesat
+is installed.
+"""
+
+import timeit
+from jsonschema import validate
+
+from kubesat.validation import validate_json, MessageSchemas
+
+TIMESTEP = {
+    "sender_ID": "clock",
+    "origin_ID": "clock",
+    "message_type": "timestep",
+    "time_sent": "2020-07-06T00:00:00.000",
+    "data": {
+        "time": "2020-07-06T00:00:00.000"
+    }
+}
+
+API = {
+    "sender_ID": "cubesat_1",
+    "origin_ID": "cubesat_1",
+    "message_type": "api_message",
+    "time_sent": "2020-07-06T00:00:00.000",
+    "data": {
+        "host": "127.0.0.1",
+        "port": "8000",
+        "route": "/data",
+        "data_id": "abc"
+    }
+}
+
+
+def run(number=5000):
+    """
+    Runs the benchmark and prints the time per call for both paths.
+
+    Args:
+        number (int, optional): Number of validations per measurement. Defaults to 5000.
+    """
+    cases = [("TIMESTEP_MESSAGE", TIMESTEP, MessageSchemas.TIMESTEP_MESSAGE),
+             ("API_MESSAGE", API, MessageSchemas.API_MESSAGE)]
+    for name, instance, schema in cases:
+        uncached = timeit.timeit(lambda: validate(instance=instance, schema=schema), number=number)
+        cached = timeit.timeit(lambda: validate_json(instance, schema), number=number)
+        print(f"{name}: jsonschema.validate {uncached / number * 1e6:.1f} us, "
+              f"validate_json {cached / number * 1e6:.1f} us, speedup {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    run()
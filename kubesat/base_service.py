@@ -12,23 +12,61 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import json
+import time
 import asyncio
+import threading
 import uvicorn
 import traceback
 import subprocess
-import aiohttp
 from aiologger.loggers.json import JsonLogger
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
 from typing import Callable
 from inspect import signature
+from functools import lru_cache, partial
 
 from kubesat.message import Message
+from kubesat.codec import get_codec, Compressor
 from kubesat.nats_handler import NatsHandler
 from kubesat.redis_handler import RedisHandler
 from kubesat.kubernetes_handler import KubernetesHandler
+from kubesat.shared_storage import StorageTransaction, read_only_view
+from kubesat.subscription import Subscription, MessageBatcher, LatestOnly
+from kubesat.flow_control import DROP_NEWEST, DROP_POLICIES
+from kubesat.data_fetcher import DataFetcher, FetchQueue
+from kubesat.concurrency import StorageAccess, CallbackScheduler, ALL_KEYS
+from kubesat.scheduling import DeadlineSchedule, OVERRUN_SKIP
+from kubesat.metrics import ServiceMetrics, LoopLagMonitor, PhaseTimings
+from kubesat.profiling import StackSampler, MemoryTracker
+from kubesat.presence import LEASE_SUBJECT
 from kubesat.nats_logger import NatsLoggerFactory
-from kubesat.validation import validate_json, MessageSchemas, SharedStorageSchemas
+from kubesat.validation import validate_json, validation_policy, MessageSchemas, SharedStorageSchemas
+
+
+@lru_cache(maxsize=None)
+def _parameter_count(callback_function: Callable) -> int:
+    """
+    Returns the number of parameters of a callback, cached since inspecting the signature is slow. Wrapped callbacks
+    are not followed, since the wrapper is what gets called.
+    """
+    return len(signature(callback_function, follow_wrapped=False).parameters)
+
+
+async def _inline_payload(payload: dict) -> dict:
+    """
+    Returns a data message that was sent inline, so it can be queued like a fetched one.
+    """
+    return payload
+
+
+async def _iter_chunks(data: bytes, chunk_size: int):
+    """
+    Yields a large response body in chunks, so the server can start sending it right away.
+    """
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
 
 
 class BaseService():
@@ -59,26 +97,359 @@ class BaseService():
         self.sender_id = None
         self.nats_client = None
         self.redis_client = None
-        self.kubernetes_client = None
+        self._kubernetes_client = None
+        self._kubernetes_config_file = None
         self._api = None
         self._logger = None
         self.shared_storage = None
         self._startup_callback = None
         self._registered_callbacks = []
         self._unsubscribe_nats_routes = []
+        self._subscriptions = {}
+
+        # callbacks by the unique name their metrics, schedules and conflations are kept under, see _callback_name
+        self._callback_names = {}
+
+        # limits of the messages waiting to be handled on each subscribed subject, see BaseService.limit_subscription
+        self.pending_limits = {"max_messages": 65536, "max_bytes": 64 * 1024 * 1024, "policy": DROP_NEWEST}
+        self._subscription_limits = {}
+
+        # conflations of the callbacks registered with latest_only, by callback name, counting the skipped messages
+        self.latest_only = {}
+
+        # maximum number of callbacks that declared their shared storage keys running or waiting concurrently
+        self.max_concurrency = 16
+        self._scheduler = None
+
+        # schedules of the callbacks registered with schedule_callback, by callback name, providing timing metrics
+        self.schedules = {}
+
+        # metrics served on the /metrics endpoint in Prometheus text format
+        self.metrics = ServiceMetrics()
+        self.metrics.add_collector(self._collect_metrics)
+        self._loop_lag = LoopLagMonitor()
+
+        # timings of the startup phases in BaseService.run(), served on the /startup endpoint
+        self.startup_timings = PhaseTimings()
+        self._nats_connected = None
+
+        # the service publishes a lease renewal every lease_interval seconds, so the config service knows it is alive
+        # without pinging it. The lease expires after lease_ttl seconds without renewal. 0 disables the renewals.
+        self.lease_interval = 3
+        self.lease_ttl = 10
+        self._lease_task = None
+
+        # pooled HTTP client used to get data messages from other services
+        self._data_fetcher = DataFetcher()
+
+        # data messages larger than this many bytes are streamed by the REST API in chunks of data_chunk_size bytes
+        self.data_stream_threshold = 1024 * 1024
+        self.data_chunk_size = 64 * 1024
 
         # subscribing to node status by default to provide channel to ping and see whether service is alive
-        @self.request_nats_callback(f"node.status.{self.service_type}.", MessageSchemas.STATUS_MESSAGE, append_sender_id=True)
+        @self.request_nats_callback(f"node.status.{self.service_type}.", MessageSchemas.STATUS_MESSAGE, append_sender_id=True, read_only=True)
         async def heartbeat(message: Message, nats_handler: NatsHandler, shared_storage: dict, logger: JsonLogger) -> Message:
             return nats_handler.create_message("ALIVE", MessageSchemas.STATUS_MESSAGE)
 
+    @property
+    def kubernetes_client(self) -> KubernetesHandler:
+        """
+        Kubernetes client, created on first use since loading the kubernetes config slows down the startup of the
+        services that do not need it.
+        """
+        if self._kubernetes_client is None:
+            self._kubernetes_client = KubernetesHandler(self._kubernetes_config_file)
+        return self._kubernetes_client
+
+    @kubernetes_client.setter
+    def kubernetes_client(self, kubernetes_client: KubernetesHandler):
+        self._kubernetes_client = kubernetes_client
+
     async def _register_callbacks(self):
         """
-        Private method that activates all the NATS channel subscriptions.
+        Private method that activates all the NATS channel subscriptions and starts renewing the lease of the service.
+        The subscriptions are created concurrently, in the order the callbacks were registered.
+        """
+
+        self._scheduler = CallbackScheduler(self._log_exception, max_concurrency=self.max_concurrency)
+        await asyncio.gather(*(route() for route in self._registered_callbacks))
+        if self.lease_interval and self._lease_task is None:
+            schedule = DeadlineSchedule(self.lease_interval, self._renew_lease)
+            self._lease_task = asyncio.get_running_loop().create_task(schedule.run())
+
+    async def _renew_lease(self):
+        """
+        Private method that publishes a lease renewal, which tells the config service that the service is alive
+        for another lease_ttl seconds.
+        """
+
+        try:
+            message = self.nats_client.create_message({
+                "service_type": self.service_type,
+                "ttl": self.lease_ttl
+            }, MessageSchemas.LEASE_MESSAGE)
+            await self.nats_client.send_message(LEASE_SUBJECT, message)
+        except Exception:
+            await self._log_exception()
+
+    def _callback_name(self, callback_function: Callable, subject: str = None) -> str:
+        """
+        Private method that returns the unique name the metrics, schedule and conflation of a callback are kept under.
+        It is the qualified name of the callback, without the functions it is defined in, followed by the subject it is
+        registered on, e.g. "cubesat_X_attitude_provider@state.attitude". A number is appended if another callback
+        already has the same name.
+
+        Args:
+            callback_function (function): Callback provided by the user.
+            subject (str, optional): Subject the callback is registered on, None for scheduled callbacks.
+
+        Returns:
+            str: Name of the callback.
+        """
+
+        base_name = callback_function.__qualname__.rpartition("<locals>.")[2]
+        if subject is not None:
+            base_name = f"{base_name}@{subject}"
+        name = base_name
+        number = 1
+        while self._callback_names.setdefault(name, (callback_function, subject)) != (callback_function, subject):
+            number += 1
+            name = f"{base_name}#{number}"
+        return name
+
+    async def _execute_callback(self, callback_function: Callable, *args, name: str, access: StorageAccess, on_result: Callable = None):
+        """
+        Private method that executes a callback with the given arguments followed by nats_handler, shared_storage, logger
+        and, if the callback takes one more argument, kubernetes_client. The callback gets a copy-on-write transaction on
+        the shared storage, which is validated, committed and buffered in Redis once the callback returns. Only the keys
+        the callback declared to write are committed. Read only callbacks get a read only view of the committed shared
+        storage instead, which skips all of that and raises a TypeError on any change, including nested ones.
+
+        Args:
+            callback_function (function): Async callback function to execute.
+            args: Arguments passed to the callback before nats_handler.
+            name (str): Name of the callback the metrics are kept under.
+            access (StorageAccess): Shared storage access of the callback.
+            on_result (function, optional): Async function called with the return value of the callback once the shared
+                storage is committed. Defaults to None.
+
+        Returns:
+            object: The return value of the callback.
+        """
+
+        self.metrics.count_run(name)
+        read_only = not access.writes
+        if read_only:
+            shared_storage = read_only_view(self.shared_storage)
+        else:
+            # open a copy-on-write transaction on the shared storage, so callback cannot perform invalid changes
+            writable = None if access.writes == ALL_KEYS else access.writes
+            shared_storage = StorageTransaction(self.shared_storage, self._schema, writable)
+
+        # execute callback, including the kubernetes_client if it takes one more argument
+        args = (*args, self.nats_client, shared_storage, self._logger)
+        if _parameter_count(callback_function) == len(args) + 1:
+            args += (self.kubernetes_client,)
+        try:
+            start = time.perf_counter()
+            result = await callback_function(*args)
+            self.metrics.observe("callback", name, time.perf_counter() - start)
+
+            if not read_only:
+                # validate the keys changed by the callback and commit them if that is the case
+                start = time.perf_counter()
+                self.shared_storage = shared_storage.commit()
+                self.metrics.observe("commit", name, time.perf_counter() - start)
+
+                # buffer the current shared storage in redis, deferred to the flush task in write-behind mode
+                start = time.perf_counter()
+                self.redis_client.set_shared_storage(
+                    self.shared_storage, shared_storage.committed_keys)
+                self.metrics.observe("redis", name, time.perf_counter() - start)
+        except Exception:
+            self.metrics.count_error(name)
+            raise
+        if on_result is not None:
+            await on_result(result)
+        return result
+
+    async def _schedule_callback(self, callback_function: Callable, name: str, access: StorageAccess, message: Message = None, inline: bool = False, on_result: Callable = None):
+        """
+        Private method that submits a callback to the scheduler, which runs it once it does not conflict with the shared
+        storage access of other running callbacks. Callbacks that did not declare their keys only wait for their own
+        previous runs.
+
+        Args:
+            callback_function (function): Async callback function to execute.
+            name (str): Name of the callback the metrics are kept under.
+            access (StorageAccess): Shared storage access of the callback.
+            message (Message, optional): Message, or list of messages for batch callbacks, passed to the callback.
+                Defaults to None.
+            inline (bool, optional): Whether to wait for the callback and return its result. Defaults to False.
+            on_result (function, optional): Async function called with the return value of the callback once the shared
+                storage is committed. Defaults to None.
+
+        Returns:
+            object: The return value of the callback if inline is True, otherwise None.
+        """
+
+        args = () if message is None else (message,)
+        serial_key = None
+        if not access.declared:
+            # callbacks that did not declare their keys run one after another, like on their own NATS subscription
+            serial_key = callback_function
+        elif access.serialize_by and isinstance(message, Message):
+            serial_key = (callback_function, getattr(message, access.serialize_by))
+        execute = partial(self._execute_callback, callback_function, *args, name=name, access=access, on_result=on_result)
+        return await self._scheduler.submit(access, serial_key, execute, inline=inline)
+
+    def _collect_metrics(self) -> list:
+        """
+        Private method providing the metrics of the data table, the NATS subscriptions, the event loop, redis, the
+        scheduled callbacks, the compression, the validation policy and the startup to ServiceMetrics.render().
+
+        Returns:
+            list: Metric families as (name, kind, description, samples) tuples.
+        """
+
+        families = []
+        data_table = getattr(self.nats_client, "data_table", None)
+        if hasattr(data_table, "stats"):
+            stats = data_table.stats
+            families += [
+                ("kubesat_data_table_entries", "gauge", "Data messages stored for the REST API.", [({}, stats["entries"])]),
+                ("kubesat_data_table_bytes", "gauge", "Size of the data messages stored for the REST API.", [({}, stats["bytes"])]),
+                ("kubesat_data_table_reads_total", "counter", "Reads of the data table by result.",
+                 [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+                ("kubesat_data_table_removals_total", "counter", "Data messages removed before being read by all receivers.",
+                 [({"reason": "eviction"}, stats["evictions"]), ({"reason": "expiration"}, stats["expirations"])])
+            ]
+        if hasattr(self.nats_client, "pending"):
+            pending = sorted(self.nats_client.pending().items())
+            families += [
+                ("kubesat_nats_pending_messages", "gauge", "Messages received from NATS but not yet handled.",
+                 [({"subject": subject}, messages) for subject, (messages, _) in pending]),
+                ("kubesat_nats_pending_bytes", "gauge", "Bytes received from NATS but not yet handled.",
+                 [({"subject": subject}, size) for subject, (_, size) in pending])
+            ]
+        families.append(("kubesat_event_loop_lag_seconds", "histogram", "Delay of the event loop in waking up a sleeping task.",
+                         [({}, self._loop_lag.histogram)]))
+        if hasattr(self.redis_client, "flush_seconds"):
+            families += [
+                ("kubesat_redis_flush_seconds", "histogram", "Duration of writing the shared storage to redis in write-behind mode.",
+                 [({}, self.redis_client.flush_seconds)]),
+                ("kubesat_redis_flush_failures_total", "counter", "Failed writes of the shared storage to redis.",
+                 [({}, self.redis_client.flush_failures)])
+            ]
+        subscriptions = sorted(self._subscriptions.items())
+        families += [
+            ("kubesat_subscription_pending_messages", "gauge", "Messages waiting to be handled per subscribed subject.",
+             [({"subject": subject}, len(subscription.pending)) for subject, subscription in subscriptions]),
+            ("kubesat_subscription_pending_bytes", "gauge", "Size of the messages waiting to be handled per subscribed subject.",
+             [({"subject": subject}, subscription.pending.pending_bytes) for subject, subscription in subscriptions]),
+            ("kubesat_subscription_dropped_total", "counter", "Messages dropped because the callbacks fell behind.",
+             [({"subject": subject}, subscription.pending.dropped) for subject, subscription in subscriptions]),
+            ("kubesat_subscription_slow_consumer_total", "counter", "Times the pending messages of a subject reached their limits.",
+             [({"subject": subject}, subscription.pending.slow_consumer_events) for subject, subscription in subscriptions]),
+            ("kubesat_callback_pending_messages", "gauge", "Decoded messages waiting for each callback of a subscription.",
+             [({"callback": name}, messages) for _, subscription in subscriptions for name, messages in sorted(subscription.backlog().items())])
+        ]
+        if self.latest_only:
+            families.append(("kubesat_callback_skipped_total", "counter", "Messages skipped by latest only callbacks in favor of newer ones.",
+                             [({"callback": name}, conflation.skipped) for name, conflation in sorted(self.latest_only.items())]))
+        if self.schedules:
+            schedules = sorted(self.schedules.items())
+            families += [
+                ("kubesat_schedule_overruns_total", "counter", "Runs of scheduled callbacks that took longer than their interval.",
+                 [({"callback": name}, schedule.metrics.overruns) for name, schedule in schedules]),
+                ("kubesat_schedule_skipped_total", "counter", "Runs of scheduled callbacks skipped or coalesced after an overrun.",
+                 [({"callback": name}, schedule.metrics.skipped) for name, schedule in schedules]),
+                ("kubesat_schedule_max_jitter_seconds", "gauge", "Maximum delay of a scheduled callback run after its deadline.",
+                 [({"callback": name}, schedule.metrics.max_jitter) for name, schedule in schedules])
+            ]
+        compressor = getattr(self.nats_client, "compressor", None)
+        if compressor is not None:
+            stats = sorted(compressor.stats.items())
+            families += [
+                ("kubesat_compression_bytes_total", "counter", "Size of the sent messages before and after compression.",
+                 [({"subject": subject, "stage": "encoded"}, entry.raw_bytes) for subject, entry in stats] +
+                 [({"subject": subject, "stage": "sent"}, entry.sent_bytes) for subject, entry in stats]),
+                ("kubesat_compression_messages_total", "counter", "Sent messages by whether they were compressed.",
+                 [({"subject": subject, "compressed": "true"}, entry.compressed) for subject, entry in stats] +
+                 [({"subject": subject, "compressed": "false"}, entry.messages - entry.compressed) for subject, entry in stats]),
+                ("kubesat_compression_ratio", "gauge", "Encoded size divided by sent size of the messages per subject.",
+                 [({"subject": subject}, entry.ratio) for subject, entry in stats])
+            ]
+        names = sorted(set(validation_policy.checked) | set(validation_policy.skipped))
+        if names:
+            families += [
+                ("kubesat_validation_total", "counter", "Messages and shared storage changes validated or skipped by the validation policy.",
+                 [({"schema": name, "result": "checked"}, validation_policy.checked[name]) for name in names] +
+                 [({"schema": name, "result": "skipped"}, validation_policy.skipped[name]) for name in names]),
+                ("kubesat_validation_violations_total", "counter", "Messages and shared storage changes that violated their schema.",
+                 [({"schema": name}, validation_policy.violations[name]) for name in names])
+            ]
+        if self.startup_timings.phases:
+            families.append(("kubesat_startup_phase_seconds", "gauge", "Duration of each phase of the service startup.",
+                             [({"phase": name}, duration) for name, (_, duration) in self.startup_timings.phases.items()]))
+        return families
+
+    async def _log_exception(self):
+        """
+        Private method that logs the exception currently being handled.
+        """
+
+        await self._logger.error(traceback.format_exc())
+
+    async def _subscribe_handler(self, subject: str, callback_function: Callable, message_schema: dict, handler: Callable, name: str):
+        """
+        Private method that adds a handler to the subscription of a subject. All callbacks on the same subject share
+        one NATS subscription, which is created when the first handler is added.
+
+        Args:
+            subject (string): Name of the channel to subscribe to.
+            callback_function (function): Callback provided by the user.
+            message_schema (dict): Schema to decode incoming messages with.
+            handler (function): Async function called with the decoded message and the raw NATS message.
+            name (str): Name of the callback the decoding metrics are kept under.
+        """
+
+        subscription = self._subscriptions.get(subject)
+        if subscription is None:
+            limits = {**self.pending_limits, **self._subscription_limits.get(subject, {})}
+            subscription = Subscription(subject, self._log_exception, metrics=self.metrics, pending_limits=limits)
+            self._subscriptions[subject] = subscription
+
+            # add the handler before subscribing, so handlers registered concurrently keep their order
+            subscription.add(callback_function, message_schema, handler, name)
+            await self.nats_client.subscribe_callback(subject, subscription.receive, orig_callback=subscription)
+        else:
+            subscription.add(callback_function, message_schema, handler, name)
+
+    async def _unsubscribe_handler(self, subject: str, callback_function: Callable) -> bool:
+        """
+        Private method that removes the handlers of a callback from the subscription of a subject, and unsubscribes
+        from NATS once no handlers are left. Waits until the removed handlers handled the messages queued for them.
+
+        Args:
+            subject (string): Name of the channel to unsubscribe from.
+            callback_function (function): Callback provided by the user.
+
+        Returns:
+            bool: True if successfully unsubscribed, otherwise false
         """
 
-        for route in self._registered_callbacks:
-            await route()
+        subscription = self._subscriptions.get(subject)
+        removed = subscription.remove(callback_function) if subscription is not None else []
+        if not removed:
+            return False
+        result = True
+        if not len(subscription):
+            del self._subscriptions[subject]
+            result = await self.nats_client.unsubscribe_callback(subject, subscription)
+        for queue in removed:
+            await queue.join()
+        return result
 
     async def _stop(self):
         """
@@ -87,8 +458,43 @@ class BaseService():
 
         for unsubscribe_route in self._unsubscribe_nats_routes:
             await unsubscribe_route()
+
+        # stop renewing the lease and let callbacks that are still running finish before disconnecting
+        if self._lease_task is not None:
+            self._lease_task.cancel()
+            self._lease_task = None
+        await self._scheduler.join()
+        await self._loop_lag.stop()
+        await self._data_fetcher.close()
         await self.nats_client.disconnect()
 
+        # write the last changes of the shared storage to redis
+        await self.redis_client.stop_write_behind()
+
+    def limit_subscription(self, subject: str, max_messages: int = None, max_bytes: int = None, policy: str = None):
+        """
+        Sets how many messages received on a subject may wait to be handled, and which messages are dropped once the
+        callbacks fall behind. Limits that are not given default to BaseService.pending_limits. Applies to subscriptions
+        created afterwards, so it should be called before BaseService.run(). Usage example:
+
+        base_service_instance.limit_subscription("groundstation.packets", max_messages=100, policy="drop_oldest")
+
+        Args:
+            subject (str): Name of the channel.
+            max_messages (int, optional): Maximum number of pending messages. Defaults to None.
+            max_bytes (int, optional): Maximum size of the pending messages in bytes. Defaults to None.
+            policy (str, optional): "drop_oldest" drops the oldest pending messages, "drop_newest" drops incoming
+                messages and "conflate" only keeps the latest message once the limits are reached. Defaults to None.
+
+        Raises:
+            ValueError: If the policy is unknown.
+        """
+
+        if policy is not None and policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {policy}, expected one of {', '.join(DROP_POLICIES)}")
+        limits = {"max_messages": max_messages, "max_bytes": max_bytes, "policy": policy}
+        self._subscription_limits[subject] = {key: value for key, value in limits.items() if value is not None}
+
     def startup_callback(self, callback_function: Callable) -> Callable:
         """
         Decorator used to register a callback that will be called at service startup in the BaseService.run() method.
@@ -109,11 +515,13 @@ class BaseService():
         self._startup_callback = callback_function
         return callback_function
 
-    def subscribe_nats_callback(self, channel: str, message_schema: dict = MessageSchemas.MESSAGE) -> Callable:
+    def subscribe_nats_callback(self, channel: str, message_schema: dict = MessageSchemas.MESSAGE, read_only: bool = False, reads: list = None, writes: list = None, serialize_by: str = None, latest_only: bool = False) -> Callable:
         """
         Decorator used to register a callback for a specific NATS channel. The actual registration of
         the callback with the NATS server happens when BaseService.run() is called. Will call the callback
-        with arguments message, nats_handler, shared_storage, logger (in that order). Usage example:
+        with arguments message, nats_handler, shared_storage, logger (in that order). All callbacks registered on
+        the same channel share one NATS subscription, so each message is decoded once per schema and then passed
+        to every callback. Usage example:
 
         @base_service_instance.subscribe_nats_callback("sample.route", MessageSchema)
         async def sample_callback(msg, nats, shared_storage, logger):
@@ -122,58 +530,114 @@ class BaseService():
         Args:
             channel (string): Name of the channel that the callback should be registered with.
             message_schema (dict, optional): Schema to validate incoming messages against
+            read_only (bool, optional): Indicates that the callback does not change the shared storage. It then gets
+                a read only view of the shared storage and the storage is neither validated nor persisted afterwards.
+            reads (list, optional): Top level shared storage keys the callback reads. Callbacks that declare their keys
+                run concurrently with other callbacks whose keys do not conflict. Defaults to None.
+            writes (list, optional): Top level shared storage keys the callback changes. Changes to other keys are
+                discarded. Defaults to None.
+            serialize_by (str, optional): Name of a Message attribute, e.g. "origin_id". Concurrent messages with the
+                same value of this attribute are handled one after another. Defaults to None.
+            latest_only (bool, optional): If True, messages that arrive while the callback is running replace each other
+                and the callback only runs on the newest one. The number of skipped messages is kept in
+                BaseService.latest_only under the name of the callback followed by the channel, e.g.
+                "sample_callback@sample.route". Defaults to False.
 
         Returns:
             function: Returns decorator function that takes in the actual callback.
         """
 
+        access = StorageAccess(reads, writes, read_only, serialize_by)
+
         def decorator(callback_function: Callable) -> Callable:
+            name = self._callback_name(callback_function, channel)
+
+            async def callback_wrapper(msg, raw_message):
+                # wait for the callback when conflating, so later messages replace each other in the meantime
+                await self._schedule_callback(callback_function, name, access, msg, inline=latest_only)
+
+            handler = callback_wrapper
+            if latest_only:
+                conflation = LatestOnly(callback_wrapper, self._log_exception)
+                self.latest_only[name] = conflation
+                handler = conflation.add
 
             # wrap the callback so we can actually subscribe once the service runs
             async def subscription_wrapper():
 
-                async def callback_wrapper(msg):
+                # add the callback to the shared subscription of the NATS channel, which decodes the messages
+                await self._subscribe_handler(channel, callback_function, message_schema, handler, name)
 
-                    # try executing the callback and log if exception occurs
-                    try:
-                        # decode message
-                        msg = Message.decode_raw(msg.data, message_schema)
-
-                        # temporarily copy shared storage, so callback cannot perform invalid changes
-                        shared_storage = self.shared_storage.copy()
-
-                        # execute callback
-                        if len(signature(callback_function).parameters) == 5:
-                            # include kubernetes_client
-                            await callback_function(msg, self.nats_client, shared_storage, self._logger, self.kubernetes_client)
-                        else:
-                            await callback_function(msg, self.nats_client, shared_storage, self._logger)
-
-                        # check whether the shared storage is still valid and set it if that is the case
-                        if not validate_json(shared_storage, self._schema):
-                            raise ValueError(
-                                "Invalid change in shared storage")
-                        self.shared_storage = shared_storage
-
-                        # buffer the current shared storage in redis
-                        self.redis_client.set_shared_storage(
-                            self.shared_storage)
-                    except Exception as e:
-                        await self._logger.error(traceback.format_exc())
+            self._registered_callbacks.append(subscription_wrapper)
 
-                # subscribe to the NATS channel
-                await self.nats_client.subscribe_callback(channel, callback_wrapper, orig_callback=callback_function)
+            # create a wrapper so we can unsubscribe at a later time, handling the latest message when conflating
+            async def unsubscription_wrapper():
+                result = await self._unsubscribe_handler(channel, callback_function)
+                if latest_only:
+                    await conflation.join()
+                return result
+            self._unsubscribe_nats_routes.append(unsubscription_wrapper)
+            return callback_function
+        return decorator
+
+    def subscribe_batch_callback(self, channel: str, message_schema: dict = MessageSchemas.MESSAGE, max_batch: int = 100, max_latency: float = 0.1, read_only: bool = False, reads: list = None, writes: list = None) -> Callable:
+        """
+        Decorator used to register a callback for a specific NATS channel that handles messages in batches. Messages are
+        collected until max_batch messages arrived or the first of them waited max_latency seconds, and then passed to
+        the callback as a list. The shared storage is committed and persisted once per batch, which makes this the
+        better choice for channels with bursts of many messages. The actual registration of the callback with the NATS
+        server happens when BaseService.run() is called. Will call the callback with arguments messages, nats_handler,
+        shared_storage, logger (in that order). Usage example:
+
+        @base_service_instance.subscribe_batch_callback("sample.route", MessageSchema, max_batch=50, max_latency=0.2)
+        async def sample_callback(messages, nats, shared_storage, logger):
+            for msg in messages:
+                print(msg.data)
+
+        Args:
+            channel (string): Name of the channel that the callback should be registered with.
+            message_schema (dict, optional): Schema to validate incoming messages against
+            max_batch (int, optional): Maximum number of messages passed to one callback execution. Defaults to 100.
+            max_latency (float, optional): Maximum seconds a message waits for its batch to be handled. Defaults to 0.1.
+            read_only (bool, optional): Indicates that the callback does not change the shared storage. It then gets
+                a read only view of the shared storage and the storage is neither validated nor persisted afterwards.
+            reads (list, optional): Top level shared storage keys the callback reads. Callbacks that declare their keys
+                run concurrently with other callbacks whose keys do not conflict. Defaults to None.
+            writes (list, optional): Top level shared storage keys the callback changes. Changes to other keys are
+                discarded. Defaults to None.
+
+        Returns:
+            function: Returns decorator function that takes in the actual callback.
+        """
+
+        access = StorageAccess(reads, writes, read_only)
+
+        def decorator(callback_function: Callable) -> Callable:
+            name = self._callback_name(callback_function, channel)
+
+            async def handle_batch(messages):
+                await self._schedule_callback(callback_function, name, access, messages)
+
+            batcher = MessageBatcher(handle_batch, self._log_exception, max_batch, max_latency)
+
+            # wrap the callback so we can actually subscribe once the service runs
+            async def subscription_wrapper():
+
+                # add the batcher to the shared subscription of the NATS channel, which decodes the messages
+                await self._subscribe_handler(channel, callback_function, message_schema, batcher.add, name)
 
             self._registered_callbacks.append(subscription_wrapper)
 
-            # create a wrapper so we can unsubscribe at a later time
+            # create a wrapper so we can unsubscribe at a later time, handling the messages collected so far
             async def unsubscription_wrapper():
-                return await self.nats_client.unsubscribe_callback(channel, callback_function)
+                result = await self._unsubscribe_handler(channel, callback_function)
+                await batcher.flush()
+                return result
             self._unsubscribe_nats_routes.append(unsubscription_wrapper)
             return callback_function
         return decorator
 
-    def request_nats_callback(self, channel: str, message_schema: dict = MessageSchemas.MESSAGE, append_sender_id: bool = True) -> Callable:
+    def request_nats_callback(self, channel: str, message_schema: dict = MessageSchemas.MESSAGE, append_sender_id: bool = True, read_only: bool = False, reads: list = None, writes: list = None, serialize_by: str = None) -> Callable:
         """
         Decorator used to register a request callback for a specific NATS channel. This means that any
         callback registered using this decorator is expected to return an object of type Message which will
@@ -192,70 +656,60 @@ class BaseService():
             message_schema (dict): Schema to validate incoming messages against
             append_sender_id (bool): Indicates whether the sender_id should be appended to the channel name
                 at service runtime.
+            read_only (bool, optional): Indicates that the callback does not change the shared storage. It then gets
+                a read only view of the shared storage and the storage is neither validated nor persisted afterwards.
+            reads (list, optional): Top level shared storage keys the callback reads. Callbacks that declare their keys
+                run concurrently with other callbacks whose keys do not conflict. Defaults to None.
+            writes (list, optional): Top level shared storage keys the callback changes. Changes to other keys are
+                discarded. Defaults to None.
+            serialize_by (str, optional): Name of a Message attribute, e.g. "origin_id". Concurrent messages with the
+                same value of this attribute are handled one after another. Defaults to None.
 
 
         Returns:
             function: Returns decorator function that takes in the actual callback.
         """
 
+        access = StorageAccess(reads, writes, read_only, serialize_by)
+
+        def request_channel() -> str:
+            # if specified, appending sender_id to channel name, which is only known at service runtime
+            if append_sender_id:
+                return channel + self.sender_id
+            return channel
+
         def decorator(callback_function: Callable) -> Callable:
+            name = self._callback_name(callback_function, channel)
 
             # wrap the callback so we can actually subscribe once the service runs
             async def request_wrapper() -> Callable:
 
-                async def callback_wrapper(msg):
+                async def callback_wrapper(msg, raw_message):
 
-                    # try executing the callback and log if exception occurs
-                    try:
-                        # decode message and copy raw message to preserve the response channel name
-                        raw_message = msg
-                        msg = Message.decode_raw(msg.data, message_schema)
-
-                        # temporarily copy shared storage, so callback cannot perform invalid changes
-                        shared_storage = self.shared_storage.copy()
-
-                        # execute callback
-                        if len(signature(callback_function).parameters) == 5:
-                            response = await callback_function(msg, self.nats_client, shared_storage, self._logger, self.kubernetes_client)
-                        else:
-                            response = await callback_function(msg, self.nats_client, shared_storage, self._logger)
-
-                        # check whether the shared storage is still valid and set it if that is the case
-                        if not validate_json(shared_storage, self._schema):
-                            raise ValueError(
-                                "Invalid change in shared storage")
-                        self.shared_storage = shared_storage
-
-                        # buffer the current shared storage in redis
-                        self.redis_client.set_shared_storage(
-                            self.shared_storage)
-
-                        # send the response via NATS
+                    async def respond(response):
+                        # send the response via NATS, using the reply channel of the raw message
                         await self.nats_client.send_message(raw_message.reply, response)
-                    except Exception as e:
-                        await self._logger.error(traceback.format_exc())
 
-                # if specified, appending sender_id to channel name
-                sub_channel = channel
-                if append_sender_id:
-                    sub_channel += self.sender_id
+                    await self._schedule_callback(callback_function, name, access, msg, on_result=respond)
 
-                # subscribe to the NATS channel
-                await self.nats_client.subscribe_callback(sub_channel, callback_wrapper, orig_callback=callback_function)
+                # add the callback to the shared subscription of the NATS channel, which decodes the messages
+                await self._subscribe_handler(request_channel(), callback_function, message_schema, callback_wrapper, name)
 
             self._registered_callbacks.append(request_wrapper)
 
             # create a wrapper so we can unsubscribe at a later time
             async def unsubscription_wrapper():
-                return await self.nats_client.unsubscribe_callback(channel, callback_function)
+                return await self._unsubscribe_handler(request_channel(), callback_function)
             self._unsubscribe_nats_routes.append(unsubscription_wrapper)
             return callback_function
         return decorator
 
-    def schedule_callback(self, timeout: float) -> Callable:
+    def schedule_callback(self, timeout: float, read_only: bool = False, reads: list = None, writes: list = None, overrun: str = OVERRUN_SKIP) -> Callable:
         """
         Decorator used to register a callback to be executed in a regular time interval. The actual registration of
         the callback happens when BaseService.run() is called, so the callback will not be active before then.
+        The callback runs at fixed deadlines, so the time it takes does not stretch the interval. Jitter and overrun
+        metrics are kept in BaseService.schedules under the qualified name of the callback.
         Will call the callback with arguments nats_handler, shared_storage, logger (in that order). Usage example:
 
 
@@ -264,14 +718,29 @@ class BaseService():
             print("hi"!)
 
         Args:
-            timeout (float): Timeout to wait until running the callback again.
+            timeout (float): Interval in seconds between the starts of two runs of the callback.
+            read_only (bool, optional): Indicates that the callback does not change the shared storage. It then gets
+                a read only view of the shared storage and the storage is neither validated nor persisted afterwards.
+            reads (list, optional): Top level shared storage keys the callback reads. Callbacks that declare their keys
+                run concurrently with other callbacks whose keys do not conflict. Defaults to None.
+            writes (list, optional): Top level shared storage keys the callback changes. Changes to other keys are
+                discarded. Defaults to None.
+            overrun (str, optional): What to do with the runs missed while a run took longer than the interval: "skip"
+                them, "catch_up" on all of them or "coalesce" them into one run. Defaults to "skip".
 
         Returns: Returns decorator function that takes in the actual callback.
 
         """
 
+        access = StorageAccess(reads, writes, read_only)
+
         def decorator(callback_function: Callable) -> Callable:
 
+            # execute callback once it does not conflict with other callbacks, at every deadline of the schedule
+            name = self._callback_name(callback_function)
+            schedule = DeadlineSchedule(timeout, partial(self._schedule_callback, callback_function, name, access, inline=True), overrun)
+            self.schedules[name] = schedule
+
             # wrap the callback so we can actually subscribe once the service runs
             async def subscription_wrapper():
 
@@ -279,25 +748,7 @@ class BaseService():
 
                     # try executing the callback and log if exception occurs
                     try:
-                        while True:
-
-                            # temporarily copy shared storage, so callback cannot perform invalid changes
-                            shared_storage = self.shared_storage.copy()
-
-                            # execute callback
-                            await callback_function(self.nats_client, shared_storage, self._logger)
-
-                            # check whether the shared storage is still valid and set it if that is the case
-                            if not validate_json(self.shared_storage, self._schema):
-                                self._schema = self.shared_storage
-                            self.shared_storage = shared_storage
-
-                            # buffer the current shared storage in redis
-                            self.redis_client.set_shared_storage(
-                                self.shared_storage)
-
-                            # timeout until next loop execution
-                            await asyncio.sleep(timeout)
+                        await schedule.run()
                     except Exception as e:
                         await self._logger.error(traceback.format_exc())
 
@@ -310,16 +761,19 @@ class BaseService():
             return callback_function
         return decorator
 
-    def subscribe_data_callback(self, channel, message_schema, validator=None):
+    def subscribe_data_callback(self, channel, message_schema, validator=None, read_only=False, reads=None, writes=None, serialize_by=None):
         """
         Decorator used to register a callback for a specific NATS channel that is used to send data via the REST API. Any broadcasting
         on channels attached to this callback should be done with NatsHandler.send_data(). Internall this callbacks expects messages
         of schema API_MESSAGE on the registered channel. It then extracts the host, port, and route for for the GET endpoint to get
-        the data, makes an HTTP request and parses the response into a Message object of schema message_schema. The actual registration
+        the data, makes an HTTP request and parses the response into a Message object of schema message_schema. Small data messages are
+        sent inline in the API message and are used without a request. The actual registration
         of the callback with the NATS server happens when BaseService.run() is called. Will call the callback
         with arguments message, nats_handler, shared_storage, logger (in that order). Optionally, you can provide a validator as a
         keyword argument, which should have the same function signature of a callback function and should return True or False depending
-        on whether the message coming from the REST API should be processed. Usage example:
+        on whether the message coming from the REST API should be processed. The validator gets a read only view of the shared storage.
+        The data of several API messages is fetched concurrently through a pooled HTTP session, but passed to the callback in the order
+        the API messages arrived. Data messages from the same service that arrive in a burst are fetched with one request. Usage example:
 
         @base_service_instance.subscribe_data_callback("sample.route", MessageSchema, validator=some_validator_function)
         async def sample_callback(msg, nats, shared_storage, logger):
@@ -330,37 +784,70 @@ class BaseService():
             message_schema (dict): Schema to validate the incoming API messages against.
             validator (function, optional): function to check whether a certain NATS API message should be processed. Must have args message,
                 nats_handler, shared_storage, logger (in that order) and return True or False.
+            read_only (bool, optional): Indicates that the callback does not change the shared storage. It then gets
+                a read only view of the shared storage and the storage is neither validated nor persisted afterwards.
+            reads (list, optional): Top level shared storage keys the callback reads. Callbacks that declare their keys
+                run concurrently with other callbacks whose keys do not conflict. Defaults to None.
+            writes (list, optional): Top level shared storage keys the callback changes. Changes to other keys are
+                discarded. Defaults to None.
+            serialize_by (str, optional): Name of a Message attribute, e.g. "origin_id". Concurrent messages with the
+                same value of this attribute are handled one after another. Defaults to None.
         """
 
+        access = StorageAccess(reads, writes, read_only, serialize_by)
+
         def decorator(callback_function):
+            name = self._callback_name(callback_function, channel)
+
+            async def handle_data(json_message):
+                # decode the envelope of the message and execute the callback, the data is validated on first access
+                msg = Message.decode_json(json_message, message_schema, lazy=True, subject=channel)
+                await self._schedule_callback(callback_function, name, access, msg)
 
-            # subscribe to the given NATS channel but listen for messages of schema API_MESSAGE
-            @self.subscribe_nats_callback(channel, MessageSchemas.API_MESSAGE)
-            async def handle_api_message(message, nats, shared_storage, logger):
+            # data is fetched concurrently, but handed to the callback in the order the API messages arrived
+            fetch_queue = FetchQueue(handle_data, self._log_exception)
+
+            async def handle_api_message(message, raw_message):
 
                 # if a validator function was given, call it to determine whether the message should be processed
-                if not validator or validator(message, nats, shared_storage, logger):
-                    async with aiohttp.ClientSession() as session:
+                if not validator or validator(message, self.nats_client, read_only_view(self.shared_storage), self._logger):
+
+                    # small data messages are sent inline and queued as they are, to keep their order with fetched ones
+                    if "payload" in message.data:
+                        await fetch_queue.put(_inline_payload(dict(message.data["payload"])))
+                        return
+
+                    # construct the URL of the data route using the info from the API message, requests to the same route are batched
+                    route_url = f"http://{message.data['host']}:{message.data['port']}{message.data['route']}"
+                    await fetch_queue.put(self._data_fetcher.get_batched(route_url, message.data['data_id']))
 
-                        # construct the URL to access the data using the info from the API message
-                        url = f"http://{message.data['host']}:{message.data['port']}{message.data['route']}/{message.data['data_id']}"
-                        async with session.get(url) as response:
+            # wrap the callback so we can actually subscribe once the service runs
+            async def subscription_wrapper():
+
+                # subscribe to the given NATS channel but listen for messages of schema API_MESSAGE
+                await self._subscribe_handler(channel, callback_function, MessageSchemas.API_MESSAGE, handle_api_message, name)
 
-                            # check whether GET was successful
-                            if response.status == 200:
+            self._registered_callbacks.append(subscription_wrapper)
 
-                                # decode the message and execute the callback
-                                msg = Message.decode_json(await response.json(), message_schema)
-                                await callback_function(msg, self.nats_client, self.shared_storage, self._logger)
-                                return
-                            await self._logger.error(json.dumps(await response.json()))
+            # create a wrapper so we can unsubscribe at a later time, handling the data fetched so far
+            async def unsubscription_wrapper():
+                result = await self._unsubscribe_handler(channel, callback_function)
+                await fetch_queue.join()
+                return result
+            self._unsubscribe_nats_routes.append(unsubscription_wrapper)
             return callback_function
         return decorator
 
-    async def _load_config(self):
+    def _read_config(self) -> tuple:
         """
-        attempt to fetch a configuration json
-        containing the sender_id and initial shared_storage from a file, if that fails attempts to get it from redis.
+        Reads the configuration containing the sender_id and initial shared_storage from the config file, or from
+        redis if there is none. Blocks, so it is run in an executor thread while the service connects to NATS.
+
+        Returns:
+            tuple: Sender ID, shared storage and the source of the configuration, either "file" or "redis".
+
+        Raises:
+            ValueError: If there is no config file and the configuration can not be read from redis.
         """
         if self.config_path is not None:
 
@@ -368,33 +855,49 @@ class BaseService():
             with open(self.config_path, "r") as f:
                 config = json.load(f)
 
-            # get own sender_id from config
-            self.sender_id = config["sender_id"]
-
             # validate the shared_storage section of the config
             validate_json(config["shared_storage"], self._schema)
-            self.shared_storage = config["shared_storage"]
-
-            # write the shared storage and sender ID to Redis
-            self.redis_client.set_shared_storage(self.shared_storage)
-            self.redis_client.set_sender_id(self.sender_id)
-            print(
-                f"Successfully initialized {self.sender_id} {self.service_type} from file")
-        else:
-            try:
-                # try initializing from redis
-                self.sender_id = self.redis_client.get_sender_id()
-                if not self.sender_id:
-                    raise ValueError(
-                        "Could not get sender id from redis")
-                self.shared_storage = self.redis_client.get_shared_storage()
-                print(
-                    f"Successfully initialized {self.sender_id} {self.service_type} from redis")
-            except Exception as e:
+            return config["sender_id"], config["shared_storage"], "file"
+        try:
+            # try initializing from redis
+            sender_id = self.redis_client.get_sender_id()
+            if not sender_id:
                 raise ValueError(
-                    f"Failed to initialize from redis. Aborting. Error: {e}")
+                    "Could not get sender id from redis")
+            return sender_id, self.redis_client.get_shared_storage(), "redis"
+        except Exception as e:
+            raise ValueError(
+                f"Failed to initialize from redis. Aborting. Error: {e}")
+
+    def _store_config(self):
+        """
+        Writes the shared storage and sender ID to redis.
+        """
+        self.redis_client.set_shared_storage(self.shared_storage)
+        self.redis_client.set_sender_id(self.sender_id)
+
+    async def _apply_config(self, config):
+        """
+        Sets the sender ID and shared storage read by BaseService._read_config, and writes them to redis if they were
+        read from the config file.
+
+        Args:
+            config (awaitable): Awaitable returning the result of BaseService._read_config.
+        """
+        self.sender_id, self.shared_storage, source = await config
+        if source == "file":
+            await asyncio.get_running_loop().run_in_executor(None, self._store_config)
+        print(
+            f"Successfully initialized {self.sender_id} {self.service_type} from {source}")
 
-    def run(self, nats_host="127.0.0.1", nats_port="4222", nats_user=None, nats_password=None, api_host="127.0.0.1", api_port=8000, redis_host="127.0.0.1", redis_port=6379, redis_password=None, kubernetes_config_file=None):
+    async def _load_config(self):
+        """
+        attempt to fetch a configuration json
+        containing the sender_id and initial shared_storage from a file, if that fails attempts to get it from redis.
+        """
+        await self._apply_config(asyncio.get_running_loop().run_in_executor(None, self._read_config))
+
+    def run(self, nats_host="127.0.0.1", nats_port="4222", nats_user=None, nats_password=None, api_host="127.0.0.1", api_port=8000, redis_host="127.0.0.1", redis_port=6379, redis_password=None, kubernetes_config_file=None, redis_write_behind=None, debug_endpoints=None, codec=None, validation=None, compression=None):
         """
         Main entrypoint to starting the service. Will register all the callbacks with NATS and REST and start the event loop. Will first attempt to fetch a configuration json
         containing the sender_id and initial shared_storage from a file, if that fails attempts to get it from redis.
@@ -410,6 +913,23 @@ class BaseService():
             redis_port (int, optional): Redis server port. Defaults to 6379.
             redis_password (str, optional): Redis server password. Defaults to None.
             kubernetes_config_file (str, optional): Kubernetes config file pah. Defaults to None.
+            redis_write_behind (bool, optional): If True, shared storage changes are written to Redis by a background
+                task instead of after every callback, so readers of the shared storage in Redis may see it a flush
+                interval late. Defaults to None, which uses the environment variable KUBESAT_REDIS_WRITE_BEHIND or
+                writes every change right after its callback if it is not set.
+            debug_endpoints (bool, optional): If True, the REST API provides the /debug/profile and /debug/memory
+                endpoints. Defaults to None, which enables them if the environment variable KUBESAT_DEBUG_ENDPOINTS
+                is set to 1 or true.
+            codec (str, optional): Codec used to encode the sent messages, one of "json", "fast_json", "msgpack" or
+                "cbor". Messages of every codec are received, so services can switch codecs one at a time. Defaults to
+                None, which uses the environment variable KUBESAT_CODEC or "json" if it is not set.
+            validation (str, optional): Validation modes of the messages and the shared storage, e.g.
+                "sample:10,internal.data.out=off", see ValidationPolicy.configure. Defaults to None, which uses the
+                environment variable KUBESAT_VALIDATION or validates everything if it is not set.
+            compression (str, optional): Compression of sent messages of at least a threshold size, "zlib" or "lz4"
+                optionally followed by the threshold in bytes, e.g. "zlib:4096". Compressed messages are always
+                received. Defaults to None, which uses the environment variable KUBESAT_COMPRESSION or sends messages
+                uncompressed if it is not set.
         """
 
         self.nats_host = nats_host
@@ -421,13 +941,26 @@ class BaseService():
         self.redis_host = redis_host
         self.redis_port = redis_port
         self.redis_password = redis_password
+        if redis_write_behind is None:
+            redis_write_behind = os.environ.get("KUBESAT_REDIS_WRITE_BEHIND", "").lower() in ("1", "true")
+        self.redis_write_behind = redis_write_behind
+        if debug_endpoints is None:
+            debug_endpoints = os.environ.get("KUBESAT_DEBUG_ENDPOINTS", "").lower() in ("1", "true")
+        self.codec = codec or os.environ.get("KUBESAT_CODEC", "json")
+
+        # fail before starting the server if the codec is unknown or not installed
+        get_codec(self.codec)
+        validation_policy.configure(validation or os.environ.get("KUBESAT_VALIDATION", ""))
+        self.compression = compression or os.environ.get("KUBESAT_COMPRESSION") or None
+        if self.compression:
+            Compressor.from_spec(self.compression)
 
         # creating redis client
         self.redis_client = RedisHandler(
             self.service_type, self._schema, host=self.redis_host, port=self.redis_port, password=self.redis_password)
 
-        # creating kubernetes client
-        self.kubernetes_client = KubernetesHandler(kubernetes_config_file)
+        # the kubernetes client is only created once it is used
+        self._kubernetes_config_file = kubernetes_config_file
 
         # creating api
         self._api = FastAPI()
@@ -436,10 +969,16 @@ class BaseService():
         @self._api.get("/data/{data_id}")
         async def get_data(data_id: str):
             try:
-                # retrieve the data from the NATS client buffer and return it
-                message = await self.nats_client.retrieve_data_message(data_id)
-                message.sender_id = self.nats_client.sender_id
-                return message.encode_json()
+                # retrieve the data encoded by NatsHandler.send_data from the NATS client buffer and return it as it is
+                data = await self.nats_client.retrieve_data_bytes(data_id)
+                if len(data) > self.data_stream_threshold:
+                    return StreamingResponse(_iter_chunks(data, self.data_chunk_size), media_type="application/json")
+                return Response(content=data, media_type="application/json")
+            except KeyError:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Data message not found or expired"
+                )
             except Exception as e:
                 print("Error!")
                 await self._logger.error(traceback.format_exc())
@@ -448,6 +987,59 @@ class BaseService():
                     detail="An error occured"
                 )
 
+        # registering the REST endpoint used to query several data messages at once, missing ones are returned as null
+        @self._api.post("/data/batch")
+        async def get_data_batch(request: Request):
+            try:
+                data_ids = (await request.json())["ids"]
+            except (ValueError, TypeError, KeyError):
+                data_ids = None
+            if not isinstance(data_ids, list) or not all(isinstance(data_id, str) for data_id in data_ids):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Request body must be a JSON object with a list of ids"
+                )
+            try:
+                parts = []
+                for data_id in data_ids:
+                    try:
+                        parts.append(await self.nats_client.retrieve_data_bytes(data_id))
+                    except KeyError:
+                        parts.append(b"null")
+                return Response(content=b"[" + b",".join(parts) + b"]", media_type="application/json")
+            except Exception as e:
+                await self._logger.error(traceback.format_exc())
+                raise HTTPException(
+                    status_code=500,
+                    detail="An error occured"
+                )
+
+        # registering the REST endpoint providing the timings of the startup phases
+        @self._api.get("/startup")
+        async def get_startup():
+            return self.startup_timings.as_dict()
+
+        # registering the REST endpoint providing the metrics of the service in Prometheus text format
+        @self._api.get("/metrics")
+        async def get_metrics():
+            return PlainTextResponse(self.metrics.render(), media_type="text/plain; version=0.0.4")
+
+        # registering the profiling endpoints only if enabled, so they cost nothing otherwise
+        if debug_endpoints:
+            memory_tracker = MemoryTracker()
+
+            @self._api.get("/debug/profile")
+            async def get_profile(seconds: float = 5):
+                # sample the event loop thread from an executor thread, so the loop keeps running while being profiled
+                sampler = StackSampler(threading.get_ident())
+                loop = asyncio.get_running_loop()
+                stacks = await loop.run_in_executor(None, sampler.sample, min(max(seconds, 0), 60))
+                return PlainTextResponse(StackSampler.collapsed(stacks))
+
+            @self._api.get("/debug/memory")
+            async def get_memory(limit: int = 20):
+                return PlainTextResponse(memory_tracker.diff(limit))
+
         # Since our initialization consists of async functions, registers it as a startup callback that executes
         # once the event loop starts
         @self._api.on_event("startup")
@@ -456,32 +1048,40 @@ class BaseService():
             # set the execption handler to None. This makes exception actually stop code execution instead of going unnoticed
             loop = asyncio.get_running_loop()
             loop.set_exception_handler(None)
+            timings = self.startup_timings
+            timings.reset()
 
-            # connect to the NATS server
+            # connect to the NATS server while retrieving the initial shared_storage, configurations that are
+            # requested over NATS wait for the connection in BaseService._load_config
             self.nats_client = NatsHandler("default", host=self.nats_host, port=self.nats_port, user=self.nats_user,
-                                           password=self.nats_password, api_host=self.api_host, api_port=self.api_port, loop=asyncio.get_running_loop())
-            await self.nats_client.connect()
+                                           password=self.nats_password, api_host=self.api_host, api_port=self.api_port, loop=asyncio.get_running_loop(), codec=self.codec, compression=self.compression)
+            self._nats_connected = loop.create_task(timings.track("nats_connect", self.nats_client.connect()))
 
             # creating logger
             self._logger = NatsLoggerFactory.get_logger(
                 self.nats_client, self.service_type)
-
-            # retrieving initial shared_storage
-            await self._load_config()
+            await asyncio.gather(self._nats_connected, timings.track("load_config", self._load_config()))
 
             # setting nats sender id
             self.nats_client.sender_id = self.sender_id
 
+            # buffer shared storage changes and write them to redis in the background
+            if self.redis_write_behind:
+                await self.redis_client.start_write_behind()
+
             # registering callbacks
-            await self._register_callbacks()
+            await timings.track("register_callbacks", self._register_callbacks())
+            self._loop_lag.start()
 
             # execute startup callback
             if self._startup_callback:
-                if len(signature(self._startup_callback).parameters) == 4:
-                    # include kubernetes_client
-                    await self._startup_callback(self.nats_client, self.shared_storage, self._logger, self.kubernetes_client)
-                else:
-                    await self._startup_callback(self.nats_client, self.shared_storage, self._logger)
+                with timings.phase("startup_callback"):
+                    if len(signature(self._startup_callback).parameters) == 4:
+                        # include kubernetes_client
+                        await self._startup_callback(self.nats_client, self.shared_storage, self._logger, self.kubernetes_client)
+                    else:
+                        await self._startup_callback(self.nats_client, self.shared_storage, self._logger)
+            print(f"Started {self.sender_id} {self.service_type} in {timings.total:.3f}s")
 
         # registering the nats shutdown with the api server
         @self._api.on_event("shutdown")
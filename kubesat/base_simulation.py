@@ -31,17 +31,26 @@ class BaseSimulation(BaseService):
         super().__init__(service_type, schema, config_path)
 
         # subscribing to timestep by default to update time in nats_handler
-        @self.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+        @self.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE, read_only=True)
         async def simulation_timepulse(message: Message, nats_handler: NatsHandler, shared_storage: dict, logger: JsonLogger):
             nats_handler.time_sent = message.data["time"]
 
     async def _load_config(self):
         """
         Override _load_config to get the configuration from a cluster service that has a callback registered on channel "initialize.service"
-        for simulation
+        for simulation. The fallback configuration is read in the meantime, so it is ready if the request times out.
         """
 
+        loop = asyncio.get_running_loop()
+        fallback = loop.run_in_executor(None, self._read_config)
+
+        # retrieve the exception of an unused fallback, so it is not reported as never retrieved
+        fallback.add_done_callback(lambda future: future.cancelled() or future.exception())
         try:
+            # the request needs the NATS connection, which is established concurrently by BaseService.run
+            if self._nats_connected is not None:
+                await self._nats_connected
+
             # requesting a config from the config service
             message = self.nats_client.create_message(
                 self.service_type, MessageSchemas.SERVICE_TYPE_MESSAGE)
@@ -58,13 +67,12 @@ class BaseSimulation(BaseService):
             self.shared_storage = config_response.data["shared_storage"]
 
             # write the shared storage and sender ID to Redis
-            self.redis_client.set_sender_id(self.sender_id)
-            self.redis_client.set_shared_storage(self.shared_storage)
+            await loop.run_in_executor(None, self._store_config)
             print(
                 f"Successfully initialized {self.sender_id} {self.service_type} from config service")
         except:
             try:
-                await super()._load_config()
+                await self._apply_config(fallback)
             except Exception as e:
                 raise ValueError(
                     f"Failed to load configuration: {e}")
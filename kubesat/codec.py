@@ -0,0 +1,324 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import zlib
+
+# the faster and binary codecs and lz4 are optional, they are only required by the services that use them
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# marker bytes of compressed messages, whose decompressed content is a message encoded with any of the codecs
+ZLIB_MARKER = b"\x03"
+LZ4_MARKER = b"\x04"
+COMPRESSIONS = ("zlib", "lz4")
+
+# largest size in bytes a received message is decompressed to, so a small message can not exhaust the memory
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+
+class Codec:
+    """
+    Encoding of messages on the wire. Binary encodings start with a marker byte identifying the codec, which never
+    starts a JSON text, so a receiver can decode the messages of every codec no matter which one it sends with.
+    """
+
+    name = None
+    marker = b""
+
+    def dumps(self, obj) -> bytes:
+        """
+        Encodes a JSON compatible object, including the marker byte.
+        """
+        raise NotImplementedError
+
+    def loads(self, data: bytes):
+        """
+        Decodes an encoded object, without the marker byte.
+        """
+        raise NotImplementedError
+
+    @property
+    def available(self) -> bool:
+        """
+        True if the package the codec depends on is installed.
+        """
+        return True
+
+
+class JsonCodec(Codec):
+    """
+    JSON text encoded with the standard library, understood by every version of the services.
+    """
+
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    def loads(self, data: bytes):
+        return json.loads(data.decode())
+
+
+class FastJsonCodec(JsonCodec):
+    """
+    JSON text encoded with orjson if it is installed, which is several times faster than the standard library. The
+    output is plain JSON, so it needs no marker byte. Falls back to the standard library for values orjson does not
+    support, e.g. integers beyond 64 bit. Unlike the standard library, orjson encodes NaN and infinity as null.
+    """
+
+    name = "fast_json"
+
+    def dumps(self, obj) -> bytes:
+        if orjson is None:
+            return super().dumps(obj)
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, data: bytes):
+        if orjson is None:
+            return super().loads(data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().loads(data)
+
+
+class MsgpackCodec(Codec):
+    """
+    MessagePack encoding, which stores floats in 9 bytes instead of up to 24 characters of JSON. Requires msgpack.
+    """
+
+    name = "msgpack"
+    marker = b"\x01"
+
+    @property
+    def available(self) -> bool:
+        return msgpack is not None
+
+    def dumps(self, obj) -> bytes:
+        return self.marker + msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class CborCodec(Codec):
+    """
+    CBOR encoding, a binary encoding similar to MessagePack. Requires cbor2.
+    """
+
+    name = "cbor"
+    marker = b"\x02"
+
+    @property
+    def available(self) -> bool:
+        return cbor2 is not None
+
+    def dumps(self, obj) -> bytes:
+        return self.marker + cbor2.dumps(obj)
+
+    def loads(self, data: bytes):
+        return cbor2.loads(data)
+
+
+JSON = JsonCodec()
+FAST_JSON = FastJsonCodec()
+MSGPACK = MsgpackCodec()
+CBOR = CborCodec()
+
+# codecs by name and binary codecs by the value of their marker byte
+CODECS = {codec.name: codec for codec in (JSON, FAST_JSON, MSGPACK, CBOR)}
+_MARKERS = {codec.marker[0]: codec for codec in CODECS.values() if codec.marker}
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Returns the codec of the given name.
+
+    Args:
+        name (str): One of "json", "fast_json", "msgpack" or "cbor".
+
+    Raises:
+        ValueError: If the codec is unknown or the package it depends on is not installed.
+
+    Returns:
+        Codec: The codec.
+    """
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown codec {name}, expected one of {', '.join(CODECS)}")
+    if not codec.available:
+        raise ValueError(f"Codec {name} is not available, its package is not installed")
+    return codec
+
+
+def _decompress(data: bytes) -> bytes:
+    """
+    Decompresses a message compressed by a Compressor, including its marker byte.
+    """
+    if data[:1] == ZLIB_MARKER:
+        decompressor = zlib.decompressobj()
+        decompressed = decompressor.decompress(memoryview(data)[1:], MAX_DECOMPRESSED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"Compressed message exceeds {MAX_DECOMPRESSED_SIZE} bytes")
+        return decompressed
+    if lz4 is None:
+        raise ValueError("Received a message compressed with lz4, but its package is not installed")
+    decompressor = lz4.frame.LZ4FrameDecompressor()
+    decompressed = decompressor.decompress(bytes(memoryview(data)[1:]), max_length=MAX_DECOMPRESSED_SIZE)
+    if not decompressor.eof:
+        raise ValueError(f"Compressed message exceeds {MAX_DECOMPRESSED_SIZE} bytes")
+    return decompressed
+
+
+def decode(data: bytes):
+    """
+    Decodes a message encoded with any of the codecs, using the marker byte to identify binary codecs. Compressed
+    messages are decompressed first.
+
+    Args:
+        data (bytes): Encoded message.
+
+    Raises:
+        ValueError: If the message was encoded or compressed with a package that is not installed, or is too large
+            once decompressed.
+
+    Returns:
+        object: Decoded message.
+    """
+    if data[:1] in (ZLIB_MARKER, LZ4_MARKER):
+        data = _decompress(data)
+    codec = _MARKERS.get(data[0]) if data else None
+    if codec is None:
+        return FAST_JSON.loads(data)
+    if not codec.available:
+        raise ValueError(f"Received a message encoded with {codec.name}, but its package is not installed")
+    return codec.loads(memoryview(data)[1:])
+
+
+class CompressionStats:
+    """
+    Sizes of the messages sent on a subject before and after compression.
+    """
+
+    __slots__ = ("messages", "compressed", "raw_bytes", "sent_bytes")
+
+    def __init__(self):
+        self.messages = 0
+        self.compressed = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    @property
+    def ratio(self) -> float:
+        """
+        Encoded size divided by the sent size, 1 if nothing was compressed.
+        """
+        return self.raw_bytes / self.sent_bytes if self.sent_bytes else 1.0
+
+
+class Compressor:
+    """
+    Compresses encoded messages above a size threshold and prefixes them with a marker byte, which kubesat.codec.decode
+    recognizes, so receivers decompress them no matter whether they compress themselves. Messages that do not get
+    smaller are sent as they are. Keeps CompressionStats per subject.
+    """
+
+    def __init__(self, algorithm: str = "zlib", threshold: int = 16384, level: int = 6):
+        """
+        Initializes the compressor.
+
+        Args:
+            algorithm (str, optional): "zlib" or "lz4", which is faster but compresses less and requires lz4.
+                Defaults to "zlib".
+            threshold (int, optional): Encoded messages of at least this many bytes are compressed. Defaults to 16384.
+            level (int, optional): zlib compression level from 1 (fastest) to 9 (smallest). Defaults to 6.
+
+        Raises:
+            ValueError: If the algorithm is unknown or its package is not installed.
+        """
+        if algorithm not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {algorithm}, expected one of {', '.join(COMPRESSIONS)}")
+        if algorithm == "lz4" and lz4 is None:
+            raise ValueError("Compression lz4 is not available, its package is not installed")
+        self.algorithm = algorithm
+        self.threshold = threshold
+        self.level = level
+        self.stats = {}
+
+    def compress(self, subject: str, data: bytes) -> bytes:
+        """
+        Compresses an encoded message if it is large enough, recording its sizes.
+
+        Args:
+            subject (str): Subject the message is sent on. Reply subjects are counted as "_INBOX".
+            data (bytes): Encoded message.
+
+        Returns:
+            bytes: The compressed message including its marker byte, or the message as it is.
+        """
+        if subject.startswith("_INBOX."):
+            subject = "_INBOX"
+        stats = self.stats.get(subject)
+        if stats is None:
+            stats = self.stats[subject] = CompressionStats()
+        stats.messages += 1
+        stats.raw_bytes += len(data)
+
+        if len(data) >= self.threshold:
+            if self.algorithm == "zlib":
+                compressed = ZLIB_MARKER + zlib.compress(data, self.level)
+            else:
+                compressed = LZ4_MARKER + lz4.frame.compress(data)
+            if len(compressed) < len(data):
+                stats.compressed += 1
+                data = compressed
+        stats.sent_bytes += len(data)
+        return data
+
+    @classmethod
+    def from_spec(cls, spec: str):
+        """
+        Creates a compressor from a specification of its algorithm and optional threshold, e.g. "zlib:4096".
+
+        Args:
+            spec (str): Specification of the compressor.
+
+        Raises:
+            ValueError: If the algorithm is unknown or not installed, or the threshold is not a number.
+
+        Returns:
+            Compressor: New compressor.
+        """
+        algorithm, _, threshold = spec.partition(":")
+        if threshold:
+            return cls(algorithm, int(threshold))
+        return cls(algorithm)
@@ -0,0 +1,208 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections import deque
+from typing import Callable
+
+# marker for callbacks that did not declare which shared storage keys they access
+ALL_KEYS = "*"
+
+
+def _overlap(first, second) -> bool:
+    """
+    Checks whether two sets of declared storage keys overlap.
+    """
+    return not first.isdisjoint(second)
+
+
+class StorageAccess:
+    """
+    Shared storage keys a callback reads and writes. Callbacks that declare their keys can run concurrently with
+    callbacks whose keys do not conflict. Callbacks that do not declare them may read and write the whole storage (or
+    only read it, if they are read only). They do not wait for each other, except for their own previous runs, but
+    conflict with every declared callback that could lose an update or read a half applied one: undeclared writers with
+    all declared callbacks, undeclared read only callbacks with declared writers.
+    """
+
+    def __init__(self, reads: list = None, writes: list = None, read_only: bool = False, serialize_by: str = None):
+        """
+        Initializes the access declaration of a callback.
+
+        Args:
+            reads (list, optional): Top level shared storage keys the callback reads. Defaults to None.
+            writes (list, optional): Top level shared storage keys the callback changes. Defaults to None.
+            read_only (bool, optional): Whether the callback does not change the shared storage. Defaults to False.
+            serialize_by (str, optional): Name of a Message attribute, e.g. "origin_id". Messages with the same value
+                are handled one after another by the callback. Defaults to None.
+        """
+        self.declared = reads is not None or writes is not None
+        if self.declared:
+            self.reads = frozenset(reads or ())
+            self.writes = frozenset(() if read_only else writes or ())
+        else:
+            self.reads = ALL_KEYS
+            self.writes = frozenset() if read_only else ALL_KEYS
+        self.serialize_by = serialize_by
+
+    @property
+    def concurrent(self) -> bool:
+        """
+        True if the callback may run as task, i.e. it declared its keys or only reads the storage. Other callbacks
+        are awaited by the subscription or schedule running them.
+        """
+        return self.writes != ALL_KEYS
+
+    def conflicts(self, other) -> bool:
+        """
+        Checks whether two callbacks must not run at the same time because of their shared storage access. Two
+        callbacks that did not declare their keys never conflict with each other.
+
+        Args:
+            other (StorageAccess): Access declaration of the other callback.
+
+        Returns:
+            bool: True if one of them writes a key the other one reads or writes, where an undeclared callback reads
+                and, unless it is read only, writes every key.
+        """
+        if not self.declared and not other.declared:
+            return False
+        if not self.declared or not other.declared:
+            undeclared, declared = (other, self) if self.declared else (self, other)
+            if undeclared.writes == ALL_KEYS:
+                return bool(declared.reads or declared.writes)
+            return bool(declared.writes)
+        return _overlap(self.writes, other.writes) or _overlap(self.writes, other.reads) or _overlap(self.reads, other.writes)
+
+
+class _Ticket:
+    """
+    A callback execution that waits for or holds access to the shared storage.
+    """
+
+    def __init__(self, access: StorageAccess, serial_key, future: asyncio.Future):
+        self.access = access
+        self.serial_key = serial_key
+        self.future = future
+
+    def conflicts(self, other) -> bool:
+        if self.serial_key is not None and self.serial_key == other.serial_key:
+            return True
+        return self.access.conflicts(other.access)
+
+
+class CallbackScheduler:
+    """
+    Runs callbacks according to their declared shared storage access. Callbacks are admitted in the order they were
+    submitted, and a callback only starts once it conflicts neither with a running callback nor with an earlier
+    callback that is still waiting, so conflicting callbacks keep their order. Concurrent callbacks run as tasks,
+    and at most max_concurrency of them are in flight, which pushes back on the subscriptions submitting them.
+    """
+
+    def __init__(self, on_error: Callable, max_concurrency: int = 16):
+        """
+        Initializes the scheduler.
+
+        Args:
+            on_error (function): Async function without arguments called from within an except block whenever a
+                callback running as task fails.
+            max_concurrency (int, optional): Maximum number of callbacks running or waiting as tasks. Defaults to 16.
+        """
+        self.max_concurrency = max_concurrency
+        self._on_error = on_error
+        self._capacity = None
+        self._active = []
+        self._waiting = deque()
+        self._tasks = set()
+
+    def _wake(self):
+        """
+        Admits all waiting callbacks that conflict neither with running callbacks nor with earlier waiting ones.
+        """
+        blocked = []
+        for ticket in list(self._waiting):
+            if ticket.future.done():
+                # cancelled while waiting, removed once its caller handles the cancellation
+                continue
+            if any(ticket.conflicts(other) for other in self._active) or any(ticket.conflicts(other) for other in blocked):
+                blocked.append(ticket)
+                continue
+            self._waiting.remove(ticket)
+            self._active.append(ticket)
+            ticket.future.set_result(None)
+
+    def _enqueue(self, access: StorageAccess, serial_key) -> _Ticket:
+        ticket = _Ticket(access, serial_key, asyncio.get_running_loop().create_future())
+        self._waiting.append(ticket)
+        self._wake()
+        return ticket
+
+    def _release(self, ticket: _Ticket):
+        if ticket in self._active:
+            self._active.remove(ticket)
+        elif ticket in self._waiting:
+            self._waiting.remove(ticket)
+        self._wake()
+
+    async def _run(self, ticket: _Ticket, function: Callable):
+        """
+        Task running a concurrent callback once it is admitted.
+        """
+        try:
+            await ticket.future
+            await function()
+        except Exception:
+            await self._on_error()
+        finally:
+            self._release(ticket)
+            self._capacity.release()
+
+    async def submit(self, access: StorageAccess, serial_key, function: Callable, inline: bool = False):
+        """
+        Submits a callback execution. Callbacks that may run concurrently are started as task once they are admitted,
+        so this only waits until there is capacity for another task. Other callbacks, or any callback if inline is
+        True, are awaited and their exceptions are raised to the caller.
+
+        Args:
+            access (StorageAccess): Shared storage access of the callback.
+            serial_key (object): Key of the message, callbacks with the same key do not run concurrently. None to not
+                serialize by key.
+            function (function): Async function without arguments to execute.
+            inline (bool, optional): Whether to await the callback instead of running it as task. Defaults to False.
+
+        Returns:
+            object: The return value of the function if it was awaited, otherwise None.
+        """
+        if inline or not access.concurrent:
+            ticket = self._enqueue(access, serial_key)
+            try:
+                await ticket.future
+                return await function()
+            finally:
+                self._release(ticket)
+
+        if self._capacity is None:
+            self._capacity = asyncio.Semaphore(self.max_concurrency)
+        await self._capacity.acquire()
+        ticket = self._enqueue(access, serial_key)
+        task = asyncio.get_running_loop().create_task(self._run(ticket, function))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def join(self):
+        """
+        Waits until all callbacks running as task are done.
+        """
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
@@ -0,0 +1,243 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import aiohttp
+from collections import deque
+from typing import Callable
+
+
+class DataFetcher:
+    """
+    Long-lived HTTP client used to get data messages from the REST API of other services. Keeps a pool of keep-alive
+    connections and a DNS cache, so data packets do not pay for connection setup and name resolution every time.
+    Data messages requested from the same endpoint within batch_window seconds are fetched with a single request.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 16, timeout: float = 10, keepalive_timeout: float = 30,
+                 batch_window: float = 0.005, max_batch: int = 64):
+        """
+        Initializes the fetcher. The HTTP session is created by DataFetcher.start().
+
+        Args:
+            limit (int, optional): Maximum number of open connections. Defaults to 100.
+            limit_per_host (int, optional): Maximum number of open connections to the same host. Defaults to 16.
+            timeout (float, optional): Seconds after which a request is aborted. Defaults to 10.
+            keepalive_timeout (float, optional): Seconds an idle connection is kept open. Defaults to 30.
+            batch_window (float, optional): Seconds DataFetcher.get_batched waits for more requests to the same
+                endpoint. 0 disables batching. Defaults to 0.005.
+            max_batch (int, optional): Maximum number of data messages fetched with one request. Defaults to 64.
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._session = None
+        self._batches = {}
+        self._unbatched = set()
+        self._tasks = set()
+
+    async def start(self):
+        """
+        Creates the HTTP session in the running event loop.
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self):
+        """
+        Fetches the pending batches and closes the HTTP session and all its connections.
+        """
+        for route_url in list(self._batches):
+            self._flush_batch(route_url)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_json(self, url: str) -> dict:
+        """
+        Sends a GET request and parses the JSON response.
+
+        Args:
+            url (str): URL to get.
+
+        Raises:
+            ValueError: If the response status is not 200.
+
+        Returns:
+            dict: Parsed response.
+        """
+        await self.start()
+        async with self._session.get(url) as response:
+
+            # check whether GET was successful
+            if response.status != 200:
+                raise ValueError(f"GET {url} failed with status {response.status}: {await response.text()}")
+            return await response.json()
+
+    async def get_batched(self, route_url: str, data_id: str) -> dict:
+        """
+        Gets a data message, batching it with the other data messages requested from the same route within
+        batch_window seconds into one POST request to the route's /batch endpoint. Falls back to single GET requests
+        for services without that endpoint.
+
+        Args:
+            route_url (str): URL of the data route of a service, e.g. http://host:port/data.
+            data_id (str): ID of the data message.
+
+        Raises:
+            ValueError: If the request fails or the data message does not exist.
+
+        Returns:
+            dict: Parsed data message.
+        """
+        if not self.batch_window or route_url in self._unbatched:
+            return await self.get_json(f"{route_url}/{data_id}")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if route_url not in self._batches:
+            timer = loop.call_later(self.batch_window, self._flush_batch, route_url)
+            self._batches[route_url] = ([], timer)
+        requests, _ = self._batches[route_url]
+        requests.append((data_id, future))
+        if len(requests) >= self.max_batch:
+            self._flush_batch(route_url)
+        return await future
+
+    def _flush_batch(self, route_url: str):
+        """
+        Starts fetching the data messages collected for a route.
+        """
+        requests, timer = self._batches.pop(route_url)
+        timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._fetch_batch(route_url, requests))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch_batch(self, route_url: str, requests: list):
+        """
+        Fetches a batch of data messages and resolves the futures of their callers.
+        """
+        try:
+            if len(requests) == 1:
+                results = [await self.get_json(f"{route_url}/{requests[0][0]}")]
+            else:
+                results = await self._post_batch(route_url, [data_id for data_id, _ in requests])
+        except Exception as e:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (data_id, future), result in zip(requests, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            elif result is None:
+                future.set_exception(ValueError(f"Data message {route_url}/{data_id} not found or expired"))
+            else:
+                future.set_result(result)
+
+    async def _post_batch(self, route_url: str, data_ids: list) -> list:
+        """
+        Requests several data messages at once, returns None for messages that do not exist.
+        """
+        await self.start()
+        url = f"{route_url}/batch"
+        async with self._session.post(url, json={"ids": data_ids}) as response:
+
+            # services without a batch endpoint get single requests from now on
+            if response.status in (404, 405):
+                self._unbatched.add(route_url)
+                fetches = [self.get_json(f"{route_url}/{data_id}") for data_id in data_ids]
+                return await asyncio.gather(*fetches, return_exceptions=True)
+            if response.status != 200:
+                raise ValueError(f"POST {url} failed with status {response.status}: {await response.text()}")
+            return await response.json()
+
+
+class FetchQueue:
+    """
+    Runs fetches concurrently, but hands their results to a callback in the order they were queued. At most
+    max_pending fetches are queued, further calls to FetchQueue.put wait until there is space again.
+    """
+
+    def __init__(self, callback: Callable, on_error: Callable, max_pending: int = 64):
+        """
+        Initializes an empty queue.
+
+        Args:
+            callback (function): Async function called with the result of each fetch, in queueing order.
+            on_error (function): Async function without arguments called from within an except block whenever a
+                fetch or the callback fails.
+            max_pending (int, optional): Maximum number of queued fetches. Defaults to 64.
+        """
+        self.max_pending = max_pending
+        self._callback = callback
+        self._on_error = on_error
+        self._pending = deque()
+        self._space = None
+        self._drain_task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def put(self, fetch):
+        """
+        Starts a fetch and queues its result.
+
+        Args:
+            fetch (coroutine): Coroutine returning the result to pass to the callback.
+        """
+        if self._space is None:
+            self._space = asyncio.Event()
+        while len(self._pending) >= self.max_pending:
+            self._space.clear()
+            await self._space.wait()
+
+        loop = asyncio.get_running_loop()
+        self._pending.append(loop.create_task(fetch))
+        if self._drain_task is None:
+            self._drain_task = loop.create_task(self._drain())
+
+    async def _drain(self):
+        """
+        Task passing the results of the queued fetches to the callback, oldest first.
+        """
+        try:
+            while self._pending:
+                try:
+                    await self._callback(await self._pending[0])
+                except Exception:
+                    await self._on_error()
+                finally:
+                    self._pending.popleft()
+                    self._space.set()
+        finally:
+            self._drain_task = None
+
+    async def join(self):
+        """
+        Waits until all queued results were passed to the callback.
+        """
+        while self._drain_task is not None:
+            await asyncio.shield(self._drain_task)
@@ -0,0 +1,261 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+    """
+    A data message stored in the table.
+    """
+    __slots__ = ("message", "encoded", "size", "expires", "reads_left")
+
+    def __init__(self, message, encoded: bytes, expires: float, reads_left: int):
+        self.message = message
+        self.encoded = encoded
+        self.size = len(encoded) if encoded is not None else 0
+        self.expires = expires
+        self.reads_left = reads_left
+
+
+class DataTable:
+    """
+    Table of the data messages a service offers through its REST API. An entry can be read any number of times until
+    it expires ttl seconds after it was added, or optionally until a given number of readers fetched it. Expired
+    entries are removed by a single timer that always waits for the earliest deadline in a heap, instead of one
+    sleeping task per entry. If the stored messages exceed max_bytes, the least recently used entries are evicted.
+    Messages are stored together with their encoded bytes, so they can be served without encoding them again.
+    """
+
+    def __init__(self, ttl: float = 5, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initializes an empty table.
+
+        Args:
+            ttl (float, optional): Seconds an entry can be read after it was added. Defaults to 5.
+            max_bytes (int, optional): Maximum total size of the stored messages. Defaults to 64 MiB.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._deadlines = []
+        self._counter = itertools.count()
+        self._bytes = 0
+        self._timer = None
+        self._timer_deadline = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, data_id):
+        return data_id in self._entries
+
+    def __getitem__(self, data_id):
+        return self.get(data_id)
+
+    def __setitem__(self, data_id, message):
+        self.put(data_id, message)
+
+    def __delitem__(self, data_id):
+        if not self.discard(data_id):
+            raise KeyError(data_id)
+
+    @property
+    def size(self) -> int:
+        """
+        Total size in bytes of the stored messages.
+        """
+        return self._bytes
+
+    @property
+    def stats(self) -> dict:
+        """
+        Counters describing the use of the table.
+        """
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def put(self, data_id: str, message, encoded: bytes = None, readers: int = None):
+        """
+        Adds a data message to the table, replacing an existing entry with the same ID.
+
+        Args:
+            data_id (str): ID the message is fetched with.
+            message (object): Data message to store.
+            encoded (bytes, optional): Encoded message, its size counts towards max_bytes. Defaults to None, which
+                encodes the message when it is first read as bytes.
+            readers (int, optional): Number of reads after which the entry is removed before it expires. Defaults
+                to None, which keeps it until it expires.
+        """
+        self.discard(data_id)
+        expires = time.monotonic() + self.ttl
+        entry = _Entry(message, encoded, expires, readers)
+        self._entries[data_id] = entry
+        self._bytes += entry.size
+        heapq.heappush(self._deadlines, (expires, next(self._counter), data_id))
+
+        # evict the least recently used entries, but never the one that was just added
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+        self._schedule_sweep()
+
+    def get(self, data_id: str):
+        """
+        Reads a data message from the table.
+
+        Args:
+            data_id (str): ID of the message.
+
+        Raises:
+            KeyError: If there is no such message or it expired.
+
+        Returns:
+            object: The stored message.
+        """
+        return self._read(data_id).message
+
+    def get_encoded(self, data_id: str) -> bytes:
+        """
+        Reads the encoded bytes of a data message from the table. Messages added without their encoding are encoded
+        with Message.encode_raw once.
+
+        Args:
+            data_id (str): ID of the message.
+
+        Raises:
+            KeyError: If there is no such message or it expired.
+
+        Returns:
+            bytes: The encoded message.
+        """
+        entry = self._read(data_id)
+        if entry.encoded is None:
+            entry.encoded = entry.message.encode_raw()
+            entry.size = len(entry.encoded)
+            if data_id in self._entries:
+                self._bytes += entry.size
+        return entry.encoded
+
+    def _read(self, data_id: str) -> _Entry:
+        """
+        Looks up an entry, counts the hit or miss and removes the entry once all expected readers fetched it.
+        """
+        entry = self._entries.get(data_id)
+        if entry is None or entry.expires <= time.monotonic():
+            self.misses += 1
+            raise KeyError(data_id)
+        self.hits += 1
+        self._entries.move_to_end(data_id)
+        if entry.reads_left is not None:
+            entry.reads_left -= 1
+            if entry.reads_left <= 0:
+                self.discard(data_id)
+        return entry
+
+    def discard(self, data_id: str) -> bool:
+        """
+        Removes a data message from the table. Its deadline stays in the heap and is skipped by the sweep.
+
+        Args:
+            data_id (str): ID of the message.
+
+        Returns:
+            bool: True if the message was stored, False otherwise
+        """
+        entry = self._entries.pop(data_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        return True
+
+    def expire(self, now: float = None) -> int:
+        """
+        Removes all entries whose deadline passed.
+
+        Args:
+            now (float, optional): Monotonic time to compare the deadlines with. Defaults to time.monotonic().
+
+        Returns:
+            int: Number of removed entries.
+        """
+        if now is None:
+            now = time.monotonic()
+        expired = 0
+        while self._deadlines and self._deadlines[0][0] <= now:
+            expires, _, data_id = heapq.heappop(self._deadlines)
+            entry = self._entries.get(data_id)
+
+            # skip deadlines of entries that were already removed or replaced
+            if entry is not None and entry.expires == expires:
+                self.discard(data_id)
+                expired += 1
+        self.expirations += expired
+        return expired
+
+    def _sweep(self):
+        """
+        Timer callback removing the expired entries and waiting for the next deadline.
+        """
+        self._timer = None
+        self._timer_deadline = None
+        self.expire()
+        self._schedule_sweep()
+
+    def _schedule_sweep(self):
+        """
+        Makes sure the sweep timer fires at the earliest deadline. Without a running event loop, entries are only
+        removed by DataTable.expire and reads of expired entries fail.
+        """
+        if not self._deadlines:
+            return
+        deadline = self._deadlines[0][0]
+        if self._timer_deadline is not None and self._timer_deadline <= deadline:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(max(deadline - time.monotonic(), 0), self._sweep)
+        self._timer_deadline = deadline
+
+    def clear(self):
+        """
+        Removes all entries and stops the sweep timer.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+        self._timer_deadline = None
+        self._entries.clear()
+        self._deadlines.clear()
+        self._bytes = 0
@@ -0,0 +1,135 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections import deque
+from typing import Callable
+
+# what a full queue does with an incoming message
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+CONFLATE = "conflate"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, CONFLATE)
+
+
+class PendingQueue:
+    """
+    Bounded queue of the raw messages a subscription received but did not handle yet. Messages are handed to the
+    handler one after another by a task. Once the queue holds max_messages messages or max_bytes bytes, the policy
+    decides what is dropped: "drop_oldest" drops the oldest pending messages to make room, "drop_newest" drops the
+    incoming message and "conflate" drops all pending messages, so only the latest one is handled next.
+    """
+
+    def __init__(self, handler: Callable, on_error: Callable, max_messages: int = 65536,
+                 max_bytes: int = 64 * 1024 * 1024, policy: str = DROP_NEWEST):
+        """
+        Initializes an empty queue.
+
+        Args:
+            handler (function): Async function called with each raw message.
+            on_error (function): Async function without arguments called from within an except block whenever the
+                handler fails.
+            max_messages (int, optional): Maximum number of pending messages. Defaults to 65536.
+            max_bytes (int, optional): Maximum size of the pending messages in bytes. Defaults to 64 MiB.
+            policy (str, optional): One of "drop_oldest", "drop_newest" or "conflate". Defaults to "drop_newest",
+                which is what the NATS client does.
+
+        Raises:
+            ValueError: If the policy is unknown.
+        """
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {policy}, expected one of {', '.join(DROP_POLICIES)}")
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.dropped = 0
+        self.slow_consumer_events = 0
+        self._handler = handler
+        self._on_error = on_error
+        self._messages = deque()
+        self._bytes = 0
+        self._slow = False
+        self._drain_task = None
+
+    def __len__(self):
+        return len(self._messages)
+
+    @property
+    def pending_bytes(self) -> int:
+        """
+        Size of the pending messages in bytes.
+        """
+        return self._bytes
+
+    def _full(self, size: int) -> bool:
+        return len(self._messages) >= self.max_messages or self._bytes + size > self.max_bytes
+
+    def put(self, raw_message) -> bool:
+        """
+        Queues a raw message, applying the drop policy if the queue is full.
+
+        Args:
+            raw_message (nats.aio.client.Msg): Message received from NATS.
+
+        Returns:
+            bool: True if the message was queued, False if it was dropped.
+        """
+        size = len(raw_message.data)
+        if self._messages and self._full(size):
+
+            # count each time the consumer falls behind, not each dropped message
+            if not self._slow:
+                self._slow = True
+                self.slow_consumer_events += 1
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            if self.policy == CONFLATE:
+                self.dropped += len(self._messages)
+                self._messages.clear()
+                self._bytes = 0
+            while self._messages and self._full(size):
+                _, dropped_size = self._messages.popleft()
+                self._bytes -= dropped_size
+                self.dropped += 1
+
+        self._messages.append((raw_message, size))
+        self._bytes += size
+        if self._drain_task is None:
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+        return True
+
+    async def _drain(self):
+        """
+        Task handing the pending messages to the handler, oldest first.
+        """
+        try:
+            while self._messages:
+                raw_message, size = self._messages.popleft()
+                self._bytes -= size
+                if not self._messages:
+                    self._slow = False
+                try:
+                    await self._handler(raw_message)
+                except Exception:
+                    await self._on_error()
+        finally:
+            self._drain_task = None
+
+    async def join(self):
+        """
+        Waits until all pending messages were handled.
+        """
+        while self._drain_task is not None:
+            await asyncio.shield(self._drain_task)
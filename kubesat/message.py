@@ -12,15 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-from kubesat.validation import validate_json
+from kubesat import codec as codecs
+from kubesat.validation import validation_policy
+from kubesat.payloads import payload_types
 
 class Message:
     """
     Class that is used to hold data within the kubesat module. Has attributes to hold data and information
-    about message creation and origin
+    about message creation and origin. Messages decoded lazily only validate their envelope up front, their data is
+    validated on first access, so filters on the sender or origin can drop messages without validating the data.
     """
 
+    __slots__ = ("sender_id", "origin_id", "message_type", "time_sent", "schema", "_data", "_unvalidated", "_payload")
+
     def __init__(self, schema, sender_ID: str = None, origin_ID: str = None, message_type: str = None, time_sent: str = None, data: dict = None):
         """
         Initializes a new Message instance
@@ -38,33 +42,103 @@ class Message:
         self.origin_id = origin_ID
         self.message_type = message_type
         self.time_sent = time_sent
-        self.data = data
         self.schema = schema
+        self._data = data
+
+        # json message whose data is validated on first access, None once validated
+        self._unvalidated = None
+        self._payload = None
+
+    @property
+    def data(self):
+        """
+        Data of the message. Validates the message against its schema on first access if it was decoded lazily.
+
+        Raises:
+            ValidationError: If the lazily decoded message does not match its schema.
+        """
+        if self._unvalidated is not None:
+            # the message was already counted as checked when its envelope was validated
+            validation_policy.check(self._unvalidated, self.schema, self.sender_id, count=False)
+            self._unvalidated = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._unvalidated = None
+        self._payload = None
+
+    @property
+    def payload(self):
+        """
+        Data of the message as instance of the payload type generated from its schema, see kubesat.payloads. Created
+        from the data on first access, so later changes to the data dict are not reflected.
+
+        Raises:
+            TypeError: If the data of the schema is not an object with properties, so it has no payload type.
+            ValidationError: If the lazily decoded message does not match its schema.
+        """
+        if self._payload is None:
+            payload_type = payload_types.get(self.schema)
+            if payload_type is None:
+                raise TypeError(f"Schema {self.schema.get('name', 'unknown')} has no payload type")
+
+            # the data is validated along with the message, so the payload does not validate it again
+            self._payload = payload_type.from_wire(self.data, validate=False)
+        return self._payload
+
+    @property
+    def validated(self) -> bool:
+        """
+        False if the message was decoded lazily and its data was not validated yet.
+        """
+        return self._unvalidated is None
 
     @classmethod
-    def decode_raw(cls, raw_message: bytes, schema: dict):
+    def decode_raw(cls, raw_message: bytes, schema: dict, lazy: bool = False, subject: str = None):
         """
-        Decodes a byte encoded json string into a message object and validate it against a schema. 
+        Decodes a byte encoded message into a message object and validate it against a schema. The codec the message
+        was encoded with is detected from its marker byte.
 
         Args:
             raw_message (bytes): Raw message to be decoded.
             schema (dict): Schema to validate the raw message format against.
+            lazy (bool, optional): If True, only the envelope is validated and the data on first access. Defaults to False.
+            subject (str, optional): Subject the message was received on, used by the validation policy. Defaults to None.
 
         Returns:
             Message: New Message instance populated with the decoded raw input.
         """    
 
-        json_message = json.loads(raw_message.decode())
-        return cls.decode_json(json_message, schema)
+        json_message = cls.load_raw(raw_message)
+        return cls.decode_json(json_message, schema, lazy, subject)
+
+    @staticmethod
+    def load_raw(raw_message: bytes) -> dict:
+        """
+        Parses a byte encoded message into a dict without validating it. Used to parse a message once when
+        it is decoded with several schemas. Messages of every codec are parsed, see kubesat.codec.decode.
+
+        Args:
+            raw_message (bytes): Raw message to be parsed.
+
+        Returns:
+            dict: Parsed message.
+        """
+
+        return codecs.decode(raw_message)
 
     @classmethod
-    def decode_json(cls, json_message: dict, schema: dict):
+    def decode_json(cls, json_message: dict, schema: dict, lazy: bool = False, subject: str = None):
         """
-        Decodes a dict into a message object and validate it against a schema.
+        Decodes a dict into a message object and validate it against a schema, unless the validation policy skips it.
 
         Args:
             json_message (dict): String message to be decoded.
             schema (dict): Schema to validate the raw message format against.
+            lazy (bool, optional): If True, only the envelope is validated and the data on first access. Defaults to False.
+            subject (str, optional): Subject the message was received on, used by the validation policy. Defaults to None.
 
         Returns:
             Message: New Message instance populated with the decoded string input.
@@ -76,23 +150,36 @@ class Message:
             json_message["message_type"] = "unknown"
             if "name" in schema.keys():
                 json_message["message_type"] = schema["name"]
-        if not validate_json(json_message, schema):
-            return None
-        return cls(schema, sender_ID=json_message["sender_ID"], origin_ID=json_message["origin_ID"], message_type=json_message["message_type"], time_sent=json_message["time_sent"], data=json_message["data"])
-
-    def encode_raw(self) -> bytes:
+        sender_id = json_message.get("sender_ID")
+        validate = validation_policy.decide(schema.get("name", "unknown"), subject, sender_id)
+        if validate:
+            validation_policy.check(json_message, schema, sender_id, envelope=lazy)
+        message = cls(schema, sender_ID=json_message["sender_ID"], origin_ID=json_message["origin_ID"], message_type=json_message["message_type"], time_sent=json_message["time_sent"], data=json_message["data"])
+        if validate and lazy:
+            message._unvalidated = json_message
+        return message
+
+    def encode_raw(self, codec: codecs.Codec = codecs.JSON, subject: str = None) -> bytes:
         """
-        Creates a byte encoded json string representation of the message and validates it against its schema.
+        Creates a byte encoded representation of the message and validates it against its schema.
+
+        Args:
+            codec (Codec, optional): Codec used to encode the message. Defaults to JSON.
+            subject (str, optional): Subject the message is sent on, used by the validation policy. Defaults to None.
 
         Returns:
             bytes: Byte representation of the message
         """        
 
-        return json.dumps(self.encode_json()).encode()
+        return codec.dumps(self.encode_json(subject))
 
-    def encode_json(self) -> dict:
+    def encode_json(self, subject: str = None) -> dict:
         """
-        Creates a dict representation of the message and validates it against its schema.
+        Creates a dict representation of the message and validates it against its schema, unless the validation
+        policy skips it.
+
+        Args:
+            subject (str, optional): Subject the message is sent on, used by the validation policy. Defaults to None.
 
         Returns:
             dict: Dict representation of the message
@@ -103,8 +190,9 @@ class Message:
             "origin_ID": self.origin_id,
             "message_type": self.message_type,
             "time_sent": self.time_sent,
-            "data": self.data
+            "data": self._data
         }
-        if not validate_json(json_message, self.schema):
-            return None
+        if validation_policy.decide(self.schema.get("name", "unknown"), subject, self.sender_id):
+            validation_policy.check(json_message, self.schema, self.sender_id)
+            self._unvalidated = None
         return json_message
@@ -0,0 +1,321 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable
+
+# upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# stages of handling a message that are timed for every callback
+STAGES = ("decode", "validation", "callback", "commit", "redis")
+
+
+class Histogram:
+    """
+    Counts observed values in buckets of fixed upper bounds, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initializes an empty histogram.
+
+        Args:
+            buckets (tuple, optional): Sorted upper bounds of the buckets. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """
+        Adds a value to the histogram.
+
+        Args:
+            value (float): Observed value.
+        """
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """
+        Returns a list of (upper bound, number of values up to the bound) tuples, ending with the +Inf bucket.
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append((float("inf"), self.count))
+        return result
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f"{key}=\"{value}\"" for key, value in escaped) + "}"
+
+
+def render_family(name: str, kind: str, description: str, samples: list) -> list:
+    """
+    Renders a metric family in the Prometheus text format.
+
+    Args:
+        name (str): Name of the metric.
+        kind (str): Prometheus type of the metric, e.g. "counter", "gauge" or "histogram".
+        description (str): Help text of the metric.
+        samples (list): List of (labels, value) tuples. For histograms the values are Histogram objects.
+
+    Returns:
+        list: Lines of the rendered metric family.
+    """
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if kind == "histogram":
+            for bound, count in value.cumulative():
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+        else:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return lines
+
+
+class ServiceMetrics:
+    """
+    Metrics of a service: the number of runs and errors of every callback, latency histograms for every stage of
+    handling a message, and metric families provided by collector functions that are evaluated on each scrape.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initializes empty metrics.
+
+        Args:
+            buckets (tuple, optional): Upper bounds of the latency histogram buckets. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = buckets
+        self._histograms = {}
+        self._runs = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._collectors = []
+
+    def observe(self, stage: str, callback: str, seconds: float):
+        """
+        Records the time a stage of handling a message took.
+
+        Args:
+            stage (str): One of STAGES.
+            callback (str): Name of the callback.
+            seconds (float): Duration of the stage.
+        """
+        histogram = self._histograms.get((callback, stage))
+        if histogram is None:
+            histogram = self._histograms[(callback, stage)] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def histogram(self, callback: str, stage: str) -> Histogram:
+        """
+        Returns the latency histogram of a stage of a callback, or None if nothing was recorded yet.
+        """
+        return self._histograms.get((callback, stage))
+
+    def count_run(self, callback: str):
+        """
+        Counts a run of a callback.
+        """
+        self._runs[callback] += 1
+
+    def count_error(self, callback: str):
+        """
+        Counts a run of a callback that raised an exception.
+        """
+        self._errors[callback] += 1
+
+    def runs(self, callback: str) -> int:
+        """
+        Returns the number of runs of a callback.
+        """
+        return self._runs.get(callback, 0)
+
+    def add_collector(self, collector: Callable):
+        """
+        Registers a function providing additional metric families.
+
+        Args:
+            collector (function): Function without arguments returning a list of (name, kind, description, samples)
+                tuples as accepted by render_family.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Renders all metrics in the Prometheus text format.
+
+        Returns:
+            str: Metrics to serve on the /metrics endpoint.
+        """
+        lines = []
+        lines += render_family("kubesat_callback_runs_total", "counter", "Messages or runs handled per callback.",
+                               [({"callback": callback}, count) for callback, count in sorted(self._runs.items())])
+        lines += render_family("kubesat_callback_errors_total", "counter", "Callback runs that raised an exception.",
+                               [({"callback": callback}, count) for callback, count in sorted(self._errors.items())])
+        lines += render_family("kubesat_callback_stage_seconds", "histogram", "Latency of each stage of handling a message.",
+                               [({"callback": callback, "stage": stage}, histogram)
+                                for (callback, stage), histogram in sorted(self._histograms.items())])
+        for collector in self._collectors:
+            for family in collector():
+                lines += render_family(*family)
+        return "\n".join(lines) + "\n"
+
+
+class LoopLagMonitor:
+    """
+    Measures the event loop lag, i.e. how much later than requested a sleeping task is woken up. A high lag means
+    that callbacks block the event loop.
+    """
+
+    def __init__(self, interval: float = 0.5, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initializes the monitor.
+
+        Args:
+            interval (float, optional): Seconds between two measurements. Defaults to 0.5.
+            buckets (tuple, optional): Upper bounds of the lag histogram buckets. Defaults to DEFAULT_BUCKETS.
+        """
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.histogram = Histogram(buckets)
+        self._task = None
+
+    async def _measure(self):
+        """
+        Task sleeping for interval seconds and recording how late it wakes up.
+        """
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(time.monotonic() - start - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            self.histogram.observe(self.lag)
+
+    def start(self):
+        """
+        Starts measuring in the running event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._measure())
+
+    async def stop(self):
+        """
+        Stops measuring.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+class PhaseTimings:
+    """
+    Records when each phase of a procedure, e.g. the startup of a service, started and how long it took. Phases may
+    overlap, so the offsets show which phases ran concurrently.
+    """
+
+    def __init__(self, clock: Callable = time.monotonic):
+        """
+        Initializes empty timings starting now.
+
+        Args:
+            clock (function, optional): Monotonic clock returning seconds. Defaults to time.monotonic.
+        """
+        self._clock = clock
+        self.origin = clock()
+        self.phases = {}
+
+    def reset(self):
+        """
+        Drops the recorded phases and measures the following ones from now.
+        """
+        self.origin = self._clock()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Context manager recording the time the enclosed block takes as a phase.
+
+        Args:
+            name (str): Name of the phase.
+        """
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = (start - self.origin, self._clock() - start)
+
+    async def track(self, name: str, awaitable):
+        """
+        Awaits an awaitable, recording the time it takes as a phase.
+
+        Args:
+            name (str): Name of the phase.
+            awaitable (awaitable): Coroutine or future to await.
+
+        Returns:
+            object: Result of the awaitable.
+        """
+        with self.phase(name):
+            return await awaitable
+
+    @property
+    def total(self) -> float:
+        """
+        Seconds from the start until the end of the last phase.
+        """
+        return max((start + duration for start, duration in self.phases.values()), default=0.0)
+
+    def as_dict(self) -> dict:
+        """
+        Returns the phases as dictionary of their start offsets and durations in seconds, along with the total.
+        """
+        return {
+            "total": self.total,
+            "phases": {name: {"start": start, "duration": duration} for name, (start, duration) in self.phases.items()}
+        }
@@ -21,7 +21,10 @@ from datetime import datetime
 
 from nats.aio.client import Client as NATS
 
+from kubesat.codec import get_codec, Compressor
+from kubesat.data_table import DataTable
 from kubesat.message import Message
+from kubesat.payloads import Payload, payload_types
 from kubesat.validation import MessageSchemas
 
 
@@ -31,12 +34,17 @@ class NatsHandler:
     channel the user interacts with are allowed, which is specified through a config file.
     """
 
-    def __init__(self, sender_id, host="nats", port="4222", user=None, password=None, api_host="127.0.0.1", api_port="8000", nc=NATS(), loop=asyncio.get_event_loop()):
+    def __init__(self, sender_id, host="nats", port="4222", user=None, password=None, api_host="127.0.0.1", api_port="8000", nc=NATS(), loop=asyncio.get_event_loop(), codec="json", compression=None):
         """
         Initializes NatsHandler.
 
         Args:
             connection_string (String): Host and port of the NATS server
+            codec (str, optional): Name of the codec used to encode sent messages, see kubesat.codec. Received
+                messages are decoded with the codec they were sent with. Defaults to "json".
+            compression (str, optional): Compression of sent messages above a size threshold, e.g. "zlib" or
+                "lz4:4096", see Compressor.from_spec. Received messages are decompressed regardless. Defaults to None,
+                which sends messages uncompressed.
             nc (nats.aio.client.Client, optional): NATS client object. Defaults to NATS().
             loop (asyncio.event_loop, optional): event loop used to run the callbacks. Defaults to asyncio.get_event_loop().
             filepath (str, optional): Path to the config file. Defaults to "config.json".
@@ -55,22 +63,41 @@ class NatsHandler:
         self.host = host
         self.time_sent = ""
         self.sid_table = dict()
-        self.data_table = dict()
+        self.data_table = DataTable()
         self.api_host = api_host
         self.api_port = str(api_port)
         self.API_DATA_ROUTE = "/data"
-        self.buffer_time = 5
+        self.codec = get_codec(codec)
+        self.compressor = Compressor.from_spec(compression) if compression else None
+
+        # data messages up to this size in bytes are sent inline instead of through the REST API, 0 disables it
+        self.inline_threshold = 4096
+
+    @property
+    def buffer_time(self):
+        """
+        Seconds a data message sent with NatsHandler.send_data can be fetched.
+        """
+        return self.data_table.ttl
+
+    @buffer_time.setter
+    def buffer_time(self, buffer_time):
+        self.data_table.ttl = buffer_time
 
     def create_message(self, data, schema: dict = MessageSchemas.MESSAGE):
         """
         Create a new message instance pre populated with the sender_ID and time known  to the nats_handler. 
         Uses the data arg as value for the "data" field and validates on the provided schema. Raises an exception
-        if the validation is unsuccessful.
+        if the validation is unsuccessful. The data can also be given as payload of the type generated from the
+        schema, which was validated when it was constructed and is available as Message.payload.
 
         Args:
-            data (dict): Data used to populate the "data" field of a message.
+            data (dict or Payload): Data used to populate the "data" field of a message.
             schema (dict): Schema to validate the message
 
+        Raises:
+            TypeError: If the data is a payload of another type than the one of the schema.
+
         Returns:
             Message: Message object populated with the data.
         """
@@ -80,6 +107,14 @@ class NatsHandler:
             time_sent = datetime.now().isoformat(timespec='milliseconds')
         if "name" in schema.keys():
             message_type = schema["name"]
+        if isinstance(data, Payload):
+            if type(data) is not payload_types.get(schema):
+                raise TypeError(f"{type(data).__name__} is not the payload type of {message_type}")
+
+            # the payload is valid and the envelope is set here, so the message is not validated again
+            message = Message(schema, sender_ID=self.sender_id, origin_ID=self.sender_id, message_type=message_type, time_sent=time_sent, data=data.to_wire())
+            message._payload = data
+            return message
         return Message.decode_json({
             "sender_ID": self.sender_id,
             "origin_ID": self.sender_id,
@@ -91,19 +126,38 @@ class NatsHandler:
     async def retrieve_data_message(self, data_id):
         """
         Creates a new message from a message stored in the data table of the NATS handler with updated time_sent.
+        The message stays in the table, so every receiver of the API message can retrieve it until it expires.
 
         Args:
-            data_id (string): ID of the data message used to get it from the dictionary
+            data_id (string): ID of the data message used to get it from the table
+
+        Raises:
+            KeyError: If the data message does not exist or expired.
 
         Returns:
             Message: Message object populated with the data.
         """
-        message = self.data_table[data_id]
-        await self.delete_data_message(data_id)
+        message = self.data_table.get(data_id)
         message.time_sent = self.time_sent
         message.sender_id = self.sender_id
         return message
 
+    async def retrieve_data_bytes(self, data_id):
+        """
+        Gets the encoded bytes of a message stored in the data table of the NATS handler. The message was validated
+        and encoded once by NatsHandler.send_data, so it can be served as it is.
+
+        Args:
+            data_id (string): ID of the data message used to get it from the table
+
+        Raises:
+            KeyError: If the data message does not exist or expired.
+
+        Returns:
+            bytes: JSON encoded message.
+        """
+        return self.data_table.get_encoded(data_id)
+
     async def delete_data_message(self, data_id, timeout=0):
         """
         Delete a data message from the internal table.
@@ -117,10 +171,7 @@ class NatsHandler:
         """
 
         await asyncio.sleep(timeout)
-        try:
-            del self.data_table[data_id]
-        except:
-            pass
+        self.data_table.discard(data_id)
         return True
 
     async def subscribe_callback(self, topic, callback, orig_callback=None):
@@ -163,6 +214,21 @@ class NatsHandler:
         await self.nc.unsubscribe(sid)
         return True
 
+    def pending(self):
+        """
+        Returns the number of messages and bytes received but not yet handled for each subscribed topic.
+
+        Returns:
+            dict: Maps each topic to a (messages, bytes) tuple.
+        """
+        subscriptions = getattr(self.nc, "_subs", {})
+        pending = {}
+        for (topic, _), sid in self.sid_table.items():
+            subscription = subscriptions.get(sid)
+            if subscription is not None and subscription.pending_queue is not None:
+                pending[topic] = (subscription.pending_queue.qsize(), subscription.pending_size)
+        return pending
+
     async def connect(self):
         """
         Connects to the NATS server.
@@ -186,19 +252,25 @@ class NatsHandler:
             bool: True if successfully sent message, False otherwise
         """
         message.sender_id = self.sender_id
-        message = message.encode_raw()
+        message = message.encode_raw(self.codec, topic)
+        if self.compressor is not None:
+            message = self.compressor.compress(topic, message)
         await self.nc.publish(topic, message)
         return True
 
-    async def send_data(self, topic, message):
+    async def send_data(self, topic, message, readers=None):
         """
         Store the data attribute in the internal dictionary and assign id a unique ID. Then creates a new message
         instance that is compliant with the API_MESSAGE schema to broadcast the unique ID on the channel given, so
-        that others can send get requests and access the data.
+        that others can send get requests and access the data. The data can be fetched by any number of receivers
+        until it expires after buffer_time seconds. Messages whose JSON encoding is at most inline_threshold bytes
+        long are sent inline in the API message instead, which saves the GET request.
 
         Args:
             topic (string): channel name to publish to
             message (object): message including the data to send
+            readers (int, optional): number of receivers expected to fetch the data, it is removed from the data table
+                once all of them did. Defaults to None, which keeps it until it expires.
 
         Returns:
             bool: True if successfully sent message
@@ -209,8 +281,17 @@ class NatsHandler:
         if not message.time_sent:
             message.time_sent = datetime.now().isoformat(timespec='milliseconds')
 
+        # validate and encode the message once, small messages are sent inline without storing them in the data table
+        payload = message.encode_json(topic)
+        encoded = dumps(payload).encode()
+        if len(encoded) <= self.inline_threshold:
+            api_message = self.create_message({"payload": payload}, MessageSchemas.API_MESSAGE)
+            api_message.origin_id = message.origin_id
+            await self.send_message(topic, api_message)
+            return True
+
         data_id = secrets.token_urlsafe()
-        self.data_table[data_id] = message
+        self.data_table.put(data_id, message, encoded=encoded, readers=readers)
         api_message = self.create_message({
             "host": self.api_host,
             "port": self.api_port,
@@ -221,12 +302,6 @@ class NatsHandler:
         # Not sure if really necessary to specify original id in API message as well
         api_message.origin_id = message.origin_id
         await self.send_message(topic, api_message)
-
-        # schedule deletion of the data packet
-        loop = asyncio.get_running_loop()
-        loop.create_task(self.delete_data_message(
-            data_id, timeout=self.buffer_time))
-
         return True
 
     async def request_message(self, topic, message, schema, timeout=1):
@@ -242,9 +317,11 @@ class NatsHandler:
         Returns:
             object: returns the response.
         """
-        message = message.encode_raw()
+        message = message.encode_raw(self.codec, topic)
+        if self.compressor is not None:
+            message = self.compressor.compress(topic, message)
         result = await self.nc.request(topic, message, timeout)
-        return Message.decode_raw(result.data, schema)
+        return Message.decode_raw(result.data, schema, subject=topic)
 
     async def disconnect(self, cb=None):
         """
@@ -258,6 +335,7 @@ class NatsHandler:
         """
 
         await self.nc.close()
+        self.data_table.clear()
         if cb is not None:
             await cb()
         return True
@@ -0,0 +1,222 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from kubesat.validation import validate_json, MessageSchemas
+
+
+class Payload:
+    """
+    Base class of the payload types generated from the "data" schemas of messages. Payloads keep their fields in
+    slots instead of nested dicts, so they need less memory and their fields are attributes. A payload is validated
+    once when it is constructed or read from the wire. Optional fields that are not set are None and left out on
+    the wire.
+    """
+
+    __slots__ = ()
+
+    # schema of the payload, and (name, from wire, to wire) tuples of its fields, the conversions being None for
+    # fields that are used as they are
+    _schema = {}
+    _fields = ()
+
+    def __init__(self, **fields):
+        """
+        Initializes a payload from its fields, which may be given as payloads or in their wire format.
+
+        Raises:
+            TypeError: If a field is unknown.
+            ValidationError: If the fields do not comply with the schema.
+        """
+        unknown = fields.keys() - set(self.__slots__)
+        if unknown:
+            raise TypeError(f"{type(self).__name__} got unknown fields {', '.join(sorted(unknown))}")
+        wire = {}
+        for name, _, dump in self._fields:
+            value = fields.get(name)
+            if value is not None:
+                wire[name] = dump(value) if dump else value
+        validate_json(wire, self._schema)
+        self._load(wire)
+
+    def _load(self, wire: dict):
+        """
+        Sets the fields from a valid wire representation.
+        """
+        for name, load, _ in self._fields:
+            value = wire.get(name)
+            setattr(self, name, load(value) if load and value is not None else value)
+
+    @classmethod
+    def from_wire(cls, wire: dict, validate: bool = True):
+        """
+        Creates a payload from its wire format, i.e. the "data" field of a decoded message.
+
+        Args:
+            wire (dict): Payload in its wire format.
+            validate (bool, optional): If False, the payload is expected to be validated already, e.g. as part of
+                its message. Defaults to True.
+
+        Raises:
+            ValidationError: If the payload does not comply with the schema.
+
+        Returns:
+            Payload: New payload instance.
+        """
+        if validate:
+            validate_json(wire, cls._schema)
+        return cls._from_valid(wire)
+
+    @classmethod
+    def _from_valid(cls, wire: dict):
+        """
+        Creates a payload from its wire format without validating it, e.g. for payloads nested in a validated one.
+        """
+        payload = cls.__new__(cls)
+        payload._load(wire)
+        return payload
+
+    def to_wire(self) -> dict:
+        """
+        Returns the wire format of the payload, which is used as "data" field of a message.
+        """
+        wire = {}
+        for name, _, dump in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                wire[name] = dump(value) if dump else value
+        return wire
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other.to_wire() == self.to_wire()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name, _, _ in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+def _dump_payload(value):
+    return value.to_wire() if isinstance(value, Payload) else value
+
+
+def _class_name(name: str) -> str:
+    return "".join(part[:1].upper() + part[1:] for part in name.replace("-", "_").split("_"))
+
+
+def _conversions(schema: dict, name: str) -> tuple:
+    """
+    Returns the (from wire, to wire) conversions of a value of the given schema, which are None if the value is used
+    as it is. Objects with properties become payloads, maps and arrays convert their values.
+    """
+    if schema.get("type") == "object" and schema.get("properties"):
+        cls = payload_class(schema, name)
+        return cls._from_valid, _dump_payload
+
+    additional = schema.get("additionalProperties")
+    if schema.get("type") == "object" and isinstance(additional, dict):
+        load, dump = _conversions(additional, name + "Value")
+        if load:
+            return (lambda value: {key: load(item) for key, item in value.items()},
+                    lambda value: {key: dump(item) for key, item in value.items()})
+
+    items = schema.get("items")
+    if schema.get("type") == "array" and isinstance(items, dict):
+        load, dump = _conversions(items, name + "Item")
+        if load:
+            return (lambda value: [load(item) for item in value],
+                    lambda value: [dump(item) for item in value])
+    return None, None
+
+
+def payload_class(schema: dict, name: str) -> type:
+    """
+    Generates a payload type for an object schema with properties. Properties that are objects with properties
+    themselves get their own nested payload types.
+
+    Args:
+        schema (dict): JSON schema of the payload.
+        name (str): Name of the generated class.
+
+    Returns:
+        type: Subclass of Payload with a slot for every property of the schema.
+    """
+    fields = []
+    for field in schema["properties"]:
+        load, dump = _conversions(schema["properties"][field], name + _class_name(field))
+        fields.append((field, load, dump))
+    return type(name, (Payload,), {
+        "__slots__": tuple(field for field, _, _ in fields),
+        "_schema": schema,
+        "_fields": tuple(fields)
+    })
+
+
+class PayloadRegistry:
+    """
+    Registry of the payload types generated from message schemas. Like ValidatorRegistry, it generates the type of
+    each schema once and keys the schemas by identity.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty registry.
+        """
+        self._types = {}
+
+    def get(self, schema: dict) -> type:
+        """
+        Returns the payload type of a message schema, generating it on first use.
+
+        Args:
+            schema (dict): JSON schema of a message.
+
+        Returns:
+            type: Payload type of the "data" field, or None if the data is not an object with properties.
+        """
+        entry = self._types.get(id(schema))
+
+        # keep a reference to the schema in the entry so its id cannot be reused by another dict
+        if entry is None or entry[0] is not schema:
+            data = schema.get("properties", {}).get("data", {})
+            cls = None
+            if data.get("type") == "object" and data.get("properties"):
+                cls = payload_class(data, _class_name(schema.get("name", "message")) + "Payload")
+            entry = (schema, cls)
+            self._types[id(schema)] = entry
+        return entry[1]
+
+    def compile_all(self, schema_class) -> dict:
+        """
+        Generates the payload types of every message schema defined as class attribute of a schema collection,
+        e.g. MessageSchemas.
+
+        Args:
+            schema_class (class): Class holding schemas as dict attributes.
+
+        Returns:
+            dict: Maps the attribute names of the schemas to their payload types, for schemas that have one.
+        """
+        types = {}
+        for name, schema in vars(schema_class).items():
+            if not name.startswith("_") and isinstance(schema, dict):
+                cls = self.get(schema)
+                if cls is not None:
+                    types[name] = cls
+        return types
+
+
+payload_types = PayloadRegistry()
+
+# generate the payload types of all message schemas when the module is loaded, which takes well below a millisecond,
+# so the first message of each type does not pay for it
+payload_types.compile_all(MessageSchemas)
@@ -0,0 +1,98 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import itertools
+import time
+from typing import Callable
+
+# subject every service publishes its lease renewals on
+LEASE_SUBJECT = "node.lease"
+
+
+class LeaseTable:
+    """
+    Tracks which services are alive by the leases they renew. Each renewal extends the lease of a service by its
+    ttl. The expiry deadlines are kept in a heap, so finding the expired leases only looks at leases that actually
+    expired instead of at every service.
+    """
+
+    def __init__(self, clock: Callable = time.monotonic):
+        """
+        Initializes an empty table.
+
+        Args:
+            clock (function, optional): Monotonic clock returning seconds. Defaults to time.monotonic.
+        """
+        self._clock = clock
+        self._expiries = {}
+        self._deadlines = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._expiries)
+
+    def __contains__(self, key):
+        return key in self._expiries
+
+    def renew(self, key, ttl: float) -> bool:
+        """
+        Renews the lease of a service.
+
+        Args:
+            key (object): Identifies the service, e.g. a (sender ID, service type) tuple.
+            ttl (float): Seconds until the lease expires if it is not renewed again.
+
+        Returns:
+            bool: True if the service did not hold a lease before, False if it was renewed.
+        """
+        new = key not in self._expiries
+        expires = self._clock() + ttl
+        self._expiries[key] = expires
+        heapq.heappush(self._deadlines, (expires, next(self._counter), key))
+        return new
+
+    def release(self, key) -> bool:
+        """
+        Removes the lease of a service, e.g. when it shuts down.
+
+        Args:
+            key (object): Identifies the service.
+
+        Returns:
+            bool: True if the service held a lease, False otherwise
+        """
+        return self._expiries.pop(key, None) is not None
+
+    def expire(self, now: float = None) -> list:
+        """
+        Removes the leases that expired.
+
+        Args:
+            now (float, optional): Time to compare the deadlines with. Defaults to the clock of the table.
+
+        Returns:
+            list: Keys of the services whose lease expired.
+        """
+        if now is None:
+            now = self._clock()
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            expires, _, key = heapq.heappop(self._deadlines)
+
+            # skip deadlines of leases that were renewed or released since
+            if self._expiries.get(key) == expires:
+                del self._expiries[key]
+                expired.append(key)
+        return expired
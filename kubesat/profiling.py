@@ -0,0 +1,131 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """
+    Sampling profiler for a running thread, e.g. the one running the event loop. It is run from another thread and
+    periodically records the call stack of the profiled thread, so the profiled code is not slowed down by tracing.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        """
+        Initializes the sampler.
+
+        Args:
+            thread_id (int): Identifier of the thread to profile, as returned by threading.get_ident().
+            interval (float, optional): Seconds between two samples. Defaults to 0.005.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+
+    def sample(self, seconds: float) -> Counter:
+        """
+        Samples the call stack of the profiled thread. Blocks the calling thread for the given time.
+
+        Args:
+            seconds (float): Seconds to sample for.
+
+        Returns:
+            Counter: Number of samples of each call stack, given as names of the frames separated by semicolons
+                from the outermost to the innermost frame.
+        """
+        stacks = Counter()
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                stacks[";".join(reversed(stack))] += 1
+            del frame
+            time.sleep(self.interval)
+        return stacks
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> str:
+        """
+        Formats sampled call stacks in the collapsed stack format used by flame graph tools.
+
+        Args:
+            stacks (Counter): Call stacks as returned by StackSampler.sample.
+
+        Returns:
+            str: One line per call stack with the number of samples, most frequent first.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class MemoryTracker:
+    """
+    Finds memory growth by comparing tracemalloc snapshots. Tracing only starts with the first snapshot, since it
+    slows down every allocation.
+    """
+
+    def __init__(self, frames: int = 1):
+        """
+        Initializes the tracker.
+
+        Args:
+            frames (int, optional): Number of frames stored for the traceback of each allocation. Defaults to 1.
+        """
+        self.frames = frames
+        self._snapshot = None
+
+    def diff(self, limit: int = 20) -> str:
+        """
+        Takes a snapshot and compares it with the previous one. The first call starts tracing and only takes the
+        snapshot the next call is compared with.
+
+        Args:
+            limit (int, optional): Number of source lines with the largest growth to report. Defaults to 20.
+
+        Returns:
+            str: One line per source line with its allocated size and growth since the previous snapshot.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+        ))
+        previous = self._snapshot
+        self._snapshot = snapshot
+        if previous is None:
+            return "Started tracing memory allocations, request again to see the growth since now.\n"
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory: {current} bytes, peak {peak} bytes"]
+        lines += [str(stat) for stat in snapshot.compare_to(previous, "lineno")[:limit]]
+        return "\n".join(lines) + "\n"
+
+    def stop(self):
+        """
+        Stops tracing and drops the snapshot.
+        """
+        self._snapshot = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -12,12 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import redis
 import json
+import time
+import traceback
+from kubesat.metrics import Histogram
 from kubesat.validation import validate_json
 
 class RedisHandler:
-    def __init__(self, service_type, schema, host="redis", port=6379, password=None):
+    """
+    Handler that persists the shared storage and sender ID of a service in redis. The shared storage is stored as a
+    redis hash with one JSON encoded field per top level key, so an update only rewrites the fields that changed and
+    single fields can be read without loading the whole storage.
+    """
+
+    def __init__(self, service_type, schema, host="redis", port=6379, password=None, flush_interval=0.5, flush_threshold=100):
         """
         Creates a redis handler object
         Args:
@@ -26,30 +36,206 @@ class RedisHandler:
             host: redis host
             port: port redis is running on
             password: redis password
+            flush_interval: seconds between flushes of the shared storage in write-behind mode
+            flush_threshold: number of shared storage changes that trigger an early flush in write-behind mode
         """
         self.service_type = service_type
         self.schema = schema
         self.redis_client = redis.StrictRedis(host=host, port=port, password=password, decode_responses=True)
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._written_fields = None
+        self._pending_storage = None
+        self._pending_keys = set()
+        self._dirty_count = 0
+        self._flush_task = None
+        self._flush_event = None
+        self._flush_lock = None
+        self.flush_seconds = Histogram()
+        self.flush_failures = 0
+
+    @property
+    def write_behind(self):
+        """
+        True if shared storage writes are currently buffered and flushed by a background task.
+        """
+        return self._flush_task is not None
 
     def get_shared_storage(self):
         """
-        Gets the shared storage from the redis server for the service.
+        Gets the shared storage from the redis server for the service by reassembling it from the hash fields.
+        Storages written as a single JSON string by older versions are read as well.
         Args:
         """
-        shared_storage = self.redis_client.get(self.service_type)
-        shared_storage = json.loads(shared_storage)
+        if self.redis_client.type(self.service_type) == "string":
+            shared_storage = json.loads(self.redis_client.get(self.service_type))
+        else:
+            fields = self.redis_client.hgetall(self.service_type)
+            shared_storage = {key: json.loads(value) for key, value in fields.items()}
         validate_json(shared_storage, self.schema)
         return shared_storage
 
-    def set_shared_storage(self, shared_storage):
+    def get_shared_storage_fields(self, *keys):
         """
-        Sets the shared storage in the redis server for the service.
+        Gets only some top level keys of the shared storage from the redis server for the service.
+        Args:
+            keys: top level keys of the shared storage to get
+        Returns:
+            dict: the requested keys that are present in the stored shared storage
         """
-        validate_json(shared_storage, self.schema)
-        shared_storage = json.dumps(shared_storage)
-        self.redis_client.set(self.service_type, shared_storage)
+        values = self.redis_client.hmget(self.service_type, keys)
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_shared_storage(self, shared_storage, changed_keys=None):
+        """
+        Sets the shared storage in the redis server for the service. Only the top level keys whose value differs
+        from the last write are sent. In write-behind mode the storage is only marked as dirty and written by the
+        background flush task, so only the latest version gets persisted.
+        Args:
+            shared_storage: shared storage dictionary
+            changed_keys: top level keys that may have changed since the last write, e.g. the keys committed by a
+                StorageTransaction, which already validated them. If None, all keys are compared and the whole
+                storage is validated.
+        """
+        if self.write_behind:
+            self._pending_storage = shared_storage
+            if changed_keys is None or self._pending_keys is None:
+                self._pending_keys = None
+            else:
+                self._pending_keys.update(changed_keys)
+            self._dirty_count += 1
+            if self._dirty_count >= self.flush_threshold:
+                self._flush_event.set()
+            return True
+        changes = self._diff(shared_storage, changed_keys)
+        self._write(*changes)
         return True
 
+    def _diff(self, shared_storage, changed_keys):
+        """
+        Serializes the given keys of the shared storage and compares them with the fields written last.
+        Args:
+            shared_storage: shared storage dictionary
+            changed_keys: keys to compare, or None to compare all of them
+        Returns:
+            tuple: dict of fields to set, list of fields to delete and whether the hash has to be rewritten
+        """
+        reset = self._written_fields is None
+        if changed_keys is None or reset:
+            validate_json(shared_storage, self.schema)
+            changed_keys = set(shared_storage) | set(self._written_fields or ())
+        written = self._written_fields or {}
+        changed = {}
+        deleted = []
+        for key in changed_keys:
+            if key in shared_storage:
+                value = json.dumps(shared_storage[key])
+                if reset or written.get(key) != value:
+                    changed[key] = value
+            elif key in written:
+                deleted.append(key)
+        return changed, deleted, reset
+
+    def _write(self, changed, deleted, reset):
+        """
+        Writes the changed fields in a single pipelined round trip. Blocking, so it is run in an executor thread
+        in write-behind mode.
+        Args:
+            changed: dictionary mapping the changed top level keys to their JSON encoding
+            deleted: top level keys that were removed from the shared storage
+            reset: if True, the existing hash (or legacy string value) is replaced instead of updated
+        """
+        if not (changed or deleted or reset):
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        if reset:
+            pipe.delete(self.service_type)
+        if changed:
+            pipe.hset(self.service_type, mapping=changed)
+        if deleted:
+            pipe.hdel(self.service_type, *deleted)
+        pipe.execute()
+
+        written = {} if reset else self._written_fields
+        written.update(changed)
+        for key in deleted:
+            written.pop(key, None)
+        self._written_fields = written
+
+    async def flush(self):
+        """
+        Writes the changes of the latest pending shared storage to redis without blocking the event loop. If the
+        write fails, the changes stay pending and are retried by the next flush.
+        Returns:
+            bool: True if something was pending, False if there was nothing to flush
+        """
+        async with self._flush_lock:
+            if self._pending_storage is None:
+                return False
+            shared_storage = self._pending_storage
+            changed_keys = self._pending_keys
+            self._pending_storage = None
+            self._pending_keys = set()
+            self._dirty_count = 0
+
+            # serialize on the event loop, since the storage may be changed by callbacks while the write is running
+            changes = self._diff(shared_storage, changed_keys)
+            try:
+                start = time.perf_counter()
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._write, *changes)
+                self.flush_seconds.observe(time.perf_counter() - start)
+            except BaseException:
+                self.flush_failures += 1
+                if self._pending_storage is None:
+                    self._pending_storage = shared_storage
+                if changed_keys is None or self._pending_keys is None:
+                    self._pending_keys = None
+                else:
+                    self._pending_keys.update(changed_keys)
+                raise
+            return True
+
+    async def _flush_loop(self):
+        """
+        Background task flushing the shared storage every flush_interval seconds or once flush_threshold
+        changes were made, whichever happens first.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception:
+                print(f"Failed to flush shared storage to redis: {traceback.format_exc()}")
+
+    async def start_write_behind(self):
+        """
+        Switches to write-behind mode by starting the background flush task in the running event loop.
+        """
+        if self.write_behind:
+            return
+        self._flush_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop_write_behind(self):
+        """
+        Stops the background flush task and flushes the remaining changes, e.g. on service shutdown.
+        """
+        if not self.write_behind:
+            return
+        self._flush_task.cancel()
+        try:
+            await self._flush_task
+        except asyncio.CancelledError:
+            pass
+        self._flush_task = None
+        await self.flush()
+
     def get_sender_id(self):
         """
         Returns the id of the redis client
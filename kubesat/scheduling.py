@@ -0,0 +1,145 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from typing import Callable
+
+# what a schedule does with the runs it missed because the previous run took longer than the period
+OVERRUN_SKIP = "skip"
+OVERRUN_CATCH_UP = "catch_up"
+OVERRUN_COALESCE = "coalesce"
+OVERRUN_POLICIES = (OVERRUN_SKIP, OVERRUN_CATCH_UP, OVERRUN_COALESCE)
+
+
+class ScheduleMetrics:
+    """
+    Timing statistics of a schedule. Jitter is the delay between the deadline of a run and its actual start.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    @property
+    def mean_jitter(self) -> float:
+        """
+        Average jitter of all runs in seconds.
+        """
+        return self.total_jitter / self.runs if self.runs else 0.0
+
+    def record(self, jitter: float, duration: float):
+        """
+        Records a run.
+
+        Args:
+            jitter (float): Seconds the run started after its deadline.
+            duration (float): Seconds the run took.
+        """
+        self.runs += 1
+        self.last_jitter = jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.total_jitter += jitter
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+
+    def as_dict(self) -> dict:
+        """
+        Returns the statistics as dictionary.
+        """
+        return {
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "last_jitter": self.last_jitter,
+            "max_jitter": self.max_jitter,
+            "mean_jitter": self.mean_jitter,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration
+        }
+
+
+class DeadlineSchedule:
+    """
+    Runs a function every period seconds. The deadlines are computed on the monotonic clock from the start of the
+    schedule, so the time a run takes does not delay the following runs. If a run takes longer than the period,
+    the overrun policy decides about the runs whose deadlines passed in the meantime: "skip" drops them and waits
+    for the next deadline, "catch_up" executes all of them back to back and "coalesce" executes a single run
+    right away.
+    """
+
+    def __init__(self, period: float, function: Callable, overrun: str = OVERRUN_SKIP, clock: Callable = time.monotonic):
+        """
+        Initializes the schedule.
+
+        Args:
+            period (float): Seconds between the deadlines of two runs.
+            function (function): Async function without arguments to run.
+            overrun (str, optional): One of "skip", "catch_up" or "coalesce". Defaults to "skip".
+            clock (function, optional): Monotonic clock returning seconds. Defaults to time.monotonic.
+
+        Raises:
+            ValueError: If the period is not positive or the overrun policy is unknown.
+        """
+        if period <= 0:
+            raise ValueError(f"Schedule period must be positive, got {period}")
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy {overrun}, expected one of {', '.join(OVERRUN_POLICIES)}")
+        self.period = period
+        self.overrun = overrun
+        self.metrics = ScheduleMetrics()
+        self._function = function
+        self._clock = clock
+
+    def _next_deadline(self, deadline: float, now: float) -> float:
+        """
+        Computes the deadline following a run, applying the overrun policy if it already passed.
+        """
+        deadline += self.period
+        if now <= deadline:
+            return deadline
+
+        self.metrics.overruns += 1
+        if self.overrun == OVERRUN_CATCH_UP:
+            return deadline
+
+        # number of deadlines that passed, apart from the one that is due right now
+        missed = int((now - deadline) // self.period)
+        if self.overrun == OVERRUN_SKIP:
+            self.metrics.skipped += missed + 1
+            return deadline + (missed + 1) * self.period
+        self.metrics.skipped += missed
+        return deadline + missed * self.period
+
+    async def run(self):
+        """
+        Runs the function forever, starting right away. Exceptions raised by the function end the schedule.
+        """
+        deadline = self._clock()
+        while True:
+            delay = deadline - self._clock()
+
+            # yield to the event loop even when catching up, so other callbacks are not starved
+            await asyncio.sleep(max(delay, 0))
+            start = self._clock()
+            await self._function()
+            end = self._clock()
+            self.metrics.record(max(start - deadline, 0.0), end - start)
+            deadline = self._next_deadline(deadline, end)
@@ -0,0 +1,438 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from copy import deepcopy
+from functools import partial
+from jsonschema.exceptions import ValidationError
+
+from kubesat.validation import validate_json, validation_policy
+
+_DELETED = object()
+
+# schema keywords whose constraints on a dict or list only depend on its keys and each single value, so a changed
+# value can be validated on its own as long as the keys or the length stay the same
+_DECOMPOSABLE_KEYWORDS = {"type", "properties", "additionalProperties", "required", "items", "title", "description"}
+
+
+def _wrap(value, on_change):
+    """
+    Wraps dicts and lists of the shared storage, so they are copied and reported before they are changed.
+    """
+    if type(value) is dict:
+        return _StorageDict(value, on_change)
+    if type(value) is list:
+        return _StorageList(value, on_change)
+    return value
+
+
+class _StorageDict(dict):
+    """
+    Shallow copy of a dict in the shared storage. Nested dicts and lists are wrapped the same way on first access,
+    so reading them never copies more than the containers on the path to the value. on_change is called before the
+    copy is changed, so a transaction knows which top level keys were written.
+    """
+
+    __slots__ = ("_original", "_on_change")
+
+    def __init__(self, original: dict, on_change):
+        super().__init__(original)
+        self._original = original
+        self._on_change = on_change
+
+    def _child(self, key):
+        value = dict.__getitem__(self, key)
+        wrapped = _wrap(value, self._on_change)
+        if wrapped is not value:
+            dict.__setitem__(self, key, wrapped)
+        return wrapped
+
+    def __getitem__(self, key):
+        return self._child(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self._child(key)
+        return default
+
+    def values(self):
+        return [self._child(key) for key in list(self)]
+
+    def items(self):
+        return [(key, self._child(key)) for key in list(self)]
+
+    def copy(self) -> dict:
+        return {key: self._child(key) for key in list(self)}
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return deepcopy(_detach(self), memo)
+
+    def __setitem__(self, key, value):
+        self._on_change()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._on_change()
+        dict.__delitem__(self, key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self._child(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self._on_change()
+        return _wrap(dict.pop(self, key, *args), self._on_change)
+
+    def popitem(self):
+        self._on_change()
+        key, value = dict.popitem(self)
+        return key, _wrap(value, self._on_change)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        self._on_change()
+        dict.clear(self)
+
+
+class _StorageList(list):
+    """
+    Shallow copy of a list in the shared storage, see _StorageDict.
+    """
+
+    __slots__ = ("_original", "_on_change")
+
+    def __init__(self, original: list, on_change):
+        super().__init__(original)
+        self._original = original
+        self._on_change = on_change
+
+    def _child(self, index):
+        value = list.__getitem__(self, index)
+        wrapped = _wrap(value, self._on_change)
+        if wrapped is not value:
+            list.__setitem__(self, index, wrapped)
+        return wrapped
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._child(position) for position in range(*index.indices(len(self)))]
+        return self._child(index)
+
+    def __iter__(self):
+        position = 0
+        while position < len(self):
+            yield self._child(position)
+            position += 1
+
+    def copy(self) -> list:
+        return list(self)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return deepcopy(_detach(self), memo)
+
+    def _changing(name):
+        method = getattr(list, name)
+
+        def changing(self, *args, **kwargs):
+            self._on_change()
+            return method(self, *args, **kwargs)
+        changing.__name__ = name
+        return changing
+
+    __setitem__ = _changing("__setitem__")
+    __delitem__ = _changing("__delitem__")
+    __iadd__ = _changing("__iadd__")
+    __imul__ = _changing("__imul__")
+    append = _changing("append")
+    extend = _changing("extend")
+    insert = _changing("insert")
+    remove = _changing("remove")
+    clear = _changing("clear")
+    sort = _changing("sort")
+    reverse = _changing("reverse")
+    del _changing
+
+    def pop(self, *args):
+        self._on_change()
+        return _wrap(list.pop(self, *args), self._on_change)
+
+
+def _read_only(*args):
+    raise TypeError("The shared storage is read only in this callback")
+
+
+def read_only_view(storage: dict) -> dict:
+    """
+    Returns a read only view of the shared storage for callbacks that do not change it. Nested dicts and lists are
+    only shallow copied along the path that is accessed, and changing the view or any value nested in it raises a
+    TypeError instead of changing the committed storage.
+
+    Args:
+        storage (dict): Committed shared storage.
+
+    Returns:
+        dict: Read only view of the storage.
+    """
+    return _StorageDict(storage, _read_only)
+
+
+def _detach(value):
+    """
+    Converts a value of a transaction back to plain dicts and lists. Nested values that are still the committed ones
+    are shared instead of copied, so the cost depends on the part of the value that was accessed or changed.
+    """
+    if isinstance(value, _StorageDict):
+        original = value._original
+        return {key: item if original.get(key, _DELETED) is item else _detach(item) for key, item in dict.items(value)}
+    if isinstance(value, _StorageList):
+        original = value._original
+        return [item if position < len(original) and original[position] is item else _detach(item)
+                for position, item in enumerate(list.__iter__(value))]
+    if type(value) is dict:
+        detached = {key: _detach(item) for key, item in value.items()}
+        return value if all(detached[key] is item for key, item in value.items()) else detached
+    if type(value) is list:
+        detached = [_detach(item) for item in value]
+        return value if all(new is old for new, old in zip(detached, value)) else detached
+    return value
+
+
+def _validate_change(value, original, schema: dict):
+    """
+    Validates a changed value against its schema, descending into the nested values that differ from the committed
+    ones as long as the schema allows validating them on their own. Unchanged nested values are the committed objects
+    themselves and are skipped, so the cost depends on the size of the change instead of the size of the value.
+    """
+    if value is original:
+        return
+    if not _DECOMPOSABLE_KEYWORDS.issuperset(schema):
+        validate_json(value, schema)
+    elif type(value) is dict and type(original) is dict and value.keys() == original.keys():
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties", True)
+        for key, item in value.items():
+            if key in properties:
+                _validate_change(item, original[key], properties[key])
+            elif isinstance(additional, dict):
+                _validate_change(item, original[key], additional)
+            elif additional is False:
+                validate_json(value, schema)
+    elif type(value) is list and type(original) is list and len(value) == len(original) and isinstance(schema.get("items"), dict):
+        for item, original_item in zip(value, original):
+            _validate_change(item, original_item, schema["items"])
+    else:
+        validate_json(value, schema)
+
+
+class StorageTransaction(dict):
+    """
+    Copy-on-write view of a service's shared storage that is handed to a single callback. Dicts and lists are only
+    shallow copied along the path the callback accesses, so reading the storage does not copy or validate it. Nested
+    changes mark the top level key they belong to as written. On commit only the written keys whose value actually
+    changed are validated against their sub-schemas and written back, sharing all unchanged nested values with the
+    previous storage, so the cost of a callback depends on the part of the storage it changes. If the callback raises
+    or the changes are invalid, the storage is left untouched.
+    """
+
+    def __init__(self, storage: dict, schema: dict, writable: frozenset = None):
+        """
+        Initializes a new transaction on top of a storage dict.
+
+        Args:
+            storage (dict): Committed shared storage the transaction reads from and commits to.
+            schema (dict): Schema the shared storage has to comply with.
+            writable (frozenset, optional): Keys the callback declared to write. If given, changes to other keys are
+                discarded on commit. Defaults to None, which commits all written keys.
+        """
+        super().__init__(storage)
+        self._storage = storage
+        self._schema = schema
+        self._writable = writable
+        self._read = set()
+        self._written = set()
+        self.committed_keys = set()
+
+    @property
+    def read_keys(self) -> set:
+        """
+        Keys whose value the callback read during the transaction.
+        """
+        return set(self._read)
+
+    @property
+    def written_keys(self) -> set:
+        """
+        Keys that the callback assigned, deleted or changed in place during the transaction.
+        """
+        return set(self._written)
+
+    @property
+    def touched_keys(self) -> set:
+        """
+        Keys that the callback read or wrote during the transaction.
+        """
+        return self._read | self._written
+
+    def _child(self, key):
+        """
+        Wraps the value of a key on first access, so that nested changes made by the callback are recorded and do not
+        leak into the committed storage.
+        """
+        value = dict.__getitem__(self, key)
+        if key not in self._read:
+            self._read.add(key)
+            wrapped = _wrap(value, partial(self._written.add, key))
+            if wrapped is not value:
+                dict.__setitem__(self, key, wrapped)
+                return wrapped
+        return value
+
+    def __getitem__(self, key):
+        return self._child(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self._child(key)
+        return default
+
+    def __setitem__(self, key, value):
+        self._written.add(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._written.add(key)
+        dict.__delitem__(self, key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *args):
+        if key not in self:
+            return dict.pop(self, key, *args)
+        self._written.add(key)
+        return _wrap(dict.pop(self, key), partial(self._written.add, key))
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._written.add(key)
+        return key, _wrap(value, partial(self._written.add, key))
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        self._written.update(self.keys())
+        dict.clear(self)
+
+    def values(self):
+        return [self._child(key) for key in list(self.keys())]
+
+    def items(self):
+        return [(key, self._child(key)) for key in list(self.keys())]
+
+    def copy(self) -> dict:
+        return {key: self._child(key) for key in list(self.keys())}
+
+    def _changes(self) -> dict:
+        """
+        Returns the written keys whose value differs from the committed one, mapped to their new plain value or to
+        _DELETED. Comparing is cheap since unchanged nested values are the committed objects themselves.
+        """
+        written = self._written if self._writable is None else self._written & self._writable
+        changes = {}
+        for key in written:
+            value = dict.get(self, key, _DELETED)
+            if value is not _DELETED:
+                value = _detach(value)
+            original = self._storage.get(key, _DELETED)
+            if value is original:
+                continue
+            if value is _DELETED or original is _DELETED or value != original:
+                changes[key] = value
+        return changes
+
+    def _validate_changes(self, changes: dict):
+        """
+        Validates the changed keys against the sub-schemas of the storage schema, skipping the nested values that did
+        not change. Falls back to validating the whole storage if keys were added or removed, since that can affect
+        top level constraints.
+        """
+        if any(key not in self._storage or value is _DELETED for key, value in changes.items()):
+            storage = {**self._storage, **changes}
+            validate_json({key: value for key, value in storage.items() if value is not _DELETED}, self._schema)
+            return
+
+        properties = self._schema.get("properties", {})
+        additional = self._schema.get("additionalProperties", True)
+        for key, value in changes.items():
+            if key in properties:
+                _validate_change(value, self._storage[key], properties[key])
+            elif isinstance(additional, dict):
+                _validate_change(value, self._storage[key], additional)
+            elif additional is False:
+                raise ValidationError(f"Additional properties are not allowed ('{key}' was unexpected)")
+
+    def commit(self) -> dict:
+        """
+        Validates the changes made during the transaction and applies them to the storage, unless the validation
+        policy skips validating the key "shared_storage". Nothing is written if the validation fails. Keys that were
+        only read, or written with their committed value, are neither validated nor written.
+
+        Raises:
+            ValidationError: If the changes made to the storage do not comply with the schema.
+
+        Returns:
+            dict: The storage the changes were committed to. The committed keys are kept in committed_keys.
+        """
+        changes = self._changes()
+        if changes and validation_policy.decide("shared_storage"):
+            with validation_policy.checking("shared_storage"):
+                self._validate_changes(changes)
+        for key, value in changes.items():
+            if value is _DELETED:
+                self._storage.pop(key, None)
+            else:
+                self._storage[key] = value
+        self.committed_keys = set(changes)
+        self._read = set()
+        self._written = set()
+        dict.clear(self)
+        dict.update(self, self._storage)
+        return self._storage
+
+    def rollback(self):
+        """
+        Discards all changes made during the transaction and resets it to the committed storage.
+        """
+        dict.clear(self)
+        dict.update(self, self._storage)
+        self._read = set()
+        self._written = set()
@@ -0,0 +1,355 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable
+
+from kubesat.flow_control import PendingQueue
+from kubesat.message import Message
+
+
+class HandlerQueue:
+    """
+    Decoded messages waiting for a single handler of a subscription. They are handed to the handler one after another
+    by a task of its own, so a slow handler neither delays the other handlers of the subject nor their next messages.
+    Once max_messages messages are waiting, adding another one waits until the handler took one, which pushes back on
+    the pending messages of the subscription.
+    """
+
+    def __init__(self, handler: Callable, on_error: Callable, max_messages: int = 65536):
+        """
+        Initializes an empty queue.
+
+        Args:
+            handler (function): Async function called with the decoded message and the raw NATS message.
+            on_error (function): Async function without arguments called from within an except block whenever the
+                handler fails.
+            max_messages (int, optional): Maximum number of waiting messages. Defaults to 65536.
+        """
+        self.handler = handler
+        self.max_messages = max_messages
+        self._on_error = on_error
+        self._messages = deque()
+        self._space = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._messages)
+
+    async def put(self, message, raw_message):
+        """
+        Adds a message for the handler, waiting while the queue is full.
+
+        Args:
+            message (Message): Decoded message, or the exception raised while decoding it.
+            raw_message (nats.aio.client.Msg): Message received from NATS.
+        """
+        while len(self._messages) >= self.max_messages:
+            if self._space is None or self._space.done():
+                self._space = asyncio.get_running_loop().create_future()
+            await self._space
+        self._messages.append((message, raw_message))
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        """
+        Task handing the waiting messages to the handler, oldest first.
+        """
+        try:
+            while self._messages:
+                message, raw_message = self._messages.popleft()
+                if self._space is not None and not self._space.done():
+                    self._space.set_result(None)
+                try:
+                    if isinstance(message, Exception):
+                        raise message
+                    await self.handler(message, raw_message)
+                except Exception:
+                    await self._on_error()
+        finally:
+            self._task = None
+
+    async def join(self):
+        """
+        Waits until the handler handled all waiting messages.
+        """
+        while self._task is not None:
+            await asyncio.shield(self._task)
+
+
+class Subscription:
+    """
+    Single NATS subscription shared by all callbacks a service registers on the same subject. Every incoming message
+    is parsed once and decoded once per distinct schema, then handed to each registered handler. Messages waiting to be
+    decoded are kept in a bounded queue, which drops messages according to its policy when the service falls behind.
+    Each handler has its own HandlerQueue, so handlers run independently of each other but in the order of the messages.
+    """
+
+    def __init__(self, subject: str, on_error: Callable, metrics=None, pending_limits: dict = None):
+        """
+        Initializes a subscription without any handlers.
+
+        Args:
+            subject (str): NATS subject the subscription listens on.
+            on_error (function): Async function without arguments called from within an except block whenever
+                decoding a message or running a handler fails.
+            metrics (ServiceMetrics, optional): Metrics the time spent parsing and validating each message is
+                recorded in for every handler. Defaults to None.
+            pending_limits (dict, optional): Keyword arguments max_messages, max_bytes and policy of the PendingQueue
+                holding the messages waiting to be decoded. Its max_messages also limits the messages waiting for each
+                handler. Defaults to None, which uses the defaults of PendingQueue.
+        """
+        self.subject = subject
+        self.metrics = metrics
+        self._on_error = on_error
+        self._handlers = []
+        self.pending = PendingQueue(self.dispatch, on_error, **(pending_limits or {}))
+
+    def __len__(self):
+        return len(self._handlers)
+
+    def add(self, callback_function: Callable, schema: dict, handler: Callable, name: str = None):
+        """
+        Registers a handler on the subscription.
+
+        Args:
+            callback_function (function): Callback provided by the user, used to identify the handler.
+            schema (dict): Schema the messages passed to the handler are decoded with.
+            handler (function): Async function called with the decoded message and the raw NATS message.
+            name (str, optional): Name the decoding metrics of the handler are kept under. Defaults to None, which
+                uses the name of the callback followed by the subject.
+        """
+        if name is None:
+            name = f"{callback_function.__qualname__.rpartition('<locals>.')[2]}@{self.subject}"
+        queue = HandlerQueue(handler, self._on_error, self.pending.max_messages)
+        self._handlers.append((callback_function, schema, queue, name))
+
+    def remove(self, callback_function: Callable) -> list:
+        """
+        Removes the handlers registered for a callback. Messages already waiting for them are still handled.
+
+        Args:
+            callback_function (function): Callback the handlers were registered with.
+
+        Returns:
+            list: HandlerQueues of the removed handlers, empty if none was removed.
+        """
+        removed = [entry[2] for entry in self._handlers if entry[0] is callback_function]
+        self._handlers = [entry for entry in self._handlers if entry[0] is not callback_function]
+        return removed
+
+    def backlog(self) -> dict:
+        """
+        Returns the number of messages waiting for each handler, by handler name.
+        """
+        return {name: len(queue) for _, _, queue, name in self._handlers}
+
+    async def join(self):
+        """
+        Waits until all handlers handled the messages dispatched so far.
+        """
+        for _, _, queue, _ in list(self._handlers):
+            await queue.join()
+
+    def decode(self, raw_message) -> dict:
+        """
+        Parses a raw NATS message and decodes it once for every distinct schema of the registered handlers.
+
+        Args:
+            raw_message (nats.aio.client.Msg): Message received from NATS.
+
+        Returns:
+            dict: Maps the id of each schema to the decoded Message, or to the exception raised while decoding.
+        """
+        start = time.perf_counter()
+        try:
+            json_message = Message.load_raw(raw_message.data)
+        except Exception as e:
+            return {id(schema): e for _, schema, _, _ in self._handlers}
+        parsed = time.perf_counter()
+
+        messages = {}
+        durations = {}
+        for _, schema, _, _ in self._handlers:
+            if id(schema) not in messages:
+                decode_start = time.perf_counter()
+                try:
+                    # decode_json fills in defaults that depend on the schema, so each schema gets its own envelope.
+                    # The data is validated once a handler uses it, so filters on the envelope skip that work
+                    messages[id(schema)] = Message.decode_json(dict(json_message), schema, lazy=True, subject=self.subject)
+                except Exception as e:
+                    messages[id(schema)] = e
+                durations[id(schema)] = time.perf_counter() - decode_start
+
+        if self.metrics is not None:
+            for _, schema, _, name in self._handlers:
+                self.metrics.observe("decode", name, parsed - start)
+                self.metrics.observe("validation", name, durations[id(schema)])
+        return messages
+
+    async def receive(self, raw_message):
+        """
+        Callback registered with NATS. Queues the message to be dispatched, so NATS does not buffer messages
+        without bound when the handlers fall behind.
+
+        Args:
+            raw_message (nats.aio.client.Msg): Message received from NATS.
+        """
+        self.pending.put(raw_message)
+
+    async def dispatch(self, raw_message):
+        """
+        Decodes a message and queues it for every handler, without waiting for the handlers unless one of them has
+        too many messages waiting already.
+
+        Args:
+            raw_message (nats.aio.client.Msg): Message received from NATS.
+        """
+        messages = self.decode(raw_message)
+        for _, schema, queue, _ in list(self._handlers):
+            await queue.put(messages[id(schema)], raw_message)
+
+
+class MessageBatcher:
+    """
+    Collects decoded messages and hands them to a callback as a list, once max_batch messages were collected or
+    max_latency seconds passed since the first message of the batch arrived, whichever happens first.
+    """
+
+    def __init__(self, callback: Callable, on_error: Callable, max_batch: int = 100, max_latency: float = 0.1):
+        """
+        Initializes an empty batcher.
+
+        Args:
+            callback (function): Async function called with the list of collected messages.
+            on_error (function): Async function without arguments called from within an except block whenever a
+                batch flushed after max_latency fails.
+            max_batch (int, optional): Maximum number of messages in a batch. Defaults to 100.
+            max_latency (float, optional): Maximum seconds a message waits for its batch. Defaults to 0.1.
+        """
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._callback = callback
+        self._on_error = on_error
+        self._messages = []
+        self._timer = None
+        self._tasks = set()
+
+    def __len__(self):
+        return len(self._messages)
+
+    async def add(self, message, raw_message=None):
+        """
+        Adds a message to the current batch and flushes it if it is full. Can be used as Subscription handler.
+
+        Args:
+            message (Message): Decoded message.
+            raw_message (nats.aio.client.Msg, optional): Message received from NATS, unused.
+        """
+        self._messages.append(message)
+        if len(self._messages) >= self.max_batch:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_latency, self._flush_later)
+
+    def _flush_later(self):
+        """
+        Timer callback that flushes the batch in a new task.
+        """
+        self._timer = None
+        task = asyncio.get_running_loop().create_task(self._flush_logged())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception:
+            await self._on_error()
+
+    async def flush(self):
+        """
+        Hands the collected messages to the callback, if there are any.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._messages:
+            return
+        messages = self._messages
+        self._messages = []
+        await self._callback(messages)
+
+
+class LatestOnly:
+    """
+    Runs a callback on the latest message only. Messages that arrive while the callback is running replace each other,
+    so once it finishes it is run on the newest of them and the others are skipped. Used for callbacks that need to
+    keep up with a periodic message, e.g. a timestep, rather than handle each of them.
+    """
+
+    def __init__(self, callback: Callable, on_error: Callable):
+        """
+        Initializes the conflation without a pending message.
+
+        Args:
+            callback (function): Async function called with the message and the raw NATS message.
+            on_error (function): Async function without arguments called from within an except block whenever the
+                callback fails.
+        """
+        self.skipped = 0
+        self._callback = callback
+        self._on_error = on_error
+        self._latest = None
+        self._task = None
+
+    async def add(self, message, raw_message=None):
+        """
+        Sets the message the callback runs on next, replacing a message that is still waiting. Can be used as
+        Subscription handler, since it does not wait for the callback.
+
+        Args:
+            message (Message): Decoded message.
+            raw_message (nats.aio.client.Msg, optional): Message received from NATS.
+        """
+        if self._latest is not None:
+            self.skipped += 1
+        self._latest = (message, raw_message)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        """
+        Task running the callback until no message is waiting anymore.
+        """
+        try:
+            while self._latest is not None:
+                message, raw_message = self._latest
+                self._latest = None
+                try:
+                    await self._callback(message, raw_message)
+                except Exception:
+                    await self._on_error()
+        finally:
+            self._task = None
+
+    async def join(self):
+        """
+        Waits until the callback ran on the latest message.
+        """
+        while self._task is not None:
+            await asyncio.shield(self._task)
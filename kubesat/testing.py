@@ -25,6 +25,9 @@ class FakeLogger:
     async def info(self, msg):
         print(msg)
 
+    async def error(self, msg):
+        print(msg)
+
 class FakeNatsHandler:
     """
     Handler that is the interface to a NATS server. Responsible for interacting with the server, checking whether the
@@ -13,8 +13,11 @@
 # limitations under the License.
 
 import asyncio
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from jsonschema.exceptions import ValidationError, best_match
+from jsonschema.validators import validator_for
 
 
 class MessageSchemas:
@@ -89,7 +92,10 @@ class MessageSchemas:
             "data": {
                 "type": "object",
                 "additionalProperties": False,
-                "required": ["host", "port", "route", "data_id"],
+                "anyOf": [
+                    {"required": ["host", "port", "route", "data_id"]},
+                    {"required": ["payload"]}
+                ],
                 "properties": {
                     "host": {
                         "type": "string"
@@ -102,6 +108,9 @@ class MessageSchemas:
                     },
                     "data_id": {
                         "type": "string"
+                    },
+                    "payload": {
+                        "type": "object"
                     }
                 }
             }
@@ -230,6 +239,41 @@ class MessageSchemas:
         }
     }
 
+    LEASE_MESSAGE = {
+        "name": "lease_message",
+        "type": "object",
+        "additionalProperties": False,
+        "required": ["sender_ID", "time_sent", "data", "origin_ID", "message_type"],
+        "properties": {
+            "sender_ID": {
+                "type": "string",
+            },
+            "time_sent": {
+                "type": "string"
+            },
+            "origin_ID": {
+                "type": "string"
+            },
+            "message_type": {
+                "type": "string"
+            },
+            "data": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["service_type", "ttl"],
+                "properties": {
+                    "service_type": {
+                        "type": "string"
+                    },
+                    "ttl": {
+                        "type": "number",
+                        "exclusiveMinimum": 0
+                    }
+                }
+            }
+        }
+    }
+
     SEND_DATA_MESSAGE = {
         "name": "send_data_message",
         "type": "object",
@@ -1294,24 +1338,299 @@ class SharedStorageSchemas:
     }
 
 
+class ValidatorRegistry:
+    """
+    Registry of compiled JSON schema validators. Checking a schema and building a validator for it is far more
+    expensive than validating an instance, so each schema is compiled once and the validator is reused by every
+    caller of validate_json. Schemas are plain dicts and therefore unhashable, so they are keyed by identity.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty registry.
+        """
+        self._validators = {}
+        self._envelopes = {}
+
+    def get(self, schema: dict):
+        """
+        Returns the compiled validator for a schema, compiling and caching it on first use.
+
+        Args:
+            schema (dict): JSON schema to get the validator for.
+
+        Returns:
+            jsonschema.protocols.Validator: Validator instance bound to the schema.
+        """
+        entry = self._validators.get(id(schema))
+
+        # keep a reference to the schema in the entry so its id cannot be reused by another dict
+        if entry is None or entry[0] is not schema:
+            cls = validator_for(schema)
+            cls.check_schema(schema)
+            entry = (schema, cls(schema))
+            self._validators[id(schema)] = entry
+        return entry[1]
+
+    def get_envelope(self, schema: dict):
+        """
+        Returns the compiled validator for the envelope of a message schema, i.e. the schema without the constraints
+        on the "data" field, compiling and caching it on first use.
+
+        Args:
+            schema (dict): JSON schema of a message.
+
+        Returns:
+            jsonschema.protocols.Validator: Validator instance bound to the envelope schema.
+        """
+        entry = self._envelopes.get(id(schema))
+        if entry is None or entry[0] is not schema:
+            envelope = dict(schema)
+            envelope["properties"] = {**schema.get("properties", {}), "data": {}}
+            entry = (schema, self.get(envelope))
+            self._envelopes[id(schema)] = entry
+        return entry[1]
+
+    def compile_all(self, schema_class):
+        """
+        Compiles every schema defined as class attribute of a schema collection, e.g. MessageSchemas.
+
+        Args:
+            schema_class (class): Class holding schemas as dict attributes.
+
+        Returns:
+            int: Number of schemas compiled.
+        """
+        count = 0
+        for name, schema in vars(schema_class).items():
+            if not name.startswith("_") and isinstance(schema, dict):
+                self.get(schema)
+                count += 1
+        return count
+
+    def clear(self):
+        """
+        Removes all compiled validators, e.g. after a schema has been modified in place.
+        """
+        self._validators.clear()
+        self._envelopes.clear()
+
+
+validators = ValidatorRegistry()
+
+
 def validate_json(data, schema):
     """
-    Validates a json dictionary according to the schemas
+    Validates a json dictionary according to the schemas. Uses the validator compiled for the schema by the
+    module level ValidatorRegistry and raises the same errors as jsonschema.validate.
     Args:
         data: json dictionary
         schema: json schema
     """
     # TODO: Adapt to overarching exception handling strategy
-    validate(instance=data, schema=schema)
+    error = best_match(validators.get(schema).iter_errors(data))
+    if error is not None:
+        raise error
+    return True
+
+
+def validate_envelope(data, schema):
+    """
+    Validates the envelope of a json message, i.e. every field but "data", according to a message schema. Raises the
+    same errors as validate_json.
+    Args:
+        data: json dictionary
+        schema: json schema of the message
+    """
+    error = best_match(validators.get_envelope(schema).iter_errors(data))
+    if error is not None:
+        raise error
     return True
 
 
+# validation modes of a ValidationPolicy
+VALIDATE_ALWAYS = "always"
+VALIDATE_SAMPLE = "sample"
+VALIDATE_FIRST_SIGHT = "first_sight"
+VALIDATE_OFF = "off"
+VALIDATION_MODES = (VALIDATE_ALWAYS, VALIDATE_SAMPLE, VALIDATE_FIRST_SIGHT, VALIDATE_OFF)
+
+
+class ValidationPolicy:
+    """
+    Decides which messages and shared storage changes are validated. The mode is "always", "sample" (validate one in
+    every sample_rate), "first_sight" (validate the first message of each sender) or "off", e.g. for subjects only
+    used between services of the own deployment. Modes can be set per subject and per schema name, the subject taking
+    precedence, and default to the mode of the policy. Counts the checks, skips and violations per schema name.
+    """
+
+    def __init__(self, mode: str = VALIDATE_ALWAYS, sample_rate: int = 100):
+        """
+        Initializes a policy.
+
+        Args:
+            mode (str, optional): Default mode. Defaults to "always".
+            sample_rate (int, optional): In "sample" mode, one in this many messages is validated. Defaults to 100.
+
+        Raises:
+            ValueError: If the mode is unknown or the sample rate is not positive.
+        """
+        self._default = self._parse_mode(mode, sample_rate)
+        self._modes = {}
+        self._samples = defaultdict(int)
+        self._seen = set()
+        self.checked = defaultdict(int)
+        self.skipped = defaultdict(int)
+        self.violations = defaultdict(int)
+
+    @staticmethod
+    def _parse_mode(mode: str, sample_rate: int = 100) -> tuple:
+        """
+        Parses a mode, which may be given as "sample:N", into a (mode, sample rate) tuple.
+        """
+        if mode.startswith(VALIDATE_SAMPLE + ":"):
+            mode, sample_rate = VALIDATE_SAMPLE, int(mode.split(":", 1)[1])
+        if mode not in VALIDATION_MODES:
+            raise ValueError(f"Unknown validation mode {mode}, expected one of {', '.join(VALIDATION_MODES)}")
+        if sample_rate < 1:
+            raise ValueError(f"Sample rate must be positive, got {sample_rate}")
+        return mode, sample_rate
+
+    def set_mode(self, key: str, mode: str, sample_rate: int = 100):
+        """
+        Sets the mode of a subject or schema name.
+
+        Args:
+            key (str): Subject, e.g. "internal.data.out", or name of a schema, e.g. "timestep_message". The
+                shared storage is validated according to the key "shared_storage".
+            mode (str): One of "always", "sample" or "sample:N", "first_sight" or "off".
+            sample_rate (int, optional): Sample rate of the "sample" mode. Defaults to 100.
+
+        Raises:
+            ValueError: If the mode is unknown or the sample rate is not positive.
+        """
+        self._modes[key] = self._parse_mode(mode, sample_rate)
+
+    def configure(self, spec: str):
+        """
+        Sets the modes from a comma separated specification, e.g. "sample:10,internal.data.out=off". An entry without
+        a key sets the default mode.
+
+        Args:
+            spec (str): Specification of the modes.
+
+        Raises:
+            ValueError: If a mode is unknown or a sample rate is not positive.
+        """
+        for entry in filter(None, (entry.strip() for entry in spec.split(","))):
+            key, _, mode = entry.rpartition("=")
+            if key:
+                self.set_mode(key.strip(), mode.strip())
+            else:
+                self._default = self._parse_mode(mode)
+
+    def decide(self, name: str, subject: str = None, sender: str = None) -> bool:
+        """
+        Decides whether a message or storage change is validated, counting it as skipped if not.
+
+        Args:
+            name (str): Name of the schema.
+            subject (str, optional): Subject the message is sent or received on. Defaults to None.
+            sender (str, optional): Sender ID of the message. Defaults to None.
+
+        Returns:
+            bool: True if it should be validated.
+        """
+        mode, sample_rate = self._modes.get(subject) or self._modes.get(name) or self._default
+        if mode == VALIDATE_ALWAYS:
+            return True
+        if mode == VALIDATE_SAMPLE:
+            count = self._samples[name]
+            self._samples[name] = count + 1
+            validate = count % sample_rate == 0
+        elif mode == VALIDATE_FIRST_SIGHT:
+            validate = (name, sender) not in self._seen
+            self._seen.add((name, sender))
+        else:
+            validate = False
+        if not validate:
+            self.skipped[name] += 1
+        return validate
+
+    def check(self, data, schema: dict, sender: str = None, envelope: bool = False, count: bool = True) -> bool:
+        """
+        Validates a message or storage according to a schema, counting the check and any violation. A sender whose
+        message violates the schema is validated again on its next message in "first_sight" mode.
+
+        Args:
+            data: json dictionary
+            schema (dict): json schema
+            sender (str, optional): Sender ID of the message. Defaults to None.
+            envelope (bool, optional): If True, only validates the envelope of a message. Defaults to False.
+            count (bool, optional): If False, only a violation is counted, e.g. for the data of a lazily decoded
+                message whose envelope check was already counted. Defaults to True.
+
+        Raises:
+            ValidationError: If the data does not comply with the schema.
+
+        Returns:
+            bool: True
+        """
+        with self.checking(schema.get("name", "unknown"), sender, count):
+            return validate_envelope(data, schema) if envelope else validate_json(data, schema)
+
+    @contextmanager
+    def checking(self, name: str, sender: str = None, count: bool = True):
+        """
+        Context manager counting a check, and a violation if the enclosed validation raises a ValidationError.
+
+        Args:
+            name (str): Name of the schema.
+            sender (str, optional): Sender ID of the message. Defaults to None.
+            count (bool, optional): If False, only a violation is counted. Defaults to True.
+        """
+        if count:
+            self.checked[name] += 1
+        try:
+            yield
+        except ValidationError:
+            self.record_violation(name, sender)
+            raise
+
+    def record_violation(self, name: str, sender: str = None):
+        """
+        Counts a violation of a schema.
+
+        Args:
+            name (str): Name of the schema.
+            sender (str, optional): Sender ID of the violating message. Defaults to None.
+        """
+        self.violations[name] += 1
+        self._seen.discard((name, sender))
+
+    def reset(self):
+        """
+        Validates everything again and drops the counters, e.g. between tests.
+        """
+        self._default = (VALIDATE_ALWAYS, 100)
+        self._modes.clear()
+        self._samples.clear()
+        self._seen.clear()
+        self.checked.clear()
+        self.skipped.clear()
+        self.violations.clear()
+
+
+validation_policy = ValidationPolicy()
+
+
 def check_omni_in_range(callback_function):
     """
     Check to see if sender is in range
     Args:
         callback_function (function): callback function to be called
     """
+    @wraps(callback_function)
     async def decorator(msg, nats, shared_storage, logger):
         id = msg.sender_id
         if shared_storage["sat_phonebook"][id]:
@@ -1326,6 +1645,7 @@ def check_pointing(callback_function):
     Args:
         callback_function (function): Callback function to be called
     """
+    @wraps(callback_function)
     async def decorator(msg, nats, shared_storage, logger):
         if msg.sender_id in shared_storage["pointing"]:
             await callback_function(msg, nats, shared_storage, logger)
@@ -1371,6 +1691,7 @@ def check_internal(callback_function):
     Args:
         callback_function (function): Callback function to be called
     """
+    @wraps(callback_function)
     async def decorator(msg, nats, shared_storage, logger):
         if msg.origin_id == nats.sender_id:
             await callback_function(msg, nats, shared_storage, logger)
@@ -39,5 +39,13 @@ setup(
         "uvicorn==0.11.5",
         "numpy==1.19.0",
         "kubernetes"
-    ]
+    ],
+    extras_require={
+        "codecs": [
+            "orjson",
+            "msgpack",
+            "cbor2",
+            "lz4"
+        ]
+    }
 )
@@ -20,7 +20,7 @@ from kubesat.validation import MessageSchemas, SharedStorageSchemas
 
 simulation = BaseSimulation(ServiceTypes.Clock, SharedStorageSchemas.CLOCK_SERVICE_STORAGE)
 
-@simulation.schedule_callback(0.4)
+@simulation.schedule_callback(0.4, overrun="catch_up")
 async def send_timestep(nats, shared_storage, logger):
     """
     Broadcast the current time of the simulation and updates it by the timestep interval defined in the config.
@@ -16,9 +16,16 @@ import json
 from kubesat.validation import MessageSchemas, SharedStorageSchemas
 from kubesat.base_simulation import BaseSimulation
 from kubesat.services import ServiceTypes
+from kubesat.presence import LeaseTable, LEASE_SUBJECT
 
 simulation = BaseSimulation(ServiceTypes.Config, SharedStorageSchemas.CONFIG_SERVICE_STORAGE, "./simulation_config/simulation/config.json")
 
+# leases of the running services by sender ID and service type, renewed by the services themselves
+leases = LeaseTable()
+
+# seconds an initialized service has to send its first lease renewal
+INITIAL_LEASE = 30
+
 @simulation.request_nats_callback("initialize.service", MessageSchemas.SERVICE_TYPE_MESSAGE, append_sender_id=False)
 async def initialize_service(message, nats_handler, shared_storage, logger):
     """
@@ -38,6 +45,7 @@ async def initialize_service(message, nats_handler, shared_storage, logger):
             with open(f"{shared_storage['config_path']}/simulation/{service}.json", "r") as f:
                 shared_storage["simulation"][service] = True
                 new_config = json.load(f)
+                leases.renew((new_config["sender_id"], service_type), INITIAL_LEASE)
                 return nats_handler.create_message(new_config, MessageSchemas.CONFIG_MESSAGE)
     for cubesat in shared_storage["cubesats"]:
         for service in shared_storage["cubesats"][cubesat]:
@@ -45,6 +53,7 @@ async def initialize_service(message, nats_handler, shared_storage, logger):
                 with open(f"{shared_storage['config_path']}/cubesats/{cubesat}/{service}.json", "r") as f:
                     shared_storage["cubesats"][cubesat][service] = True
                     new_config = json.load(f)
+                    leases.renew((new_config["sender_id"], service_type), INITIAL_LEASE)
                     return nats_handler.create_message(new_config, MessageSchemas.CONFIG_MESSAGE)
     for groundstation in shared_storage["groundstations"]:
         for service in shared_storage["groundstations"][groundstation]:
@@ -52,6 +61,7 @@ async def initialize_service(message, nats_handler, shared_storage, logger):
                 with open(f"{shared_storage['config_path']}/groundstations/{groundstation}/{service}.json", "r") as f:
                     shared_storage["groundstations"][groundstation][service] = True
                     new_config = json.load(f)
+                    leases.renew((new_config["sender_id"], service_type), INITIAL_LEASE)
                     return nats_handler.create_message(new_config, MessageSchemas.CONFIG_MESSAGE)
     for iot in shared_storage["iots"]:
         for service in shared_storage["iots"][iot]:
@@ -59,49 +69,63 @@ async def initialize_service(message, nats_handler, shared_storage, logger):
                 with open(f"{shared_storage['config_path']}/iots/{iot}/{service}.json", "r") as f:
                     shared_storage["iots"][iot][service] = True
                     new_config = json.load(f)
+                    leases.renew((new_config["sender_id"], service_type), INITIAL_LEASE)
                     return nats_handler.create_message(new_config, MessageSchemas.CONFIG_MESSAGE)
 
     raise ValueError("Invalid Service Type or already activated: (bad)")
 
-@simulation.schedule_callback(10)
+@simulation.startup_callback
+async def track_running_services(nats_handler, shared_storage, logger):
+    """
+    Gives the services that are running according to the shared storage, e.g. after a restart of the config service,
+    time to renew their leases before they are considered dead.
+
+    Args:
+        nats_handler (NatsHandler): NatsHandler used to interact with NATS
+        shared_storage (dict): Dictionary to persist memory across callbacks
+        logger (JSONLogger): Logger that can be used to log info, error, etc,
+    """
+    for service, running in shared_storage["simulation"].items():
+        if running == True:
+            leases.renew(("simulation", service), INITIAL_LEASE)
+    for group in ["cubesats", "groundstations", "iots"]:
+        for node in shared_storage[group]:
+            for service, running in shared_storage[group][node].items():
+                if running == True:
+                    leases.renew((node, service), INITIAL_LEASE)
+
+@simulation.subscribe_nats_callback(LEASE_SUBJECT, MessageSchemas.LEASE_MESSAGE, read_only=True)
+async def renew_lease(message, nats_handler, shared_storage, logger):
+    """
+    Renews the lease of the service that sent the message.
+
+    Args:
+        message (Message): incoming message with the service type and the lease duration
+        nats_handler (NatsHandler): NatsHandler used to interact with NATS
+        shared_storage (dict): Dictionary to persist memory across callbacks
+        logger (JSONLogger): Logger that can be used to log info, error, etc,
+    """
+    leases.renew((message.sender_id, message.data["service_type"]), message.data["ttl"])
+
+@simulation.schedule_callback(1)
 async def check_status(nats, shared_storage, logger):
     """
-    Every 10 seconds sends a Nats request to every service that in its shared storage is "true" (ie: running) and
-    then if there is no reply changes the service status to false (ie: not running). 
+    Every second changes the status of the services whose lease expired to false (ie: not running). Services renew
+    their leases on their own, so this only looks at the leases that expired instead of pinging every service.
     Args:
         nats_handler (NatsHandler): NatsHandler used to interact with NATS
         shared_storage (dict): Dictionary to persist memory across callbacks
         logger (JSONLogger): Logger that can be used to log info, error, etc,
     """
-    message = nats.create_message("STATUS", MessageSchemas.STATUS_MESSAGE)
-    for service in shared_storage["simulation"]:
-        if shared_storage["simulation"][service] == True:
-            try:
-                await nats.request_message("node.status." + service + ".simulation", message, MessageSchemas.STATUS_MESSAGE, 5)
-            except Exception as e:
-                await logger.info(f"Service has died: {service}")
-                shared_storage["simulation"][service] = False
-    for node in shared_storage["cubesats"]:
-        for service in shared_storage["cubesats"][node]:
-            if shared_storage["cubesats"][node][service] == True:
-                try:
-                    await nats.request_message("node.status." + service + "."+node, message, MessageSchemas.STATUS_MESSAGE, 5)
-                except Exception as e:
-                    await logger.info(f"Service has died: {node} {service}")
-                    shared_storage["cubesats"][node][service] = False
-    for node in shared_storage["groundstations"]:
-        for service in shared_storage["groundstations"][node]:
-            if shared_storage["groundstations"][node][service] == True:
-                try:
-                    await nats.request_message("node.status." + service + "."+node, message, MessageSchemas.STATUS_MESSAGE, 5)
-                except Exception as e:
-                    await logger.info(f"Service has died: {node} {service}")
-                    shared_storage["groundstations"][node][service] = False
-    for node in shared_storage["iots"]:
-        for service in shared_storage["iots"][node]:
-            if shared_storage["iots"][node][service] == True:
-                try:
-                    await nats.request_message("node.status." + service + "."+node, message, MessageSchemas.STATUS_MESSAGE, 5)
-                except Exception as e:
-                    await logger.info(f"Service has died: {node} {service}")
-                    shared_storage["iots"][node][service] = False
+    for node, service in leases.expire():
+        if node == "simulation":
+            services = shared_storage["simulation"]
+        else:
+            services = None
+            for group in ["cubesats", "groundstations", "iots"]:
+                if node in shared_storage[group]:
+                    services = shared_storage[group][node]
+                    break
+        if services is not None and services.get(service) == True:
+            await logger.info(f"Service has died: {node} {service}")
+            services[service] = False
@@ -19,7 +19,7 @@ from kubesat.message import Message
 from kubesat.nats_handler import NatsHandler
 from kubesat.validation import MessageSchemas, check_pointing_and_mode, check_internal, check_internal_data, check_pointing
 from kubesat.testing import FakeNatsHandler, FakeLogger
-from config_service import initialize_service, check_status
+from config_service import initialize_service, check_status, leases
 import time
 
 class Tests(IsolatedAsyncioTestCase):
@@ -95,8 +95,12 @@ class Tests(IsolatedAsyncioTestCase):
                             },
                             "config_path":"./simulation_config"
                           }
-        nats = NatsHandler("data1", "0.0.0.0", "4222", loop=loop, user="a", password="b")
+        nats = FakeNatsHandler("data1", "0.0.0.0", "4222", loop=loop, user="a", password="b")
         await nats.connect()
         logger = FakeLogger()
+        leases.renew(("simulation", "clock"), 60)
+        await check_status(nats, shared_storage, logger)
+        self.assertTrue(shared_storage["simulation"]["clock"]==True)
+        leases.renew(("simulation", "clock"), 0)
         await check_status(nats, shared_storage, logger)
         self.assertTrue(shared_storage["simulation"]["clock"]==False)
@@ -23,29 +23,34 @@ from kubesat.validation import MessageSchemas, SharedStorageSchemas
 
 simulation = BaseSimulation(ServiceTypes.Czml, SharedStorageSchemas.GRAPHICS_SERVICE_STORAGE)
 
+# only the latest states matter for the visualization, so drop the oldest ones if the service falls behind
+simulation.limit_subscription("state", max_messages=10000, policy="drop_oldest")
+
 # These are hyperparameters, should be fine?
 # STEP_COUNT = 5
 # STEP_SIZE = 300.0
 PACKET_FREQUENCY = 5
 # MESSAGE_SENT = False
 
-@simulation.subscribe_nats_callback("state", MessageSchemas.STATE_MESSAGE)
-async def cubesat_state(message, nats_handler, shared_storage, logger):
+@simulation.subscribe_batch_callback("state", MessageSchemas.STATE_MESSAGE, max_batch=200, max_latency=0.1)
+async def cubesat_state(messages, nats_handler, shared_storage, logger):
     """
-    Update the state of a cubesat in the shared dictionary
+    Update the state of the cubesats in the shared dictionary
 
     Args:
-        message (natsmessage): message
+        messages (list): batch of state messages
             message.data dictionary with structure as described in message_structure.json
             message.data["state"] is a dictionary containing telematry data of a satellite
         nats_handler (natsHandler): distributes callbacks according to the message subject
         shared_storage: dictionary containing information on on the entire swarm, the time, and the particular satellites phonebook
     """
-    state = message.data["state"]
-    target_sat_id = list(state.keys())[0]
-    shared_storage["swarm"][target_sat_id] = state[target_sat_id] 
+    swarm = shared_storage["swarm"]
+    for message in messages:
+        state = message.data["state"]
+        target_sat_id = list(state.keys())[0]
+        swarm[target_sat_id] = state[target_sat_id]
 
-@simulation.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+@simulation.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE, latest_only=True)
 async def send_visualization_packet(message, nats_handler, shared_storage, logger):
     """
     Send packets over NATS describing the state of the swarm. Packets set include ground stations, satellites, and links when pairs 
@@ -40,18 +40,19 @@ async def create_log_file(nats_handler, shared_storage, logger):
     else:
         raise ValueError(f"Invalid logging file path {shared_storage['log_path']} is neither folder nor csv")
 
-@simulation.subscribe_nats_callback("logging.>", MessageSchemas.LOG_MESSAGE)
-async def print_log(message, nats_handler, shared_storage, logger):
+@simulation.subscribe_batch_callback("logging.>", MessageSchemas.LOG_MESSAGE, max_batch=500, max_latency=0.5, read_only=True)
+async def print_log(messages, nats_handler, shared_storage, logger):
     """
     Callback that prints out incoming logs
 
     Args:
-        message (Message): incoming message with current pointing target of the sender
+        messages (list): batch of incoming log messages
         nats_handler (NatsHandler): NatsHandler used to interact with NATS
         shared_storage (dict): Dictionary to persist memory across callbacks
         logger (JSONLogger): Logger that can be used to log info, error, etc.
     """
-    print(f"Sender: {message.sender_id} at {message.time_sent}: {message.data}")
+    for message in messages:
+        print(f"Sender: {message.sender_id} at {message.time_sent}: {message.data}")
     with open(shared_storage["log_path"], "a+") as f:
         writer = csv.writer(f)
-        writer.writerow([str(message.sender_id), str(message.time_sent), str(message.data)])
+        writer.writerows([str(message.sender_id), str(message.time_sent), str(message.data)] for message in messages)
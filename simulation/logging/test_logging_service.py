@@ -64,7 +64,7 @@ class Test(IsolatedAsyncioTestCase):
                                             "msg": "This is a test!"
         }, MessageSchemas.LOG_MESSAGE)
         
-        await logging_service.print_log(message, nats, shared_storage, None)
+        await logging_service.print_log([message], nats, shared_storage, None)
 
         self.assertTrue("logger_test" in os.listdir())
         os.remove("./logger_test")
@@ -62,7 +62,7 @@ async def cubesat_X_attitude_provider(message, nats_handler, shared_storage, log
         shared_storage["swarm"][satellite_id]["orbit"]["attitude"] = attitude
 
 
-@simulation.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+@simulation.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE, latest_only=True)
 async def simulation_timepulse_propagate(message, nats_handler, shared_storage, logger):
     """
     Propagates the satellites current orbit and attitude
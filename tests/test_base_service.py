@@ -23,6 +23,11 @@ from time import sleep
 
 import sys
 import os
+import json
+import tempfile
+from unittest.mock import patch
+
+from fastapi import HTTPException, Request
 
 from kubesat.base_service import BaseService
 from kubesat.validation import MessageSchemas, SharedStorageSchemas
@@ -105,3 +110,76 @@ class Tests(TestCase):
             pass
 
         self.assertEqual(svc._startup_callback, startup)
+
+    def test_lazy_kubernetes_client(self):
+        """
+        Testing whether the kubernetes client is only created once it is used
+        """
+
+        svc = BaseService("template_service",
+                          SharedStorageSchemas.TEMPLATE_STORAGE)
+        with patch("kubesat.base_service.KubernetesHandler") as handler:
+            self.assertEqual(handler.call_count, 0)
+            self.assertIs(svc.kubernetes_client, handler.return_value)
+            self.assertIs(svc.kubernetes_client, handler.return_value)
+            self.assertEqual(handler.call_count, 1)
+
+    def test_load_config_from_file(self):
+        """
+        Testing whether the configuration is read from the config file and written to redis
+        """
+
+        class FakeRedisHandler:
+            def set_shared_storage(self, shared_storage):
+                self.shared_storage = shared_storage
+
+            def set_sender_id(self, sender_id):
+                self.sender_id = sender_id
+
+        with tempfile.TemporaryDirectory() as directory:
+            config_path = os.path.join(directory, "config.json")
+            with open(config_path, "w") as f:
+                json.dump({"sender_id": "test", "shared_storage": {"test_value": "a"}}, f)
+            svc = BaseService("template_service",
+                              SharedStorageSchemas.TEMPLATE_STORAGE, config_path)
+            svc.redis_client = FakeRedisHandler()
+            asyncio.run(svc._load_config())
+        self.assertEqual(svc.sender_id, "test")
+        self.assertEqual(svc.shared_storage, {"test_value": "a"})
+        self.assertEqual(svc.redis_client.sender_id, "test")
+        self.assertEqual(svc.redis_client.shared_storage, {"test_value": "a"})
+
+    def _post_data_batch(self, svc, body):
+        """
+        Calls the data batch endpoint of a service with the given raw request body
+        """
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        with patch("kubesat.base_service.uvicorn"), patch("kubesat.base_service.RedisHandler"):
+            svc.run()
+        endpoint = next(route.endpoint for route in svc._api.routes if route.path == "/data/batch")
+        request = Request({"type": "http", "method": "POST", "headers": []}, receive)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(endpoint(request))
+        return context.exception.status_code
+
+    def test_data_batch_invalid_json(self):
+        """
+        Testing whether a data batch request with a body that is not JSON is rejected as bad request
+        """
+
+        svc = BaseService("template_service",
+                          SharedStorageSchemas.TEMPLATE_STORAGE)
+        self.assertEqual(self._post_data_batch(svc, b"not json"), 400)
+
+    def test_data_batch_missing_ids(self):
+        """
+        Testing whether a data batch request without a list of ids is rejected as bad request
+        """
+
+        svc = BaseService("template_service",
+                          SharedStorageSchemas.TEMPLATE_STORAGE)
+        for body in ({}, {"ids": "a"}, ["a"]):
+            self.assertEqual(self._post_data_batch(svc, json.dumps(body).encode()), 400)
@@ -0,0 +1,125 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the wire codecs, the compression and their use by the Message class.
+"""
+
+import os
+import json
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+from kubesat import codec
+from kubesat.message import Message
+from kubesat.validation import MessageSchemas
+
+STATE = {
+    "sender_ID": "cubesat_1",
+    "origin_ID": "cubesat_1",
+    "message_type": "test_message",
+    "time_sent": "2020-07-06T00:00:00.000",
+    "data": {"testData": "This is a test", "position": [6878.137, -0.000123, 1e-12]}
+}
+
+
+class Tests(TestCase):
+
+    def test_json_codecs(self):
+        """
+        Testing whether both JSON codecs produce plain JSON without a marker byte
+        """
+        for name in ("json", "fast_json"):
+            encoded = codec.get_codec(name).dumps(STATE)
+            self.assertEqual(json.loads(encoded.decode()), STATE)
+            self.assertEqual(codec.decode(encoded), STATE)
+
+        # values orjson can not encode fall back to the standard library
+        self.assertEqual(codec.FAST_JSON.dumps({"big": 2 ** 70}), b'{"big": 1180591620717411303424}')
+        self.assertEqual(str(codec.decode(codec.JSON.dumps({"nan": float("nan")}))["nan"]), "nan")
+
+    def test_binary_codecs(self):
+        """
+        Testing whether binary codecs are detected by their marker byte on decoding
+        """
+        for binary in (codec.MSGPACK, codec.CBOR):
+            if not binary.available:
+                with self.assertRaises(ValueError):
+                    codec.get_codec(binary.name)
+                with self.assertRaises(ValueError):
+                    codec.decode(binary.marker + b"\x80")
+                continue
+            encoded = binary.dumps(STATE)
+            self.assertEqual(encoded[:1], binary.marker)
+            self.assertLess(len(encoded), len(codec.JSON.dumps(STATE)))
+            self.assertEqual(codec.decode(encoded), STATE)
+
+    def test_message(self):
+        """
+        Testing whether messages are encoded with the given codec and decoded with the one they were encoded with
+        """
+        state = {**STATE, "data": {"testData": "This is a test"}}
+        message = Message.decode_json(dict(state), MessageSchemas.TEST_MESSAGE)
+        self.assertEqual(message.encode_raw(), json.dumps(state).encode())
+        decoded = Message.decode_raw(message.encode_raw(codec.FAST_JSON), MessageSchemas.TEST_MESSAGE)
+        self.assertEqual(decoded.encode_json(), state)
+
+        with self.assertRaises(ValueError):
+            codec.get_codec("xml")
+
+    def test_compression(self):
+        """
+        Testing whether large messages are compressed, decoded transparently and counted per subject
+        """
+        compressor = codec.Compressor.from_spec("zlib:1024")
+        small = codec.JSON.dumps(STATE)
+        large = codec.JSON.dumps({**STATE, "data": {"positions": [STATE["data"]["position"]] * 200}})
+        self.assertIs(compressor.compress("state", small), small)
+        compressed = compressor.compress("state", large)
+        self.assertEqual(compressed[:1], codec.ZLIB_MARKER)
+        self.assertEqual(codec.decode(compressed), json.loads(large))
+
+        # incompressible messages are sent as they are
+        noise = os.urandom(2048)
+        self.assertIs(compressor.compress("_INBOX.abc", noise), noise)
+
+        stats = compressor.stats["state"]
+        self.assertEqual((stats.messages, stats.compressed), (2, 1))
+        self.assertEqual(stats.raw_bytes, len(small) + len(large))
+        self.assertGreater(stats.ratio, 5)
+        self.assertEqual(compressor.stats["_INBOX"].ratio, 1.0)
+
+        with patch.object(codec, "MAX_DECOMPRESSED_SIZE", 1024):
+            with self.assertRaises(ValueError):
+                codec.decode(compressed)
+        with self.assertRaises(ValueError):
+            codec.Compressor("gzip")
+
+    @unittest.skipIf(codec.lz4 is None, "lz4 is not installed")
+    def test_lz4_size_limit(self):
+        """
+        Testing whether lz4 compressed messages stop decompressing once they exceed the size limit
+        """
+        large = codec.JSON.dumps({**STATE, "data": {"positions": [STATE["data"]["position"]] * 200}})
+        compressed = codec.Compressor.from_spec("lz4:1024").compress("state", large)
+        self.assertEqual(compressed[:1], codec.LZ4_MARKER)
+        self.assertEqual(codec.decode(compressed), json.loads(large))
+        with patch.object(codec, "MAX_DECOMPRESSED_SIZE", 1024):
+            with self.assertRaises(ValueError):
+                codec.decode(compressed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the StorageAccess and CallbackScheduler classes.
+"""
+
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from kubesat.concurrency import StorageAccess, CallbackScheduler
+
+
+class Tests(IsolatedAsyncioTestCase):
+
+    def test_conflicts(self):
+        """
+        Testing whether conflicting storage access is detected
+        """
+        orbit = StorageAccess(reads=["time"], writes=["swarm"])
+        clock = StorageAccess(writes=["time"])
+        status = StorageAccess(reads=["swarm"])
+        undeclared = StorageAccess()
+        read_only = StorageAccess(read_only=True)
+
+        self.assertTrue(orbit.conflicts(clock))
+        self.assertTrue(status.conflicts(orbit))
+        self.assertFalse(status.conflicts(clock))
+        self.assertTrue(undeclared.conflicts(status))
+        self.assertTrue(clock.conflicts(undeclared))
+        self.assertFalse(undeclared.conflicts(undeclared))
+        self.assertFalse(undeclared.conflicts(read_only))
+        self.assertFalse(read_only.conflicts(status))
+        self.assertTrue(read_only.conflicts(clock))
+        self.assertTrue(StorageAccess(reads=["time"], read_only=True).conflicts(clock))
+        self.assertFalse(undeclared.concurrent)
+        self.assertTrue(read_only.concurrent)
+
+    async def test_scheduling(self):
+        """
+        Testing whether only non conflicting callbacks overlap and conflicting ones keep their order
+        """
+        errors = []
+
+        async def on_error():
+            errors.append(True)
+
+        scheduler = CallbackScheduler(on_error, max_concurrency=8)
+        events = []
+
+        def callback(name):
+            async def run():
+                events.append(f"start {name}")
+                await asyncio.sleep(0.01)
+                events.append(f"end {name}")
+            return run
+
+        await scheduler.submit(StorageAccess(writes=["a"]), None, callback("a1"))
+        await scheduler.submit(StorageAccess(writes=["b"]), None, callback("b"))
+        await scheduler.submit(StorageAccess(reads=["a"]), None, callback("a2"))
+        await scheduler.join()
+
+        self.assertEqual(events[:2], ["start a1", "start b"])
+        self.assertLess(events.index("end a1"), events.index("start a2"))
+        self.assertEqual(errors, [])
+
+    async def test_mixed_declarations(self):
+        """
+        Testing whether declared writers and undeclared callbacks do not overlap
+        """
+        async def on_error():
+            pass
+
+        scheduler = CallbackScheduler(on_error)
+        storage = {"time": 0}
+
+        def increment(name):
+            async def run():
+                value = storage["time"]
+                await asyncio.sleep(0.01)
+                storage["time"] = value + 1
+            return run
+
+        await asyncio.gather(
+            scheduler.submit(StorageAccess(writes=["time"]), None, increment("declared")),
+            scheduler.submit(StorageAccess(), "undeclared", increment("undeclared")),
+            scheduler.submit(StorageAccess(writes=["time"]), None, increment("declared")))
+        await scheduler.join()
+        self.assertEqual(storage["time"], 3)
+
+        events = []
+
+        async def read():
+            events.append("read")
+
+        async def write():
+            events.append("write start")
+            await asyncio.sleep(0.01)
+            events.append("write end")
+
+        await scheduler.submit(StorageAccess(writes=["time"]), None, write)
+        await scheduler.submit(StorageAccess(read_only=True), "reader", read)
+        await scheduler.join()
+        self.assertEqual(events, ["write start", "write end", "read"])
+
+    async def test_undeclared_callbacks(self):
+        """
+        Testing whether callbacks that did not declare their keys only wait for their own previous runs
+        """
+        async def on_error():
+            pass
+
+        scheduler = CallbackScheduler(on_error)
+        events = []
+
+        def callback(name, duration):
+            async def run():
+                events.append(f"start {name}")
+                await asyncio.sleep(duration)
+                events.append(f"end {name}")
+            return run
+
+        # each callback is awaited by its own subscription, like inline callbacks are
+        undeclared = StorageAccess()
+        slow = asyncio.create_task(scheduler.submit(undeclared, "slow", callback("slow", 0.05)))
+        await asyncio.sleep(0)
+        await scheduler.submit(undeclared, "fast", callback("fast", 0))
+        await scheduler.join()
+        self.assertEqual(events, ["start slow", "start fast", "end fast"])
+
+        await slow
+        await asyncio.gather(
+            scheduler.submit(undeclared, "slow", callback("slow 2", 0.01)),
+            scheduler.submit(undeclared, "slow", callback("slow 3", 0)))
+        self.assertEqual(events[-4:], ["start slow 2", "end slow 2", "start slow 3", "end slow 3"])
+
+    async def test_serial_key(self):
+        """
+        Testing whether callbacks with the same serial key do not overlap
+        """
+        async def on_error():
+            pass
+
+        scheduler = CallbackScheduler(on_error)
+        running = []
+        overlaps = []
+
+        def callback(key):
+            async def run():
+                if key in running:
+                    overlaps.append(key)
+                running.append(key)
+                await asyncio.sleep(0.01)
+                running.remove(key)
+            return run
+
+        access = StorageAccess(writes=[], serialize_by="origin_id")
+        for key in ["sat_1", "sat_2", "sat_1", "sat_2"]:
+            await scheduler.submit(access, key, callback(key))
+        await scheduler.join()
+        self.assertEqual(overlaps, [])
@@ -0,0 +1,123 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the DataFetcher and FetchQueue classes. Starts a local aiohttp server to fetch data from.
+"""
+
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from aiohttp import web
+
+from kubesat.data_fetcher import DataFetcher, FetchQueue
+
+
+class Tests(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async def get_data(request):
+            data_id = request.match_info["data_id"]
+            if data_id == "missing":
+                return web.json_response({"detail": "not found"}, status=404)
+            return web.json_response({"data_id": data_id})
+
+        self.batches = []
+
+        async def get_data_batch(request):
+            data_ids = (await request.json())["ids"]
+            self.batches.append(data_ids)
+            return web.json_response([None if data_id == "missing" else {"data_id": data_id} for data_id in data_ids])
+
+        app = web.Application()
+        app.router.add_post("/data/batch", get_data_batch)
+        app.router.add_get("/data/{data_id}", get_data)
+        app.router.add_get("/old/{data_id}", get_data)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.fetcher = DataFetcher(limit_per_host=2)
+
+    async def asyncTearDown(self):
+        await self.fetcher.close()
+        await self.runner.cleanup()
+
+    async def test_get_json(self):
+        """
+        Testing whether data is fetched over the pooled session and failed requests raise
+        """
+        result = await self.fetcher.get_json(f"http://127.0.0.1:{self.port}/data/abc")
+        self.assertEqual(result, {"data_id": "abc"})
+        with self.assertRaises(ValueError):
+            await self.fetcher.get_json(f"http://127.0.0.1:{self.port}/data/missing")
+
+    async def test_fetch_queue_order(self):
+        """
+        Testing whether results are handed to the callback in queueing order and failures are reported
+        """
+        results = []
+        errors = []
+
+        async def callback(result):
+            results.append(result)
+
+        async def on_error():
+            errors.append(True)
+
+        async def delayed(value, delay):
+            await asyncio.sleep(delay)
+            return value
+
+        queue = FetchQueue(callback, on_error, max_pending=2)
+        await queue.put(delayed(1, 0.03))
+        await queue.put(delayed(2, 0))
+        await queue.put(self.fetcher.get_json(f"http://127.0.0.1:{self.port}/data/missing"))
+        await queue.put(delayed(3, 0))
+        await queue.join()
+        self.assertEqual(results, [1, 2, 3])
+        self.assertEqual(errors, [True])
+        self.assertEqual(len(queue), 0)
+
+    async def test_get_batched(self):
+        """
+        Testing whether data messages requested together are fetched with one request and missing ones raise
+        """
+        route_url = f"http://127.0.0.1:{self.port}/data"
+        fetches = [self.fetcher.get_batched(route_url, data_id) for data_id in ["a", "b", "missing", "c"]]
+        results = await asyncio.gather(*fetches, return_exceptions=True)
+        self.assertEqual(self.batches, [["a", "b", "missing", "c"]])
+        self.assertEqual(results[:2], [{"data_id": "a"}, {"data_id": "b"}])
+        self.assertIsInstance(results[2], ValueError)
+        self.assertEqual(results[3], {"data_id": "c"})
+
+        # a single request is sent as GET
+        self.assertEqual(await self.fetcher.get_batched(route_url, "d"), {"data_id": "d"})
+        self.assertEqual(len(self.batches), 1)
+
+        # batches are split once they reach max_batch
+        self.fetcher.max_batch = 2
+        await asyncio.gather(*[self.fetcher.get_batched(route_url, str(i)) for i in range(3)])
+        self.assertEqual(self.batches[1:], [["0", "1"]])
+
+    async def test_get_batched_fallback(self):
+        """
+        Testing whether routes without a batch endpoint are fetched with single requests
+        """
+        route_url = f"http://127.0.0.1:{self.port}/old"
+        results = await asyncio.gather(*[self.fetcher.get_batched(route_url, data_id) for data_id in ["a", "b"]])
+        self.assertEqual(results, [{"data_id": "a"}, {"data_id": "b"}])
+        self.assertEqual(self.batches, [])
+        self.assertEqual(await self.fetcher.get_batched(route_url, "c"), {"data_id": "c"})
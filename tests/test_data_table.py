@@ -0,0 +1,127 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the DataTable class.
+"""
+
+import time
+import asyncio
+import unittest
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+from kubesat.data_table import DataTable
+
+
+class Tests(TestCase):
+
+    def test_multiple_reads(self):
+        """
+        Testing whether entries can be read several times and misses are counted
+        """
+        table = DataTable()
+        table.put("a", "first", encoded=b"x" * 10)
+        self.assertEqual(table.get("a"), "first")
+        self.assertEqual(table["a"], "first")
+        with self.assertRaises(KeyError):
+            table.get("b")
+        self.assertEqual(table.stats, {"entries": 1, "bytes": 10, "hits": 2, "misses": 1, "evictions": 0, "expirations": 0})
+
+    def test_encoded(self):
+        """
+        Testing whether the encoded bytes are stored with the message or encoded once when they are first read
+        """
+        table = DataTable()
+        table.put("a", "first", encoded=b"first")
+        self.assertEqual(table.get_encoded("a"), b"first")
+
+        class FakeMessage:
+            def encode_raw(self):
+                return b"second"
+
+        table.put("b", FakeMessage())
+        self.assertEqual(table.size, 5)
+        self.assertEqual(table.get_encoded("b"), b"second")
+        self.assertEqual(table.size, 11)
+        table.discard("b")
+        self.assertEqual(table.size, 5)
+
+    def test_readers(self):
+        """
+        Testing whether entries are removed once the expected number of readers fetched them
+        """
+        table = DataTable()
+        table.put("a", "first", readers=2)
+        table.get("a")
+        self.assertIn("a", table)
+        table.get("a")
+        self.assertNotIn("a", table)
+
+    def test_expire(self):
+        """
+        Testing whether expired entries cannot be read and are removed by the sweep
+        """
+        table = DataTable(ttl=10)
+        table.put("a", "first", encoded=b"x" * 5)
+        table.put("b", "second", encoded=b"x" * 5)
+        del table["b"]
+        self.assertEqual(table.expire(time.monotonic() + 5), 0)
+        self.assertEqual(table.expire(time.monotonic() + 20), 1)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.size, 0)
+        self.assertEqual(table.expirations, 1)
+
+        table.ttl = 0
+        table.put("c", "third")
+        with self.assertRaises(KeyError):
+            table.get("c")
+
+    def test_lru_eviction(self):
+        """
+        Testing whether the least recently used entries are evicted once the table exceeds its size
+        """
+        table = DataTable(max_bytes=100)
+        table.put("a", "first", encoded=b"x" * 40)
+        table.put("b", "second", encoded=b"x" * 40)
+        table.get("a")
+        table.put("c", "third", encoded=b"x" * 40)
+        self.assertNotIn("b", table)
+        self.assertIn("a", table)
+        self.assertIn("c", table)
+        self.assertEqual(table.size, 80)
+        self.assertEqual(table.evictions, 1)
+
+        # an entry larger than the table is kept on its own
+        table.put("d", "fourth", encoded=b"x" * 200)
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.evictions, 3)
+
+
+class AsyncTests(IsolatedAsyncioTestCase):
+
+    async def test_sweep_timer(self):
+        """
+        Testing whether a single timer removes the entries once they expire
+        """
+        table = DataTable(ttl=0.02)
+        for data_id in range(10):
+            table.put(str(data_id), data_id)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.expirations, 10)
+        table.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
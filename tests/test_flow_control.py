@@ -0,0 +1,95 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the bounded PendingQueue of subscriptions.
+"""
+
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from kubesat.flow_control import PendingQueue
+
+
+class RawMessage:
+    """
+    Stand-in for the message objects passed to NATS callbacks.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+
+class Tests(IsolatedAsyncioTestCase):
+
+    async def fill(self, policy, count=6, **limits):
+        """
+        Queues messages while the handler is blocked and returns the handled messages and the queue.
+        """
+        handled = []
+        release = asyncio.Event()
+
+        async def handler(raw_message):
+            await release.wait()
+            handled.append(raw_message.data)
+
+        async def on_error():
+            raise AssertionError("unexpected error")
+
+        queue = PendingQueue(handler, on_error, policy=policy, **limits)
+        for i in range(count):
+            queue.put(RawMessage(bytes([i]) * 10))
+            await asyncio.sleep(0)
+        release.set()
+        await queue.join()
+        return [data[0] for data in handled], queue
+
+    async def test_drop_newest(self):
+        """
+        Testing whether incoming messages are dropped once the queue is full
+        """
+        handled, queue = await self.fill("drop_newest", max_messages=2)
+        self.assertEqual(handled, [0, 1, 2])
+        self.assertEqual(queue.dropped, 3)
+        self.assertEqual(queue.slow_consumer_events, 1)
+
+    async def test_drop_oldest(self):
+        """
+        Testing whether the oldest pending messages make room for incoming ones
+        """
+        handled, queue = await self.fill("drop_oldest", max_messages=2)
+        self.assertEqual(handled, [0, 4, 5])
+        self.assertEqual(queue.dropped, 3)
+
+    async def test_conflate(self):
+        """
+        Testing whether only the latest pending message is kept once the queue is full
+        """
+        handled, queue = await self.fill("conflate", max_bytes=25)
+        self.assertEqual(handled, [0, 5])
+        self.assertEqual(queue.dropped, 4)
+        self.assertEqual(queue.pending_bytes, 0)
+        self.assertEqual(len(queue), 0)
+
+    async def test_unknown_policy(self):
+        """
+        Testing whether unknown policies are rejected
+        """
+        with self.assertRaises(ValueError):
+            PendingQueue(None, None, policy="drop_all")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the service metrics and their Prometheus text format.
+"""
+
+import asyncio
+import unittest
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+from kubesat.metrics import Histogram, ServiceMetrics, LoopLagMonitor, PhaseTimings
+
+
+class Tests(TestCase):
+
+    def test_histogram(self):
+        """
+        Testing whether values are counted in the right buckets
+        """
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(0.1, 2), (1, 3), (float("inf"), 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.65)
+
+    def test_render(self):
+        """
+        Testing whether the metrics are rendered in the Prometheus text format
+        """
+        metrics = ServiceMetrics(buckets=(0.1,))
+        metrics.count_run("update")
+        metrics.count_run("update")
+        metrics.count_error("update")
+        metrics.observe("callback", "update", 0.05)
+        metrics.add_collector(lambda: [("kubesat_test", "gauge", "Test gauge.", [({"subject": "a\"b"}, 3)])])
+
+        lines = metrics.render().splitlines()
+        self.assertIn("# TYPE kubesat_callback_runs_total counter", lines)
+        self.assertIn('kubesat_callback_runs_total{callback="update"} 2', lines)
+        self.assertIn('kubesat_callback_errors_total{callback="update"} 1', lines)
+        self.assertIn('kubesat_callback_stage_seconds_bucket{callback="update",stage="callback",le="0.1"} 1', lines)
+        self.assertIn('kubesat_callback_stage_seconds_bucket{callback="update",stage="callback",le="+Inf"} 1', lines)
+        self.assertIn('kubesat_callback_stage_seconds_count{callback="update",stage="callback"} 1', lines)
+        self.assertIn('kubesat_test{subject="a\\"b"} 3', lines)
+
+
+class AsyncTests(IsolatedAsyncioTestCase):
+
+    async def test_loop_lag(self):
+        """
+        Testing whether blocking the event loop shows up as lag
+        """
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.005)
+        sum(range(3000000))
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+        self.assertGreater(monitor.max_lag, 0)
+        self.assertGreater(monitor.histogram.count, 0)
+
+    async def test_phase_timings(self):
+        """
+        Testing whether concurrent phases are recorded with their offsets and durations
+        """
+        now = [10]
+        timings = PhaseTimings(clock=lambda: now[0])
+
+        async def step(seconds):
+            await asyncio.sleep(0)
+            now[0] += seconds
+            return seconds
+
+        with timings.phase("connect"):
+            now[0] += 1
+        self.assertEqual(await timings.track("config", step(2)), 2)
+        self.assertEqual(timings.phases, {"connect": (0, 1), "config": (1, 2)})
+        self.assertEqual(timings.as_dict()["total"], 3)
+        self.assertEqual(timings.as_dict()["phases"]["config"], {"start": 1, "duration": 2})
+
+        timings.reset()
+        self.assertEqual((timings.phases, timings.total), ({}, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
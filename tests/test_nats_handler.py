@@ -113,6 +113,7 @@ class Tests(IsolatedAsyncioTestCase):
 
         loop = self._asyncioTestLoop
         nats = NatsHandler("test", "0.0.0.0", "4222", loop=loop, user="a", password="b")
+        nats.inline_threshold = 0
         await nats.connect()
 
         message = Message.decode_json({
@@ -128,6 +129,59 @@ class Tests(IsolatedAsyncioTestCase):
         await nats.disconnect()
         self.assertEqual(len(nats.data_table), 1)
 
+    async def test_send_data_inline(self):
+        """
+        Testing whether small data messages are sent inline instead of through the data table.
+        """
+
+        class FakeNC:
+            def __init__(self):
+                self.published = []
+
+            async def publish(self, topic, data):
+                self.published.append((topic, data))
+
+        nats = NatsHandler("test", "0.0.0.0", "4222", nc=FakeNC())
+        message = nats.create_message({
+                        "testData": "This is a test"
+                    }, MessageSchemas.TEST_MESSAGE)
+
+        result = await nats.send_data("subscribe-test", message)
+        self.assertTrue(result)
+        self.assertEqual(len(nats.data_table), 0)
+        api_message = Message.decode_raw(nats.nc.published[0][1], MessageSchemas.API_MESSAGE)
+        self.assertEqual(api_message.data["payload"]["data"], {"testData": "This is a test"})
+
+        nats.nc.published.clear()
+        nats.inline_threshold = 10
+        await nats.send_data("subscribe-test", message)
+        self.assertEqual(len(nats.data_table), 1)
+        api_message = Message.decode_raw(nats.nc.published[0][1], MessageSchemas.API_MESSAGE)
+        self.assertNotIn("payload", api_message.data)
+        data = await nats.retrieve_data_bytes(api_message.data["data_id"])
+        self.assertEqual(Message.decode_raw(data, MessageSchemas.TEST_MESSAGE).data, {"testData": "This is a test"})
+
+    async def test_send_message_compressed(self):
+        """
+        Testing whether large messages are compressed on sending and decompressed on decoding.
+        """
+
+        class FakeNC:
+            def __init__(self):
+                self.published = []
+
+            async def publish(self, topic, data):
+                self.published.append((topic, data))
+
+        nats = NatsHandler("test", "0.0.0.0", "4222", nc=FakeNC(), compression="zlib:256")
+        message = nats.create_message({
+                        "testData": "This is a test " * 100
+                    }, MessageSchemas.TEST_MESSAGE)
+        await nats.send_message("compress-test", message)
+        data = nats.nc.published[0][1]
+        self.assertEqual(data[:1], b"\x03")
+        self.assertEqual(Message.decode_raw(data, MessageSchemas.TEST_MESSAGE).data, message.data)
+        self.assertGreater(nats.compressor.stats["compress-test"].ratio, 10)
 
     async def test_receive(self):
         """
@@ -256,6 +310,12 @@ class Tests(IsolatedAsyncioTestCase):
         self.assertEqual(len(nats.data_table), 1)
         new_message = await nats.retrieve_data_message("someID")
         self.assertEqual(message.data, new_message.data)
+        self.assertEqual(len(nats.data_table), 1)
+
+        # the data message can be retrieved by several receivers until it is deleted
+        new_message = await nats.retrieve_data_message("someID")
+        self.assertEqual(message.data, new_message.data)
+        await nats.delete_data_message("someID")
         self.assertEqual(len(nats.data_table), 0)
 
         with self.assertRaises(KeyError):
@@ -0,0 +1,104 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the payload types generated from the message schemas.
+"""
+
+import unittest
+from unittest import TestCase
+from jsonschema.exceptions import ValidationError
+
+from kubesat.message import Message
+from kubesat.nats_handler import NatsHandler
+from kubesat.payloads import payload_types, PayloadRegistry
+from kubesat.validation import MessageSchemas
+
+ORBIT = {
+    "id": "cubesat_1",
+    "orbit": {
+        "eccentricity": 0.001,
+        "semimajor_axis": 6878137.0,
+        "inclination": 97.4,
+        "perigee_argument": 0.0,
+        "right_ascension_of_ascending_node": 0.0,
+        "anomaly": 0.0,
+        "anomaly_type": "TRUE",
+        "orbit_update_date": "2020-07-06T00:00:00.000",
+        "frame": "EME",
+        "attitude": "nadir"
+    }
+}
+
+
+class Tests(TestCase):
+
+    def test_generated_types(self):
+        """
+        Testing whether payload types are generated once per schema with nested types for nested objects
+        """
+        registry = PayloadRegistry()
+        types = registry.compile_all(MessageSchemas)
+        self.assertIs(types["ORBIT_MESSAGE"], registry.get(MessageSchemas.ORBIT_MESSAGE))
+        self.assertIsNone(registry.get(MessageSchemas.STATE_MESSAGE))
+        self.assertNotIn("STATUS_MESSAGE", types)
+
+        OrbitPayload = types["ORBIT_MESSAGE"]
+        self.assertEqual(OrbitPayload.__name__, "OrbitMessagePayload")
+        payload = OrbitPayload.from_wire(ORBIT)
+        self.assertEqual(payload.orbit.semimajor_axis, 6878137.0)
+        self.assertEqual(type(payload.orbit).__name__, "OrbitMessagePayloadOrbit")
+        self.assertFalse(hasattr(payload, "__dict__"))
+        self.assertEqual(payload.to_wire(), ORBIT)
+
+        # the module level registry generated the types of all message schemas when it was loaded
+        self.assertIn(id(MessageSchemas.ORBIT_MESSAGE), payload_types._types)
+
+    def test_validation_on_construction(self):
+        """
+        Testing whether payloads are validated when they are constructed or read from the wire
+        """
+        OrbitPayload = payload_types.get(MessageSchemas.ORBIT_MESSAGE)
+        payload = OrbitPayload(id="cubesat_1", orbit=OrbitPayload.from_wire(ORBIT).orbit)
+        self.assertEqual(payload, OrbitPayload.from_wire(ORBIT))
+        self.assertEqual(OrbitPayload(**ORBIT), payload)
+
+        with self.assertRaises(ValidationError):
+            OrbitPayload(id="cubesat_1")
+        with self.assertRaises(ValidationError):
+            OrbitPayload.from_wire({**ORBIT, "id": 1})
+        with self.assertRaises(TypeError):
+            OrbitPayload(name="cubesat_1")
+
+    def test_messages(self):
+        """
+        Testing whether messages are created from payloads and provide their data as payload
+        """
+        nats = NatsHandler("cubesat_1", "0.0.0.0", "4222")
+        OrbitPayload = payload_types.get(MessageSchemas.ORBIT_MESSAGE)
+        message = nats.create_message(OrbitPayload.from_wire(ORBIT), MessageSchemas.ORBIT_MESSAGE)
+        self.assertEqual(message.data, ORBIT)
+        self.assertEqual(message.payload.orbit.frame, "EME")
+
+        decoded = Message.decode_raw(message.encode_raw(), MessageSchemas.ORBIT_MESSAGE, lazy=True)
+        self.assertEqual(decoded.payload, message.payload)
+
+        with self.assertRaises(TypeError):
+            nats.create_message(OrbitPayload.from_wire(ORBIT), MessageSchemas.ATTITUDE_MESSAGE)
+        with self.assertRaises(TypeError):
+            nats.create_message({}, MessageSchemas.STATE_MESSAGE).payload
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the LeaseTable class.
+"""
+
+import unittest
+from unittest import TestCase
+
+from kubesat.presence import LeaseTable
+
+
+class Tests(TestCase):
+
+    def test_expire(self):
+        """
+        Testing whether only the leases that were not renewed in time expire
+        """
+        now = [0]
+        leases = LeaseTable(clock=lambda: now[0])
+        self.assertTrue(leases.renew(("cubesat_1", "orbits"), 10))
+        self.assertTrue(leases.renew(("simulation", "clock"), 5))
+        now[0] = 4
+        self.assertFalse(leases.renew(("simulation", "clock"), 10))
+        self.assertEqual(leases.expire(), [])
+
+        now[0] = 10
+        self.assertEqual(leases.expire(), [("cubesat_1", "orbits")])
+        self.assertNotIn(("cubesat_1", "orbits"), leases)
+        self.assertEqual(leases.expire(12), [])
+        self.assertEqual(leases.expire(20), [("simulation", "clock")])
+        self.assertEqual(len(leases), 0)
+
+    def test_release(self):
+        """
+        Testing whether released leases do not expire
+        """
+        leases = LeaseTable(clock=lambda: 0)
+        leases.renew("a", 1)
+        self.assertTrue(leases.release("a"))
+        self.assertFalse(leases.release("a"))
+        self.assertEqual(leases.expire(5), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
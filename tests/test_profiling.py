@@ -0,0 +1,69 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the stack sampler and memory tracker behind the debug endpoints.
+"""
+
+import time
+import asyncio
+import threading
+import unittest
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+from kubesat.profiling import StackSampler, MemoryTracker
+
+
+def busy_loop():
+    end = time.monotonic() + 0.1
+    while time.monotonic() < end:
+        pass
+
+
+class Tests(IsolatedAsyncioTestCase):
+
+    async def test_sample_event_loop(self):
+        """
+        Testing whether the sampler records the code blocking the event loop
+        """
+        sampler = StackSampler(threading.get_ident(), interval=0.001)
+        loop = asyncio.get_running_loop()
+        sampling = loop.run_in_executor(None, sampler.sample, 0.05)
+        busy_loop()
+        stacks = await sampling
+        collapsed = StackSampler.collapsed(stacks)
+        self.assertIn("test_profiling.py:busy_loop", collapsed)
+        stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+
+
+class MemoryTests(TestCase):
+
+    def test_memory_diff(self):
+        """
+        Testing whether the memory tracker reports allocations made between two snapshots
+        """
+        tracker = MemoryTracker()
+        try:
+            self.assertIn("Started tracing", tracker.diff())
+            allocated = [bytearray(1000) for _ in range(1000)]
+            report = tracker.diff(limit=5)
+            self.assertIn("test_profiling.py", report)
+            self.assertLessEqual(len(report.splitlines()), 6)
+        finally:
+            tracker.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
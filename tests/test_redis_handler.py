@@ -0,0 +1,141 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the RedisHandler class. Replaces the redis client with a fake, so no redis server is needed.
+"""
+
+import json
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from kubesat.redis_handler import RedisHandler
+from kubesat.validation import SharedStorageSchemas
+
+
+class FakePipeline:
+    """
+    Pipeline that records the commands and applies them to the fake redis on execute.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def delete(self, key):
+        self.commands.append(lambda: self.redis.values.pop(key, None))
+
+    def hset(self, key, mapping):
+        self.commands.append(lambda: self.redis.values.setdefault(key, {}).update(mapping))
+        self.redis.fields_written += len(mapping)
+
+    def hdel(self, key, *fields):
+        self.commands.append(lambda: [self.redis.values[key].pop(field) for field in fields])
+
+    def execute(self):
+        self.redis.round_trips += 1
+        for command in self.commands:
+            command()
+
+
+class FakeRedis:
+    """
+    Minimal in-memory stand-in for redis.StrictRedis.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.round_trips = 0
+        self.fields_written = 0
+
+    def type(self, key):
+        if key not in self.values:
+            return "none"
+        return "hash" if isinstance(self.values[key], dict) else "string"
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.round_trips += 1
+        self.values[key] = value
+
+    def hgetall(self, key):
+        return dict(self.values.get(key, {}))
+
+    def hmget(self, key, fields):
+        return [self.values.get(key, {}).get(field) for field in fields]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class Tests(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = RedisHandler("template_service", SharedStorageSchemas.TEMPLATE_STORAGE, flush_interval=60, flush_threshold=3)
+        self.redis.redis_client = FakeRedis()
+
+    async def test_set_shared_storage(self):
+        """
+        Testing whether the shared storage is written immediately without write-behind
+        """
+        self.redis.set_shared_storage({"test_value": "a"})
+        self.assertEqual(self.redis.get_shared_storage(), {"test_value": "a"})
+
+    async def test_write_behind(self):
+        """
+        Testing whether write-behind coalesces changes and flushes on stop
+        """
+        await self.redis.start_write_behind()
+        self.redis.set_shared_storage({"test_value": "a"})
+        self.redis.set_shared_storage({"test_value": "b"})
+        self.assertEqual(self.redis.redis_client.values, {})
+
+        self.assertTrue(await self.redis.flush())
+        self.assertFalse(await self.redis.flush())
+        self.assertEqual(self.redis.get_shared_storage(), {"test_value": "b"})
+        self.assertEqual(self.redis.redis_client.round_trips, 1)
+
+        self.redis.set_shared_storage({"test_value": "c"})
+        await self.redis.stop_write_behind()
+        self.assertFalse(self.redis.write_behind)
+        self.assertEqual(self.redis.get_shared_storage(), {"test_value": "c"})
+
+    async def test_delta_persistence(self):
+        """
+        Testing whether only changed fields are written and the storage is reassembled from the hash
+        """
+        self.redis.schema = SharedStorageSchemas.STORAGE
+        storage = {"swarm": {"cubesat_1": {"x": 1}}, "time": "a"}
+        self.redis.set_shared_storage(storage)
+        self.assertEqual(self.redis.redis_client.fields_written, 2)
+
+        storage["time"] = "b"
+        self.redis.set_shared_storage(storage, changed_keys={"swarm", "time"})
+        self.assertEqual(self.redis.redis_client.fields_written, 3)
+
+        del storage["time"]
+        self.redis.set_shared_storage(storage)
+        self.assertEqual(self.redis.get_shared_storage(), {"swarm": {"cubesat_1": {"x": 1}}})
+        self.assertEqual(self.redis.get_shared_storage_fields("swarm", "time"), {"swarm": {"cubesat_1": {"x": 1}}})
+
+    async def test_legacy_storage(self):
+        """
+        Testing whether a storage written as a single JSON string is still read and replaced on write
+        """
+        self.redis.redis_client.values["template_service"] = json.dumps({"test_value": "a"})
+        self.assertEqual(self.redis.get_shared_storage(), {"test_value": "a"})
+        self.redis.set_shared_storage({"test_value": "b"})
+        self.assertEqual(self.redis.get_shared_storage(), {"test_value": "b"})
@@ -0,0 +1,78 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the DeadlineSchedule class.
+"""
+
+import time
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from kubesat.scheduling import DeadlineSchedule
+
+
+async def noop():
+    pass
+
+
+class Tests(IsolatedAsyncioTestCase):
+
+    def test_overrun_policies(self):
+        """
+        Testing whether each overrun policy picks the right deadline after a run took 2.5 periods
+        """
+        skip = DeadlineSchedule(1, noop, "skip")
+        self.assertEqual(skip._next_deadline(10, 10.5), 11)
+        self.assertEqual(skip._next_deadline(10, 12.5), 13)
+        self.assertEqual((skip.metrics.overruns, skip.metrics.skipped), (1, 2))
+
+        catch_up = DeadlineSchedule(1, noop, "catch_up")
+        self.assertEqual(catch_up._next_deadline(10, 12.5), 11)
+        self.assertEqual((catch_up.metrics.overruns, catch_up.metrics.skipped), (1, 0))
+
+        coalesce = DeadlineSchedule(1, noop, "coalesce")
+        self.assertEqual(coalesce._next_deadline(10, 12.5), 12)
+        self.assertEqual((coalesce.metrics.overruns, coalesce.metrics.skipped), (1, 1))
+
+        with self.assertRaises(ValueError):
+            DeadlineSchedule(1, noop, "later")
+        with self.assertRaises(ValueError):
+            DeadlineSchedule(0, noop)
+
+    async def test_no_drift(self):
+        """
+        Testing whether the time a run takes does not delay the following runs
+        """
+        starts = []
+
+        async def slow():
+            starts.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+        schedule = DeadlineSchedule(0.02, slow)
+        task = asyncio.get_running_loop().create_task(schedule.run())
+        await asyncio.sleep(0.11)
+        task.cancel()
+
+        # with a drifting loop each run would start 0.03 seconds after the previous one
+        self.assertGreaterEqual(len(starts), 5)
+        self.assertLess(starts[4] - starts[0], 0.1)
+        self.assertEqual(schedule.metrics.overruns, 0)
+        self.assertLess(schedule.metrics.max_jitter, 0.015)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the StorageTransaction class and the read only view of the shared storage.
+"""
+
+import json
+import unittest
+from unittest import TestCase
+from jsonschema.exceptions import ValidationError
+
+from kubesat.shared_storage import StorageTransaction, read_only_view
+from kubesat.validation import SharedStorageSchemas, validation_policy
+
+
+class Tests(TestCase):
+    """
+    Testing the StorageTransaction.
+    """
+
+    def setUp(self):
+        self.storage = {
+            "data_rate": 1.0,
+            "sat_phonebook": {"cubesat_1": True}
+        }
+        self.schema = {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["data_rate"],
+            "properties": {
+                "data_rate": {"type": "number"},
+                "sat_phonebook": {"type": "object", "additionalProperties": {"type": "boolean"}}
+            }
+        }
+
+    def test_nested_changes_are_isolated(self):
+        """
+        Testing whether nested changes only reach the storage on commit
+        """
+        transaction = StorageTransaction(self.storage, self.schema)
+        transaction["sat_phonebook"]["cubesat_2"] = False
+        self.assertEqual(self.storage["sat_phonebook"], {"cubesat_1": True})
+        self.assertEqual(transaction.touched_keys, {"sat_phonebook"})
+
+        storage = transaction.commit()
+        self.assertIs(storage, self.storage)
+        self.assertEqual(self.storage["sat_phonebook"], {"cubesat_1": True, "cubesat_2": False})
+
+    def test_reads_are_not_committed(self):
+        """
+        Testing whether keys that were only read, or written with their committed value, are not committed
+        """
+        phonebook = self.storage["sat_phonebook"]
+        transaction = StorageTransaction(self.storage, self.schema)
+        self.assertEqual(dict(transaction["sat_phonebook"]), {"cubesat_1": True})
+        self.assertEqual(transaction.read_keys, {"sat_phonebook"})
+        self.assertEqual(transaction.written_keys, set())
+        transaction["data_rate"] = 1.0
+        transaction["sat_phonebook"]["cubesat_1"] = True
+        transaction.commit()
+        self.assertEqual(transaction.committed_keys, set())
+        self.assertIs(self.storage["sat_phonebook"], phonebook)
+
+    def test_unchanged_values_are_shared(self):
+        """
+        Testing whether nested list changes are isolated and unchanged nested values are shared with the storage
+        """
+        self.schema["properties"]["swarm"] = {
+            "type": "object",
+            "additionalProperties": {"type": "object", "properties": {"pointing": {"type": "array", "items": {"type": "number"}}}}
+        }
+        self.storage["swarm"] = {"cubesat_1": {"pointing": [0.0]}, "cubesat_2": {"pointing": [1.0]}}
+        swarm = self.storage["swarm"]
+        transaction = StorageTransaction(self.storage, self.schema)
+        transaction["swarm"]["cubesat_1"]["pointing"].append(2.0)
+        self.assertEqual(swarm["cubesat_1"]["pointing"], [0.0])
+
+        transaction.commit()
+        self.assertEqual(transaction.committed_keys, {"swarm"})
+        self.assertEqual(self.storage["swarm"]["cubesat_1"]["pointing"], [0.0, 2.0])
+        self.assertIs(type(self.storage["swarm"]["cubesat_1"]["pointing"]), list)
+        self.assertIs(self.storage["swarm"]["cubesat_2"], swarm["cubesat_2"])
+
+        transaction = StorageTransaction(self.storage, self.schema)
+        transaction["swarm"]["cubesat_2"]["pointing"][0] = "up"
+        with self.assertRaises(ValidationError):
+            transaction.commit()
+
+    def test_invalid_change_is_not_committed(self):
+        """
+        Testing whether invalid changes raise, leave the storage untouched and are counted as violations
+        """
+        validation_policy.reset()
+        transaction = StorageTransaction(self.storage, self.schema)
+        transaction["data_rate"] = 2.0
+        transaction["sat_phonebook"]["cubesat_2"] = "yes"
+        with self.assertRaises(ValidationError):
+            transaction.commit()
+        self.assertEqual(self.storage, {"data_rate": 1.0, "sat_phonebook": {"cubesat_1": True}})
+
+        transaction = StorageTransaction(self.storage, self.schema)
+        del transaction["data_rate"]
+        with self.assertRaises(ValidationError):
+            transaction.commit()
+
+        transaction = StorageTransaction(self.storage, self.schema)
+        transaction["unknown"] = 1
+        with self.assertRaises(ValidationError):
+            transaction.commit()
+        self.assertNotIn("unknown", self.storage)
+        self.assertEqual(validation_policy.violations["shared_storage"], 3)
+        validation_policy.reset()
+
+    def test_validation_off(self):
+        """
+        Testing whether the validation policy can skip validating the changes
+        """
+        validation_policy.set_mode("shared_storage", "off")
+        try:
+            transaction = StorageTransaction(self.storage, self.schema)
+            transaction["data_rate"] = "fast"
+            transaction.commit()
+            self.assertEqual(self.storage["data_rate"], "fast")
+            self.assertEqual(validation_policy.skipped["shared_storage"], 1)
+        finally:
+            validation_policy.reset()
+
+    def test_read_only_view(self):
+        """
+        Testing whether the read only view rejects nested changes and leaves the storage untouched
+        """
+        self.storage["swarm"] = {"cubesat_1": {"pointing": [0.0]}}
+        view = read_only_view(self.storage)
+        self.assertEqual(view["swarm"]["cubesat_1"]["pointing"], [0.0])
+        self.assertEqual(json.loads(json.dumps(view)), self.storage)
+        with self.assertRaises(TypeError):
+            view["data_rate"] = 2.0
+        with self.assertRaises(TypeError):
+            view["sat_phonebook"]["cubesat_2"] = False
+        with self.assertRaises(TypeError):
+            view["swarm"]["cubesat_1"]["pointing"].append(1.0)
+        with self.assertRaises(TypeError):
+            view.get("swarm")["cubesat_1"].pop("pointing")
+        self.assertEqual(self.storage["sat_phonebook"], {"cubesat_1": True})
+        self.assertEqual(self.storage["swarm"], {"cubesat_1": {"pointing": [0.0]}})
+
+    def test_popped_values_are_isolated(self):
+        """
+        Testing whether changing a popped value neither changes the storage nor skips the validation
+        """
+        transaction = StorageTransaction(self.storage, self.schema)
+        phonebook = transaction.pop("sat_phonebook")
+        phonebook["cubesat_2"] = "yes"
+        transaction["sat_phonebook"] = phonebook
+        self.assertEqual(self.storage["sat_phonebook"], {"cubesat_1": True})
+        with self.assertRaises(ValidationError):
+            transaction.commit()
+
+        transaction.rollback()
+        key, phonebook = transaction.popitem()
+        self.assertEqual(key, "sat_phonebook")
+        phonebook["cubesat_3"] = False
+        transaction.rollback()
+        self.assertEqual(self.storage, {"data_rate": 1.0, "sat_phonebook": {"cubesat_1": True}})
+        validation_policy.reset()
+
+    def test_rollback(self):
+        """
+        Testing whether a rollback discards all changes
+        """
+        transaction = StorageTransaction(self.storage, SharedStorageSchemas.STORAGE)
+        transaction["data_rate"] = 5
+        transaction.rollback()
+        self.assertEqual(transaction["data_rate"], 1.0)
+        transaction.commit()
+        self.assertEqual(self.storage["data_rate"], 1.0)
@@ -0,0 +1,389 @@
+# Copyright 2020 IBM Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the Subscription class and the shared subscriptions of the BaseService.
+"""
+
+import json
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from kubesat.base_service import BaseService
+from kubesat.message import Message
+from kubesat.subscription import Subscription
+from kubesat.testing import FakeLogger, FakeNatsHandler
+from kubesat.validation import MessageSchemas, SharedStorageSchemas, check_internal
+
+
+class RawMessage:
+    """
+    Stand-in for the message objects passed to NATS callbacks.
+    """
+
+    def __init__(self, data, reply=""):
+        self.data = json.dumps(data).encode()
+        self.reply = reply
+
+
+class FakeRedisHandler:
+    """
+    Records the shared storages written by the service.
+    """
+
+    def __init__(self):
+        self.writes = []
+
+    def set_shared_storage(self, shared_storage, changed_keys=None):
+        self.writes.append(changed_keys)
+        return True
+
+
+TIMESTEP = {
+    "sender_ID": "clock",
+    "time_sent": "2020-07-06",
+    "data": {
+        "time": "2020-07-06T00:00:00"
+    }
+}
+
+
+def create_service():
+    """
+    Creates a service that runs on fake NATS and redis handlers.
+    """
+    svc = BaseService("template_service", SharedStorageSchemas.TEMPLATE_STORAGE)
+    svc.sender_id = "test"
+    svc.shared_storage = {"test_value": "a"}
+    svc.nats_client = FakeNatsHandler("test")
+    svc.redis_client = FakeRedisHandler()
+    svc._logger = FakeLogger()
+    return svc
+
+
+async def handle(subscription, raw_message):
+    """
+    Dispatches a message and waits until every handler of the subscription handled it.
+    """
+    await subscription.dispatch(raw_message)
+    await subscription.join()
+
+
+class Tests(IsolatedAsyncioTestCase):
+
+    async def test_decode_once(self):
+        """
+        Testing whether a message is parsed once and decoded once per schema
+        """
+        received = []
+
+        async def on_error():
+            raise AssertionError("unexpected error")
+
+        async def handler(message, raw_message):
+            received.append(message)
+
+        subscription = Subscription("simulation.timestep", on_error)
+        subscription.add(handler, MessageSchemas.TIMESTEP_MESSAGE, handler)
+        subscription.add(on_error, MessageSchemas.TIMESTEP_MESSAGE, handler)
+        subscription.add(len, MessageSchemas.MESSAGE, handler)
+
+        with patch.object(Message, "load_raw", wraps=Message.load_raw) as load_raw:
+            await handle(subscription, RawMessage(TIMESTEP))
+        self.assertEqual(load_raw.call_count, 1)
+        self.assertEqual(len(received), 3)
+        self.assertIs(received[0], received[1])
+        self.assertEqual(received[2].message_type, "message")
+
+        self.assertTrue(subscription.remove(handler))
+        self.assertFalse(subscription.remove(handler))
+        self.assertEqual(len(subscription), 2)
+
+    async def test_lazy_data_validation(self):
+        """
+        Testing whether handlers filtering on the envelope do not validate the data of a message
+        """
+        errors = []
+        senders = []
+
+        async def on_error():
+            errors.append(True)
+
+        async def handler(message, raw_message):
+            senders.append(message.sender_id)
+            if message.sender_id == "clock":
+                message.data
+
+        subscription = Subscription("simulation.timestep", on_error)
+        subscription.add(handler, MessageSchemas.TIMESTEP_MESSAGE, handler)
+        await handle(subscription, RawMessage({**TIMESTEP, "sender_ID": "other", "data": {"time": 5}}))
+        self.assertEqual((senders, errors), (["other"], []))
+        await handle(subscription, RawMessage({**TIMESTEP, "data": {"time": 5}}))
+        self.assertEqual((senders, errors), (["other", "clock"], [True]))
+
+    async def test_shared_subscription(self):
+        """
+        Testing whether callbacks on the same subject share a NATS subscription and handle every message
+        """
+        svc = create_service()
+        times = []
+
+        @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+        async def first(message, nats_handler, shared_storage, logger):
+            times.append(message.data["time"])
+
+        @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+        async def second(message, nats_handler, shared_storage, logger):
+            shared_storage["test_value"] = message.data["time"]
+
+        await svc._register_callbacks()
+        self.assertEqual(set(svc._subscriptions), {"simulation.timestep", "node.status.template_service.test"})
+
+        await handle(svc._subscriptions["simulation.timestep"], RawMessage(TIMESTEP))
+        self.assertEqual(times, ["2020-07-06T00:00:00"])
+        self.assertEqual(svc.shared_storage["test_value"], "2020-07-06T00:00:00")
+        self.assertEqual(svc.redis_client.writes, [set(), {"test_value"}])
+
+        # every stage of handling the message is timed per callback
+        for stage in ("decode", "validation", "callback", "commit", "redis"):
+            self.assertEqual(svc.metrics.histogram("second@simulation.timestep", stage).count, 1)
+        self.assertEqual(svc.metrics.runs("first@simulation.timestep"), 1)
+        self.assertIn('kubesat_callback_runs_total{callback="second@simulation.timestep"} 1', svc.metrics.render())
+
+        for unsubscribe_route in svc._unsubscribe_nats_routes:
+            self.assertTrue(await unsubscribe_route())
+        self.assertEqual(svc._subscriptions, {})
+
+    async def test_read_only(self):
+        """
+        Testing whether read only callbacks skip the storage commit and persistence
+        """
+        svc = create_service()
+
+        @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE, read_only=True)
+        async def read(message, nats_handler, shared_storage, logger):
+            self.assertEqual(shared_storage["test_value"], "a")
+            shared_storage["test_value"] = "b"
+
+        await svc._register_callbacks()
+        await handle(svc._subscriptions["simulation.timestep"], RawMessage(TIMESTEP))
+        await handle(svc._subscriptions["node.status.template_service.test"], RawMessage({
+            "sender_ID": "config",
+            "time_sent": "2020-07-06",
+            "data": "STATUS"
+        }, reply="inbox"))
+        await svc._scheduler.join()
+        self.assertEqual(svc.shared_storage, {"test_value": "a"})
+        self.assertEqual(svc.redis_client.writes, [])
+        self.assertEqual(svc.nats_client._dict["inbox"][0].data, "ALIVE")
+
+    async def test_batch_callback(self):
+        """
+        Testing whether batch callbacks get messages in batches and commit the storage once per batch
+        """
+        svc = create_service()
+        batches = []
+
+        @svc.subscribe_batch_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE, max_batch=3, max_latency=0.01)
+        async def batch(messages, nats_handler, shared_storage, logger):
+            batches.append(len(messages))
+            shared_storage["test_value"] = messages[-1].data["time"]
+
+        await svc._register_callbacks()
+        for _ in range(4):
+            await handle(svc._subscriptions["simulation.timestep"], RawMessage(TIMESTEP))
+        self.assertEqual(batches, [3])
+        await asyncio.sleep(0.05)
+        self.assertEqual(batches, [3, 1])
+
+        # the second batch writes the same time again, which is not committed
+        self.assertEqual(svc.redis_client.writes, [{"test_value"}, set()])
+
+        await handle(svc._subscriptions["simulation.timestep"], RawMessage(TIMESTEP))
+        for unsubscribe_route in svc._unsubscribe_nats_routes:
+            await unsubscribe_route()
+        self.assertEqual(batches, [3, 1, 1])
+
+    async def test_inline_data_callback(self):
+        """
+        Testing whether data callbacks handle data messages sent inline without an HTTP request
+        """
+        svc = create_service()
+        received = []
+
+        @svc.subscribe_data_callback("data.test", MessageSchemas.TIMESTEP_MESSAGE)
+        async def data(message, nats_handler, shared_storage, logger):
+            received.append(message.data["time"])
+
+        await svc._register_callbacks()
+        await handle(svc._subscriptions["data.test"], RawMessage({
+            "sender_ID": "clock",
+            "time_sent": "2020-07-06",
+            "data": {"payload": TIMESTEP}
+        }))
+        for unsubscribe_route in svc._unsubscribe_nats_routes:
+            await unsubscribe_route()
+        await svc._scheduler.join()
+        self.assertEqual(received, ["2020-07-06T00:00:00"])
+
+    async def test_subscription_limits(self):
+        """
+        Testing whether subscriptions queue received messages with the configured limits
+        """
+        svc = create_service()
+        times = []
+        svc.limit_subscription("simulation.timestep", max_messages=1, policy="drop_oldest")
+        with self.assertRaises(ValueError):
+            svc.limit_subscription("simulation.timestep", policy="drop_all")
+
+        @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+        async def timestep(message, nats_handler, shared_storage, logger):
+            times.append(message.data["time"])
+
+        await svc._register_callbacks()
+        subscription = svc._subscriptions["simulation.timestep"]
+        self.assertEqual(subscription.pending.max_messages, 1)
+        self.assertEqual(subscription.pending.max_bytes, svc.pending_limits["max_bytes"])
+
+        for hour in range(3):
+            await subscription.receive(RawMessage({**TIMESTEP, "data": {"time": f"2020-07-06T0{hour}:00:00"}}))
+        await subscription.pending.join()
+
+        # the messages arrived before the subscription could handle any of them, so only the last one was kept
+        self.assertEqual(times, ["2020-07-06T02:00:00"])
+        self.assertEqual(subscription.pending.dropped, 2)
+        self.assertIn('kubesat_subscription_dropped_total{subject="simulation.timestep"} 2', svc.metrics.render())
+
+    async def test_latest_only(self):
+        """
+        Testing whether latest only callbacks skip the messages that arrived while they were running
+        """
+        svc = create_service()
+        times = []
+        release = asyncio.Event()
+
+        @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE, latest_only=True)
+        async def propagate(message, nats_handler, shared_storage, logger):
+            await release.wait()
+            times.append(message.data["time"])
+            shared_storage["test_value"] = message.data["time"]
+
+        await svc._register_callbacks()
+        for hour in range(4):
+            await handle(svc._subscriptions["simulation.timestep"], RawMessage({**TIMESTEP, "data": {"time": f"2020-07-06T0{hour}:00:00"}}))
+            await asyncio.sleep(0)
+        release.set()
+        for unsubscribe_route in svc._unsubscribe_nats_routes:
+            await unsubscribe_route()
+
+        self.assertEqual(times, ["2020-07-06T00:00:00", "2020-07-06T03:00:00"])
+        self.assertEqual(svc.shared_storage["test_value"], "2020-07-06T03:00:00")
+        self.assertEqual(svc.latest_only["propagate@simulation.timestep"].skipped, 2)
+        self.assertIn('kubesat_callback_skipped_total{callback="propagate@simulation.timestep"} 2', svc.metrics.render())
+
+    async def test_subjects_do_not_block_each_other(self):
+        """
+        Testing whether a slow callback without declared keys does not delay callbacks on other subjects
+        """
+        svc = create_service()
+        events = []
+        release = asyncio.Event()
+
+        @svc.subscribe_nats_callback("slow", MessageSchemas.TIMESTEP_MESSAGE)
+        async def slow(message, nats_handler, shared_storage, logger):
+            events.append("slow start")
+            await release.wait()
+            events.append("slow end")
+
+        @svc.subscribe_nats_callback("fast", MessageSchemas.TIMESTEP_MESSAGE)
+        async def fast(message, nats_handler, shared_storage, logger):
+            events.append("fast")
+            shared_storage["test_value"] = "b"
+
+        await svc._register_callbacks()
+        await svc._subscriptions["slow"].receive(RawMessage(TIMESTEP))
+        await svc._subscriptions["fast"].receive(RawMessage(TIMESTEP))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        self.assertEqual(events, ["slow start", "fast"])
+        self.assertEqual(svc.shared_storage["test_value"], "b")
+
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(events, ["slow start", "fast", "slow end"])
+
+    async def test_callback_names(self):
+        """
+        Testing whether wrapped callbacks and callbacks on several subjects keep their metrics apart
+        """
+        svc = create_service()
+
+        @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+        @check_internal
+        async def first(message, nats_handler, shared_storage, logger):
+            pass
+
+        @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+        @check_internal
+        async def second(message, nats_handler, shared_storage, logger):
+            pass
+
+        async def clock(message, nats_handler, shared_storage, logger):
+            pass
+        svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)(clock)
+        svc.subscribe_nats_callback("simulation.time", MessageSchemas.TIMESTEP_MESSAGE, latest_only=True)(clock)
+
+        def clock():
+            pass
+        svc.subscribe_nats_callback("simulation.time", MessageSchemas.TIMESTEP_MESSAGE, latest_only=True)(clock)
+
+        await svc._register_callbacks()
+        await handle(svc._subscriptions["simulation.timestep"], RawMessage(TIMESTEP))
+        await svc._scheduler.join()
+        for name in ("first@simulation.timestep", "second@simulation.timestep", "clock@simulation.timestep"):
+            self.assertEqual(svc.metrics.runs(name), 1)
+            self.assertEqual(svc.metrics.histogram(name, "decode").count, 1)
+        self.assertEqual(sorted(svc.latest_only), ["clock@simulation.time", "clock@simulation.time#2"])
+
+    async def test_handlers_run_independently(self):
+        """
+        Testing whether callbacks on the same subject run concurrently, each handling the messages in order
+        """
+        svc = create_service()
+        events = []
+
+        def register(name, duration):
+            @svc.subscribe_nats_callback("simulation.timestep", MessageSchemas.TIMESTEP_MESSAGE)
+            async def generate(message, nats_handler, shared_storage, logger):
+                events.append(f"start {name} {message.data['time']}")
+                await asyncio.sleep(duration)
+                events.append(f"end {name} {message.data['time']}")
+
+        register("slow", 0.1)
+        register("fast", 0)
+        await svc._register_callbacks()
+
+        subscription = svc._subscriptions["simulation.timestep"]
+        start = asyncio.get_running_loop().time()
+        for hour in range(2):
+            await subscription.dispatch(RawMessage({**TIMESTEP, "data": {"time": f"0{hour}"}}))
+        await asyncio.sleep(0.01)
+        self.assertEqual(events, ["start slow 00", "start fast 00", "end fast 00", "start fast 01", "end fast 01"])
+        self.assertEqual(subscription.backlog(), {"generate@simulation.timestep": 1, "generate@simulation.timestep#2": 0})
+
+        await subscription.join()
+        self.assertEqual(events[5:], ["end slow 00", "start slow 01", "end slow 01"])
+        self.assertLess(asyncio.get_running_loop().time() - start, 0.3)
@@ -18,12 +18,15 @@ from unittest import TestCase
 from time import sleep
 import sys
 import os
-from kubesat.validation import validate_json
+from kubesat.validation import validate_json, validators, ValidatorRegistry, ValidationPolicy, validation_policy
 from kubesat.validation import MessageSchemas
 from kubesat.message import Message
 from jsonschema.exceptions import ValidationError
 
 class Test(TestCase):
+    def tearDown(self):
+        validation_policy.reset()
+
     def test_validate_message(self):
         """
         validate_message test
@@ -81,3 +84,112 @@ class Test(TestCase):
         }
         with self.assertRaises(ValidationError):
             result = validate_json(test_message, TEST_MESSAGE)
+
+    def test_validator_registry(self):
+        """
+        Testing whether validators are compiled once per schema and shared between calls
+        """
+        registry = ValidatorRegistry()
+        validator = registry.get(MessageSchemas.TIMESTEP_MESSAGE)
+        self.assertIs(registry.get(MessageSchemas.TIMESTEP_MESSAGE), validator)
+        self.assertIsNot(registry.get(MessageSchemas.API_MESSAGE), validator)
+
+        # equal but distinct schema dicts get their own validator
+        self.assertIsNot(registry.get(dict(MessageSchemas.TIMESTEP_MESSAGE)), validator)
+
+        self.assertGreater(registry.compile_all(MessageSchemas), 10)
+        self.assertIs(registry.get(MessageSchemas.TIMESTEP_MESSAGE), validator)
+
+        validate_json({
+            "sender_ID": "abc",
+            "origin_ID": "abc",
+            "message_type": "timestep_message",
+            "time_sent": "2020-07-06",
+            "data": {
+                "time": "2020-07-06"
+            }
+        }, MessageSchemas.TIMESTEP_MESSAGE)
+        self.assertIs(validators.get(MessageSchemas.TIMESTEP_MESSAGE), validators.get(MessageSchemas.TIMESTEP_MESSAGE))
+
+    def test_lazy_decoding(self):
+        """
+        Testing whether lazily decoded messages validate their envelope right away and their data on first access
+        """
+        message = Message.decode_json({
+            "sender_ID": "abc",
+            "time_sent": "2020-07-06",
+            "data": {
+                "time": 5
+            }
+        }, MessageSchemas.TIMESTEP_MESSAGE, lazy=True)
+        self.assertEqual((message.sender_id, message.origin_id), ("abc", "abc"))
+        self.assertFalse(message.validated)
+        with self.assertRaises(ValidationError):
+            message.data
+        with self.assertRaises(ValidationError):
+            message.data
+        with self.assertRaises(AttributeError):
+            message.unknown = 1
+
+        message.data = {"time": "2020-07-06"}
+        self.assertTrue(message.validated)
+        self.assertEqual(message.encode_json()["data"], {"time": "2020-07-06"})
+
+        with self.assertRaises(ValidationError):
+            Message.decode_json({"sender_ID": 1, "time_sent": "2020-07-06", "data": {}}, MessageSchemas.TIMESTEP_MESSAGE, lazy=True)
+
+    def test_lazy_decoding_counted_once(self):
+        """
+        Testing whether a lazily decoded message is counted as checked once, while a violation of its data is counted
+        """
+        validation_policy.reset()
+        for time in ("2020-07-06", 5):
+            message = Message.decode_json({
+                "sender_ID": "abc",
+                "time_sent": "2020-07-06",
+                "data": {
+                    "time": time
+                }
+            }, MessageSchemas.TIMESTEP_MESSAGE, lazy=True)
+            try:
+                message.data
+            except ValidationError:
+                pass
+        self.assertEqual(validation_policy.checked["timestep_message"], 2)
+        self.assertEqual(validation_policy.violations["timestep_message"], 1)
+
+    def test_validation_policy(self):
+        """
+        Testing whether the validation modes pick the right messages and the violations are counted
+        """
+        policy = ValidationPolicy()
+        policy.configure("sample:3, timestep_message=first_sight, internal.data.out=off")
+        self.assertEqual([policy.decide("api_message") for _ in range(4)], [True, False, False, True])
+        self.assertEqual([policy.decide("timestep_message", sender=sender) for sender in "aab"], [True, False, True])
+        self.assertFalse(policy.decide("timestep_message", "internal.data.out", "c"))
+        self.assertEqual(policy.skipped, {"api_message": 2, "timestep_message": 2})
+
+        # a sender violating the schema is validated again
+        with self.assertRaises(ValidationError):
+            policy.check({"sender_ID": "a"}, MessageSchemas.TIMESTEP_MESSAGE, sender="a")
+        self.assertEqual((policy.checked["timestep_message"], policy.violations["timestep_message"]), (1, 1))
+        self.assertTrue(policy.decide("timestep_message", sender="a"))
+
+        with self.assertRaises(ValueError):
+            policy.configure("sometimes")
+        with self.assertRaises(ValueError):
+            policy.set_mode("api_message", "sample:0")
+
+    def test_skip_validation(self):
+        """
+        Testing whether messages on subjects whose validation is off are decoded without validation
+        """
+        invalid = {"sender_ID": "abc", "time_sent": "2020-07-06", "data": {"time": 5}}
+        validation_policy.set_mode("internal.timestep", "off")
+        message = Message.decode_json(dict(invalid), MessageSchemas.TIMESTEP_MESSAGE, subject="internal.timestep")
+        self.assertEqual(message.data, {"time": 5})
+        self.assertEqual(message.encode_json("internal.timestep")["data"], {"time": 5})
+        with self.assertRaises(ValidationError):
+            Message.decode_json(dict(invalid), MessageSchemas.TIMESTEP_MESSAGE, subject="simulation.timestep")
+        self.assertEqual(validation_policy.violations["timestep_message"], 1)
+        self.assertEqual(validation_policy.skipped["timestep_message"], 2)